@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк сериализации списка транзакций: стоимость на одну строку
+для моделей Pydantic с проверкой response_model, json, orjson и сжатия ответа.
+
+    python benchmarks/bench_serialization.py --rows 100000
+"""
+import argparse
+import gzip
+import json
+import os
+import sys
+import time
+from typing import List
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from pydantic import TypeAdapter
+
+from src.api.models import TransactionResponse
+from src.api.responses import dumps, rows_to_dicts, orjson
+from src.api.compression import zstandard, GZIP_LEVEL, ZSTD_LEVEL
+from src.api import formats
+from src.core.DBManager import DBManager
+
+
+def make_rows(count: int) -> list[tuple]:
+    """Строки в том виде, в каком их возвращает DBManager.query_transactions"""
+    return [(i, i % 12 + 1, round(i * 1.37 % 5000, 2), f"Категория {i % 40}", f"Покупка в магазине №{i % 500}",
+             f"2025-{i % 12 + 1:02d}-{i % 28 + 1:02d}", "Списание" if i % 5 else "Пополнение")
+            for i in range(count)]
+
+
+def pydantic_models(rows) -> bytes:
+    """Прежний путь: модель на строку, затем проверка и сериализация по response_model"""
+    models = [TransactionResponse(id=r[0], report_id=r[1], amount=r[2], category=r[3], note=r[4], date=r[5],
+                                  type=r[6]) for r in rows]
+    adapter = TypeAdapter(List[TransactionResponse])
+    return adapter.dump_json(adapter.validate_python(models), by_alias=True)
+
+
+def stdlib_json(rows) -> bytes:
+    return json.dumps(rows_to_dicts(DBManager.TRANSACTION_COLUMNS, rows), ensure_ascii=False,
+                      separators=(",", ":")).encode("utf-8")
+
+
+def fast_path(rows) -> bytes:
+    return dumps(rows_to_dicts(DBManager.TRANSACTION_COLUMNS, rows))
+
+
+def columnar(media_type: str):
+    names = DBManager.TRANSACTION_COLUMNS
+    schema = formats.transactions_schema(names) if media_type == formats.ARROW_STREAM else None
+    return lambda rows: formats.encode(media_type, formats.columns(names, rows), schema)
+
+
+def measure(func, arg, repeat: int):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func(arg)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк сериализации ответа со списком транзакций")
+    parser.add_argument("--rows", type=int, default=100_000, help="Количество строк")
+    parser.add_argument("--repeat", type=int, default=3, help="Повторов, берётся лучшее время")
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows)
+    print(f"Строк: {args.rows}, orjson: {'да' if orjson else 'нет'}, zstandard: {'да' if zstandard else 'нет'}")
+    print(f"{'Способ':<40}{'мс всего':>12}{'мкс/строка':>14}{'байт':>14}")
+
+    cases = [("Pydantic + response_model", pydantic_models), ("json из строк базы", stdlib_json),
+             (f"быстрый путь ({'orjson' if orjson else 'json'})", fast_path)]
+    body = b""
+    for name, func in cases:
+        elapsed, body = measure(func, rows, args.repeat)
+        print(f"{name:<40}{elapsed * 1000:>12.1f}{elapsed / args.rows * 1e6:>14.3f}{len(body):>14}")
+    for name, media_type in (("Arrow IPC", formats.ARROW_STREAM), ("MessagePack (столбцы)", formats.MSGPACK)):
+        if formats.available(media_type):
+            elapsed, encoded = measure(columnar(media_type), rows, args.repeat)
+            print(f"{name:<40}{elapsed * 1000:>12.1f}{elapsed / args.rows * 1e6:>14.3f}{len(encoded):>14}")
+
+    compressors = [(f"gzip (уровень {GZIP_LEVEL})", lambda data: gzip.compress(data, GZIP_LEVEL))]
+    if zstandard is not None:
+        compressors.append((f"zstd (уровень {ZSTD_LEVEL})", zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress))
+    for name, func in compressors:
+        elapsed, compressed = measure(func, body, args.repeat)
+        print(f"{'+ ' + name:<40}{elapsed * 1000:>12.1f}{elapsed / args.rows * 1e6:>14.3f}{len(compressed):>14}")
+
+
+if __name__ == "__main__":
+    main()
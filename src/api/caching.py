@@ -0,0 +1,56 @@
+"""
+Условные GET-запросы: ETag по версии данных и ответ 304 без выполнения запроса к данным
+"""
+import hashlib
+import os
+import sys
+from fastapi import Depends, HTTPException, Request, Response
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from .dependencies import get_budget_manager, get_tenant, TENANT_HEADER
+from .executors import run_read
+from .metrics import CACHE_REQUESTS
+from src.core.manager import BudgetManager
+
+# Ответ можно хранить только в кэше клиента и перед использованием нужно проверить по ETag
+CACHE_CONTROL = "private, no-cache"
+
+
+def make_etag(version: int, request: Request, tenant: str = "") -> str:
+    """
+    Слабый ETag: версия данных и хэш арендатора, пути с параметрами запроса и запрошенного формата (Accept).
+    Версии баз разных арендаторов совпадают, поэтому без арендатора в ключе чужой ETag дал бы 304
+    """
+    key = f"{tenant}|{request.url.path}?{request.url.query}|{request.headers.get('accept', '')}"
+    digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+    return f'W/"{version}-{digest}"'
+
+
+def etag_matches(header: str, etag: str) -> bool:
+    """Сравнение If-None-Match с ETag без учёта признака слабости (W/)"""
+    if header.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag.removeprefix("W/") for tag in header.split(","))
+
+
+async def conditional_get(
+    request: Request,
+    response: Response,
+    manager: BudgetManager = Depends(get_budget_manager),
+    tenant: str = Depends(get_tenant)
+) -> dict:
+    """
+    Зависимость GET-эндпоинтов: если If-None-Match совпадает с текущим ETag, сразу отвечает 304.
+    Иначе добавляет ETag и Cache-Control к ответу и возвращает эти заголовки
+    (для маршрутов, которые сами создают Response). Версия читается до запроса данных,
+    поэтому при записи во время запроса клиент получит новые данные при следующей проверке.
+    """
+    version = await run_read(manager.data_version)
+    headers = {"ETag": make_etag(version, request, tenant), "Cache-Control": CACHE_CONTROL,
+               "Vary": f"Accept, {TENANT_HEADER}"}
+    if etag_matches(request.headers.get("if-none-match", ""), headers["ETag"]):
+        CACHE_REQUESTS.inc("hit")
+        raise HTTPException(status_code=304, headers=headers)
+    CACHE_REQUESTS.inc("miss")
+    response.headers.update(headers)
+    return headers
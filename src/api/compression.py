@@ -0,0 +1,133 @@
+"""
+Сжатие ответов API (zstd или gzip по заголовку Accept-Encoding) для ответов больше порога.
+zstd доступен, если установлен пакет zstandard. Потоковые ответы сжимаются по частям,
+каждая часть отправляется клиенту сразу.
+"""
+import os
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESS_MIN_SIZE = int(os.environ.get("BUDGET_COMPRESS_MIN_BYTES", 1024))
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+# События SSE должны доходить до клиента без буферизации в прокси
+SKIP_CONTENT_TYPES = ("text/event-stream",)
+
+
+def choose_encoding(accept_encoding: str):
+    """Лучшее поддерживаемое сжатие из Accept-Encoding: zstd, затем gzip, иначе None"""
+    accepted = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            accepted[name] = quality
+    for encoding in ("zstd", "gzip"):
+        if encoding == "zstd" and zstandard is None:
+            continue
+        if accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+
+class _Compressor:
+    """Потоковый компрессор: chunk() отдаёт сжатые данные, которые клиент может распаковать сразу"""
+
+    def __init__(self, encoding: str):
+        if encoding == "zstd":
+            self._obj = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+            self._sync = zstandard.COMPRESSOBJ_FLUSH_BLOCK
+        else:
+            self._obj = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+            self._sync = zlib.Z_SYNC_FLUSH
+
+    def chunk(self, data: bytes, final: bool) -> bytes:
+        if final:
+            return self._obj.compress(data) + self._obj.flush()
+        return self._obj.compress(data) + self._obj.flush(self._sync)
+
+
+class CompressionMiddleware:
+    """ASGI middleware: сжимает ответы от minimum_size байт, если клиент это поддерживает"""
+
+    def __init__(self, app, minimum_size: int = COMPRESS_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        await self.app(scope, receive, _CompressingSend(send, encoding, self.minimum_size))
+
+
+class _CompressingSend:
+    """Обёртка над send одного ответа: решение о сжатии принимается по первой части тела"""
+
+    def __init__(self, send, encoding: str, minimum_size: int):
+        self.send = send
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.start = None
+        self.compressor = None
+        self.passthrough = False
+
+    async def __call__(self, message):
+        if message["type"] == "http.response.start":
+            self.start = message
+            return
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self._flush_start()
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.compressor is None:
+            if not self._should_compress(body, more_body):
+                self.passthrough = True
+                await self._flush_start()
+                await self.send(message)
+                return
+            self.compressor = _Compressor(self.encoding)
+            body = self.compressor.chunk(body, final=not more_body)
+            headers = MutableHeaders(raw=self.start["headers"])
+            headers["Content-Encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+            if more_body:
+                del headers["Content-Length"]
+            else:
+                headers["Content-Length"] = str(len(body))
+            self.start["headers"] = headers.raw
+            await self._flush_start()
+        else:
+            body = self.compressor.chunk(body, final=not more_body)
+        await self.send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+    def _should_compress(self, body: bytes, more_body: bool) -> bool:
+        headers = Headers(raw=self.start["headers"])
+        if "content-encoding" in headers or self.start["status"] in (204, 304):
+            return False
+        if headers.get("content-type", "").startswith(SKIP_CONTENT_TYPES):
+            return False
+        return more_body or len(body) >= self.minimum_size
+
+    async def _flush_start(self):
+        if self.start is not None:
+            await self.send(self.start)
+            self.start = None
@@ -3,17 +3,88 @@
 """
 import os
 import sys
+from typing import List, Optional
+
+from fastapi import HTTPException, Query
+from starlette.requests import HTTPConnection
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "..")))
 
-from src.core.manager import BudgetManager
+from .jobs import ImportJobRegistry
+from .tenants import TenantRegistry, DEFAULT_TENANT, check_tenant_id
+
+# Глобальные реестры менеджеров арендаторов и задач импорта для всех запросов
+_tenants = None
+_import_jobs = None
+
+TENANT_HEADER = "X-Tenant-ID"
+
+
+def get_tenants() -> TenantRegistry:
+    """Получить реестр BudgetManager арендаторов (singleton)"""
+    global _tenants
+    if _tenants is None:
+        _tenants = TenantRegistry()
+    return _tenants
+
+
+def get_tenant(connection: HTTPConnection) -> str:
+    """
+    ID арендатора из заголовка X-Tenant-ID, а для EventSource и WebSocket, которые не передают
+    свои заголовки, — из параметра tenant. Без ID — общая база
+    """
+    tenant = connection.headers.get(TENANT_HEADER) or connection.query_params.get("tenant") or DEFAULT_TENANT
+    try:
+        return check_tenant_id(tenant)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def get_budget_manager(connection: HTTPConnection):
+    """
+    BudgetManager арендатора запроса; занят реестром, пока запрос (или поток ответа) не завершится.
+    Освобождение после отправки потокового ответа (SSE, выгрузки) — поведение FastAPI с 0.118
+    """
+    tenant = get_tenant(connection)
+    tenants = get_tenants()
+    manager = tenants.acquire(tenant)
+    try:
+        yield manager
+    finally:
+        tenants.release(tenant)
+
+
+def get_import_jobs() -> ImportJobRegistry:
+    """Получить реестр фоновых задач импорта (singleton)"""
+    global _import_jobs
+    if _import_jobs is None:
+        _import_jobs = ImportJobRegistry()
+    return _import_jobs
+
 
-# Создаем глобальный экземпляр BudgetManager для всех запросов
-_budget_manager = None
+def shutdown_import_jobs():
+    """Завершить фоновые задачи импорта при остановке приложения"""
+    global _import_jobs
+    jobs, _import_jobs = _import_jobs, None
+    if jobs is not None:
+        jobs.shutdown()
 
 
-def get_budget_manager() -> BudgetManager:
-    """Получить экземпляр BudgetManager (singleton)"""
-    global _budget_manager
-    if _budget_manager is None:
-        _budget_manager = BudgetManager()
-    return _budget_manager
+def transaction_filters(
+    date_from: Optional[str] = Query(None, description="Начальная дата (включительно)"),
+    date_to: Optional[str] = Query(None, description="Конечная дата (включительно)"),
+    category: Optional[List[str]] = Query(None, description="Категории (параметр можно повторять)"),
+    type_: Optional[str] = Query(None, alias="type", description="Тип транзакции (Списание/Пополнение)"),
+    report_id: Optional[int] = Query(None, description="ID отчёта"),
+    amount_min: Optional[float] = Query(None, description="Минимальная сумма"),
+    amount_max: Optional[float] = Query(None, description="Максимальная сумма"),
+) -> dict:
+    """Фильтры транзакций из параметров запроса в формате DBManager._build_filter"""
+    return {
+        "date_from": date_from,
+        "date_to": date_to,
+        "category": category,
+        "type": type_,
+        "report_id": report_id,
+        "amount_min": amount_min,
+        "amount_max": amount_max,
+    }
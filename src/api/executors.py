@@ -0,0 +1,135 @@
+"""
+Пулы потоков для блокирующих вызовов BudgetManager и sqlite3.
+Чтения, записи и тяжёлая аналитика выполняются в отдельных пулах со своими лимитами,
+поэтому медленный отчёт не занимает event loop и не задерживает дешёвые запросы.
+"""
+import asyncio
+import functools
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+READ = "read"
+WRITE = "write"
+ANALYTICS = "analytics"
+
+# Размеры пулов; SQLite всё равно выполняет записи по одной, поэтому пул записи маленький
+POOL_SIZES = {
+    READ: int(os.environ.get("BUDGET_READ_WORKERS", 8)),
+    WRITE: int(os.environ.get("BUDGET_WRITE_WORKERS", 2)),
+    ANALYTICS: int(os.environ.get("BUDGET_ANALYTICS_WORKERS", 2)),
+}
+
+_pools = None
+_pools_lock = threading.Lock()
+
+
+class BoundedExecutor:
+    """Пул потоков с ограниченным числом одновременных задач и счётчиками очереди"""
+
+    def __init__(self, name: str, max_workers: int):
+        self.name = name
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.max_queued = 0
+        self.wait_seconds = 0.0
+
+    async def run(self, func, *args, **kwargs):
+        """Выполняет func в пуле и ждёт результат, не блокируя event loop"""
+        queued_at = time.perf_counter()
+        state = {"dequeued": False}
+
+        def task():
+            with self._lock:
+                if not state["dequeued"]:
+                    state["dequeued"] = True
+                    self.queued -= 1
+                self.running += 1
+                self.wait_seconds += time.perf_counter() - queued_at
+            try:
+                return func(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self.running -= 1
+                    self.completed += 1
+
+        with self._lock:
+            self.queued += 1
+            self.max_queued = max(self.max_queued, self.queued)
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, task)
+        finally:
+            with self._lock:
+                # Запрос отменён, пока задача ждала в очереди: пул её уже не запустит
+                if not state["dequeued"]:
+                    state["dequeued"] = True
+                    self.queued -= 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            started = self.completed + self.running
+            return {
+                "max_workers": self.max_workers,
+                "running": self.running,
+                "queued": self.queued,
+                "max_queued": self.max_queued,
+                "completed": self.completed,
+                "avg_wait_ms": round(self.wait_seconds / started * 1000, 3) if started else 0.0,
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def get_pools() -> dict[str, BoundedExecutor]:
+    """Пулы чтения, записи и аналитики (создаются при первом обращении)"""
+    global _pools
+    with _pools_lock:
+        if _pools is None:
+            _pools = {name: BoundedExecutor(name, size) for name, size in POOL_SIZES.items()}
+        return _pools
+
+
+async def run_read(func, *args, **kwargs):
+    """Дешёвое чтение из базы"""
+    return await get_pools()[READ].run(func, *args, **kwargs)
+
+
+async def run_write(func, *args, **kwargs):
+    """Изменение данных"""
+    return await get_pools()[WRITE].run(func, *args, **kwargs)
+
+
+async def run_analytics(func, *args, **kwargs):
+    """Тяжёлый расчёт по всем транзакциям"""
+    return await get_pools()[ANALYTICS].run(func, *args, **kwargs)
+
+
+async def iterate_read(iterator):
+    """Асинхронный обход блокирующего итератора: каждый шаг выполняется в пуле чтения"""
+    sentinel = object()
+    next_item = functools.partial(next, iterator, sentinel)
+    try:
+        while (item := await run_read(next_item)) is not sentinel:
+            yield item
+    finally:
+        # Клиент отключился раньше конца: генератор закрывает своё соединение с базой
+        if hasattr(iterator, "close"):
+            iterator.close()
+
+
+def pool_stats() -> dict:
+    return {name: pool.stats() for name, pool in get_pools().items()}
+
+
+def shutdown_pools():
+    global _pools
+    with _pools_lock:
+        pools, _pools = _pools, None
+    for pool in (pools or {}).values():
+        pool.shutdown()
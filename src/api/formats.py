@@ -0,0 +1,136 @@
+"""
+Выбор формата ответа по заголовку Accept: JSON, Arrow IPC (поток record batch) или MessagePack.
+Бинарные форматы колоночные: столбцы собираются прямо из строк DBManager.
+pyarrow и msgpack импортируются при первом обращении; без пакета запрос получает 406.
+"""
+import io
+import os
+import sys
+from fastapi import HTTPException, Request
+from fastapi.responses import Response
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+JSON = "application/json"
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+MSGPACK = "application/msgpack"
+# Синонимы типов из заголовка Accept
+MEDIA_TYPES = {
+    JSON: JSON,
+    "*/*": JSON,
+    "application/*": JSON,
+    ARROW_STREAM: ARROW_STREAM,
+    MSGPACK: MSGPACK,
+    "application/x-msgpack": MSGPACK,
+}
+PACKAGES = {ARROW_STREAM: "pyarrow", MSGPACK: "msgpack"}
+
+
+def negotiate(request: Request) -> str:
+    """Формат ответа с наибольшим весом в Accept; неизвестные типы и пустой заголовок — JSON"""
+    accepted = []
+    for position, part in enumerate(request.headers.get("accept", "").lower().split(",")):
+        media_type, _, params = part.strip().partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if media_type.strip() in MEDIA_TYPES and quality > 0:
+            accepted.append((-quality, position, MEDIA_TYPES[media_type.strip()]))
+    if not accepted:
+        return JSON
+    # Формат без установленного пакета пропускается в пользу следующего по весу
+    for _, _, media_type in sorted(accepted):
+        if available(media_type):
+            return media_type
+    media_type = min(accepted)[2]
+    raise HTTPException(status_code=406,
+                        detail=f"Для ответа в формате {media_type} на сервере нужен пакет {PACKAGES[media_type]}")
+
+
+def available(media_type: str) -> bool:
+    """Установлен ли пакет, нужный для формата"""
+    package = PACKAGES.get(media_type)
+    if package is None:
+        return True
+    try:
+        __import__(package)
+    except ImportError:
+        return False
+    return True
+
+
+def _pyarrow():
+    import pyarrow
+    import pyarrow.ipc
+    return pyarrow
+
+
+def columns(names, rows) -> dict[str, list]:
+    """Строки в столбцы: {имя: [значения]}"""
+    values = list(zip(*rows)) if rows else [()] * len(names)
+    return {name: list(column) for name, column in zip(names, values)}
+
+
+def transactions_schema(names):
+    """Схема Arrow для выбранных столбцов транзакций (типы как в выгрузке Parquet)"""
+    from src.core.parquet import transactions_schema as full_schema
+    schema = full_schema()
+    return _pyarrow().schema([schema.field(name) for name in names])
+
+
+def graph_schema():
+    """Схема Arrow графика баланса: дата (timestamp в секундах) и баланс"""
+    pa = _pyarrow()
+    return pa.schema([("date", pa.int64()), ("balance", pa.float64())])
+
+
+def _record_batch(data: dict, schema):
+    pa = _pyarrow()
+    return pa.RecordBatch.from_arrays([pa.array(data[field.name], type=field.type) for field in schema],
+                                      schema=schema)
+
+
+def encode(media_type: str, data: dict, schema=None) -> bytes:
+    """Колоночные данные в байты выбранного бинарного формата"""
+    if media_type == MSGPACK:
+        import msgpack
+        return msgpack.packb(data, use_bin_type=True)
+    sink = io.BytesIO()
+    with _pyarrow().ipc.new_stream(sink, schema) as writer:
+        writer.write_batch(_record_batch(data, schema))
+    return sink.getvalue()
+
+
+def binary_response(media_type: str, data: dict, schema=None, headers: dict = None) -> Response:
+    return Response(content=encode(media_type, data, schema), media_type=media_type, headers=headers)
+
+
+def stream_chunks(media_type: str, names, batches, schema=None):
+    """
+    Потоковая выгрузка порций строк: для Arrow — один поток IPC, где каждая порция — record batch;
+    для MessagePack — последовательность словарей столбцов (читается msgpack.Unpacker)
+    """
+    if media_type == MSGPACK:
+        import msgpack
+        packer = msgpack.Packer(use_bin_type=True)
+        for rows in batches:
+            yield packer.pack(columns(names, rows))
+        return
+    sink = io.BytesIO()
+    with _pyarrow().ipc.new_stream(sink, schema) as writer:
+        for rows in batches:
+            writer.write_batch(_record_batch(columns(names, rows), schema))
+            yield _drain(sink)
+    # Маркер конца потока пишется при закрытии
+    yield _drain(sink)
+
+
+def _drain(sink: io.BytesIO) -> bytes:
+    data = sink.getvalue()
+    sink.seek(0)
+    sink.truncate()
+    return data
@@ -0,0 +1,123 @@
+"""
+Фоновые задачи импорта для FastAPI приложения
+"""
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from src.core.parser import Parser, ImportCancelled
+
+
+class ImportJob:
+    """Состояние одной фоновой задачи импорта"""
+
+    def __init__(self, filename: str, sha256: str = None, tenant: str = ""):
+        self.id = uuid.uuid4().hex
+        self.filename = filename
+        self.tenant = tenant  # Задача видна только арендатору, который её создал
+        self.content_sha256 = sha256
+        self.status = "queued"  # queued -> running -> done | failed | cancelled
+        self.created_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self.rows_processed = 0
+        self.bytes_processed = 0
+        self.report_id = None
+        self.error = None
+        self.stages = {}  # этап -> длительность в секундах
+        self.cancel_event = threading.Event()
+        self._queued_at = time.perf_counter()
+
+    def on_progress(self, rows: int, bytes_read: int):
+        self.rows_processed = rows
+        self.bytes_processed = bytes_read
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "filename": self.filename,
+            "content_sha256": self.content_sha256,
+            "status": self.status,
+            "created_at": self.created_at,
+            "rows_processed": self.rows_processed,
+            "bytes_processed": self.bytes_processed,
+            "report_id": self.report_id,
+            "stages": {stage: round(seconds, 4) for stage, seconds in self.stages.items()},
+            "error": self.error,
+        }
+
+
+class ImportJobRegistry:
+    """Пул потоков, выполняющий импорт вне event loop, и реестр последних задач"""
+
+    def __init__(self, max_workers: int = 2, max_jobs: int = 1000):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="import")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self.max_jobs = max_jobs
+
+    def submit(self, manager, source, filename: str, stages: dict = None, sha256: str = None,
+               on_done=None, tenant: str = "") -> ImportJob:
+        """
+        Ставит импорт открытого бинарного файла source в очередь. Файл закрывается после завершения задачи.
+        stages — уже измеренные этапы (например, загрузка файла). on_done() вызывается после завершения задачи.
+        tenant — арендатор, которому принадлежит задача.
+        """
+        job = ImportJob(filename, sha256, tenant)
+        job.stages.update(stages or {})
+        with self._lock:
+            self._jobs[job.id] = job
+            # Забываем самые старые задачи, чтобы реестр не рос бесконечно
+            while len(self._jobs) > self.max_jobs:
+                self._jobs.popitem(last=False)
+        self._executor.submit(self._run, job, manager, source, on_done)
+        return job
+
+    def get(self, job_id: str, tenant: str = ""):
+        """Задача арендатора tenant; задачи других арендаторов не находятся"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        return job if job is not None and job.tenant == tenant else None
+
+    def cancel(self, job_id: str, tenant: str = ""):
+        job = self.get(job_id, tenant)
+        if job is not None:
+            job.cancel_event.set()
+        return job
+
+    def shutdown(self):
+        """Отменяет незавершённые задачи и ждёт их, чтобы базы закрывались уже без них"""
+        with self._lock:
+            jobs = list(self._jobs.values())
+        for job in jobs:
+            job.cancel_event.set()
+        self._executor.shutdown(wait=True)
+
+    @staticmethod
+    def _run(job: ImportJob, manager, source, on_done=None):
+        job.stages["queued"] = time.perf_counter() - job._queued_at
+        job.status = "running"
+        try:
+            if job.cancel_event.is_set():
+                raise ImportCancelled(f"Импорт {job.filename} отменён")
+            job.report_id = manager.import_from_file(job.filename,
+                                                     chunksize=Parser.CHUNK_SIZE,
+                                                     progress_callback=job.on_progress,
+                                                     cancel_event=job.cancel_event,
+                                                     timings=job.stages,
+                                                     source=source)
+            job.status = "done"
+        except ImportCancelled as e:
+            job.status = "cancelled"
+            job.error = str(e)
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            source.close()
+            if on_done is not None:
+                on_done()
@@ -4,11 +4,35 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, Response
+from contextlib import asynccontextmanager, suppress
+import asyncio
 import os
 
 # Импортируем роутеры
-from .routers import transactions, plan, analytics, import_router
+from .routers import transactions, plan, analytics, import_router, export, events, sync
+from .executors import pool_stats, shutdown_pools
+from .responses import FastJSONResponse
+from .compression import CompressionMiddleware
+from .metrics import MetricsMiddleware
+from .dependencies import get_tenants, shutdown_import_jobs
+from src.core.metrics import REGISTRY, CONTENT_TYPE
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Базы арендаторов без запросов закрываются и тогда, когда новых запросов нет
+    evictor = asyncio.create_task(get_tenants().evict_idle_forever())
+    yield
+    evictor.cancel()
+    with suppress(asyncio.CancelledError):
+        await evictor
+    # Пулы потоков для запросов к базе останавливаются вместе с приложением
+    shutdown_pools()
+    # Фоновые импорты пишут в базы арендаторов, поэтому завершаются до их закрытия
+    shutdown_import_jobs()
+    get_tenants().close_all()
+
 
 # Создаем приложение FastAPI
 app = FastAPI(
@@ -16,7 +40,9 @@ app = FastAPI(
     description="API для управления личным бюджетом",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse
 )
 
 # Настраиваем CORS для веб-клиента
@@ -26,13 +52,21 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
+# Сжатие zstd/gzip для ответов больше порога (BUDGET_COMPRESS_MIN_BYTES)
+app.add_middleware(CompressionMiddleware)
+# Число и время запросов по маршрутам для GET /metrics; учитывается и время сжатия
+app.add_middleware(MetricsMiddleware)
 
 # Подключаем роутеры
 app.include_router(transactions.router)
 app.include_router(plan.router)
 app.include_router(analytics.router)
 app.include_router(import_router.router)
+app.include_router(export.router)
+app.include_router(events.router)
+app.include_router(sync.router)
 
 
 @app.get("/", response_class=HTMLResponse)
@@ -132,6 +166,18 @@ async def health_check():
     return {"status": "healthy", "message": "Budget Tracker API работает"}
 
 
+@app.get("/health/executors")
+async def executors_stats():
+    """Загрузка пулов чтения, записи и аналитики: занятые потоки, длина очереди, среднее ожидание"""
+    return pool_stats()
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Метрики API, базы и импорта в текстовом формате Prometheus"""
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,68 @@
+"""
+Метрики API: число и время запросов по маршруту, попадания ETag, загрузка пулов потоков
+и открытые менеджеры арендаторов.
+Метрики базы и импорта — в src/core/metrics.py, все вместе отдаёт GET /metrics.
+"""
+import os
+import sys
+import time
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from .executors import pool_stats
+from .dependencies import get_tenants
+from src.core.metrics import Counter, Gauge, Histogram
+
+HTTP_REQUESTS = Counter("budget_http_requests_total", "HTTP запросы по методу, маршруту и статусу",
+                        ["method", "route", "status"])
+HTTP_SECONDS = Histogram("budget_http_request_duration_seconds",
+                         "Время HTTP запроса до отправки последней части ответа", ["method", "route"])
+CACHE_REQUESTS = Counter("budget_http_cache_requests_total",
+                         "Проверки ETag: hit — ответ 304, miss — ответ с данными", ["result"])
+
+
+def _executor_tasks():
+    return {(name, state): stats[state] for name, stats in pool_stats().items() for state in ("running", "queued")}
+
+
+EXECUTOR_TASKS = Gauge("budget_executor_tasks", "Задачи пулов потоков: выполняются и ждут в очереди",
+                       ["pool", "state"], collect=_executor_tasks)
+EXECUTOR_WORKERS = Gauge("budget_executor_max_workers", "Размер пулов потоков", ["pool"],
+                         collect=lambda: {(name, ): stats["max_workers"] for name, stats in pool_stats().items()})
+
+
+def _tenants():
+    stats = get_tenants().stats()
+    return {("open", ): stats["open"], ("active", ): stats["active"]}
+
+
+TENANTS = Gauge("budget_tenants", "Открытые менеджеры арендаторов и занятые запросами", ["state"], collect=_tenants)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware: учитывает HTTP запросы по шаблону маршрута (/api/transactions/{transaction_id}),
+    а не по пути, чтобы число рядов метрик не зависело от ID в запросах
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = getattr(scope.get("route"), "path", "unmatched")
+            HTTP_REQUESTS.inc(scope["method"], route, str(status))
+            HTTP_SECONDS.observe(time.perf_counter() - started, scope["method"], route)
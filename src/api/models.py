@@ -38,6 +38,41 @@ class TransactionResponse(TransactionBase):
         from_attributes = True
 
 
+class BulkDeleteRequest(BaseModel):
+    """Модель для массового удаления: список ID или условие отбора"""
+    ids: Optional[List[int]] = Field(None, description="ID удаляемых транзакций")
+    date_from: Optional[str] = Field(None, description="Начальная дата (включительно)")
+    date_to: Optional[str] = Field(None, description="Конечная дата (включительно)")
+    category: Optional[List[str]] = Field(None, description="Категории")
+    type_: Optional[str] = Field(None, alias="type", description="Тип транзакции (Списание/Пополнение)")
+    report_id: Optional[int] = Field(None, description="ID отчёта")
+
+
+class BulkItemResult(BaseModel):
+    """Результат обработки одного элемента массовой операции"""
+    index: int = Field(..., description="Номер элемента в запросе")
+    status: str = Field(..., description="created, deleted, not_found или error")
+    id: Optional[int] = Field(None, description="ID транзакции")
+    error: Optional[str] = Field(None, description="Описание ошибки")
+
+
+class BulkResponse(BaseModel):
+    """Модель ответа для массовых операций"""
+    succeeded: int = Field(..., description="Количество успешно обработанных элементов")
+    failed: int = Field(..., description="Количество элементов с ошибками")
+    items: List[BulkItemResult] = Field(..., description="Результаты по элементам")
+
+
+class SyncResponse(BaseModel):
+    """Модель ответа для синхронизации изменений"""
+    since: int = Field(..., description="Номер изменения, с которого запрошена страница")
+    next: int = Field(..., description="Номер изменения для следующего запроса")
+    has_more: bool = Field(..., description="Есть ли ещё изменения после next")
+    resync: bool = Field(..., description="Журнал сжат: данные нужно загрузить заново и продолжить с next")
+    upserts: List[TransactionResponse] = Field(..., description="Добавленные и изменённые транзакции")
+    deletes: List[int] = Field(..., description="ID удалённых транзакций")
+
+
 class PlanItem(BaseModel):
     """Элемент плана бюджета"""
     category: str = Field(..., description="Категория")
@@ -74,6 +109,49 @@ class ImportResponse(BaseModel):
     report_id: int = Field(..., description="ID созданного отчёта")
     transactions_count: int = Field(..., description="Количество импортированных транзакций")
     message: str = Field(..., description="Сообщение о результате")
+    content_sha256: Optional[str] = Field(None, description="SHA-256 загруженного файла")
+
+
+class ImportPreviewResponse(BaseModel):
+    """Модель ответа для предпросмотра импорта"""
+    format: str = Field(..., description="Формат файла: csv, xlsx или xls")
+    profile: Optional[str] = Field(None, description="Профиль банка, найденный по заголовку")
+    dialect: Optional[Dict[str, Any]] = Field(None, description="Кодировка, разделитель и десятичный знак CSV")
+    columns: List[str] = Field(..., description="Столбцы файла")
+    mapping: Dict[str, Optional[str]] = Field(..., description="Соответствие полей операции столбцам файла")
+    rows: List[Dict[str, Any]] = Field(..., description="Первые строки файла")
+    errors: List[str] = Field(..., description="Ошибки проверки")
+
+
+class ImportJobResponse(BaseModel):
+    """Модель ответа для фоновой задачи импорта"""
+    job_id: str = Field(..., description="ID задачи")
+    filename: str = Field(..., description="Имя загруженного файла")
+    content_sha256: Optional[str] = Field(None, description="SHA-256 загруженного файла")
+    status: str = Field(..., description="Статус: queued, running, done, failed, cancelled")
+    created_at: str = Field(..., description="Время постановки в очередь")
+    rows_processed: int = Field(0, description="Количество записанных строк")
+    bytes_processed: int = Field(0, description="Количество прочитанных байт файла")
+    report_id: Optional[int] = Field(None, description="ID созданного отчёта")
+    stages: Dict[str, float] = Field(default_factory=dict, description="Длительность этапов в секундах")
+    error: Optional[str] = Field(None, description="Описание ошибки")
+
+
+class BankProfileCreate(BaseModel):
+    """Модель для регистрации профиля выписки банка"""
+    name: str = Field(..., description="Название профиля")
+    header: Optional[List[str]] = Field(None, description="Заголовок выписки, по которому узнаётся формат")
+    signature: Optional[str] = Field(None, description="Подпись заголовка, если заголовок не передан")
+    mapping: Dict[str, str] = Field(..., description="Соответствие полей операции столбцам выписки")
+    dialect: Optional[Dict[str, Any]] = Field(None, description="Кодировка, разделитель и десятичный знак CSV")
+    dtypes: Optional[Dict[str, str]] = Field(None, description="Типы столбцов: str или float")
+    date_format: Optional[str] = Field(None, description="Формат даты, например %d.%m.%Y")
+    sign_rule: str = Field("type_column", description="Правило знака: type_column или signed_amount")
+
+
+class BankProfileResponse(BankProfileCreate):
+    """Модель ответа для профиля выписки банка"""
+    signature: str = Field(..., description="Подпись заголовка")
 
 
 class ErrorResponse(BaseModel):
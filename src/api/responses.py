@@ -0,0 +1,30 @@
+"""
+Быстрая сериализация ответов API: orjson, если пакет установлен, иначе стандартный json
+"""
+import json
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps(content) -> bytes:
+    """JSON в байтах UTF-8 без пробелов между элементами"""
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def rows_to_dicts(columns, rows) -> list[dict]:
+    """Строки из базы в словари для ответа без промежуточных моделей Pydantic"""
+    return [dict(zip(columns, row)) for row in rows]
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse, который сериализует содержимое через dumps"""
+
+    def render(self, content) -> bytes:
+        return dumps(content)
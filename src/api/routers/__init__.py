@@ -1,2 +1,2 @@
 # Роутеры для API
-from . import transactions, plan, analytics, import_router
+from . import transactions, plan, analytics, import_router, export, events, sync
@@ -9,22 +9,26 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".
 
 from ..models import AnalyticsResponse, SummaryResponse
 from ..dependencies import get_budget_manager
+from ..executors import run_analytics
+from ..caching import conditional_get
+from .. import formats
 from src.core.manager import BudgetManager
 
-router = APIRouter(prefix="/api/analytics", tags=["analytics"])
+# Все отчёты зависят только от данных в базе, поэтому отвечают 304, пока версия данных не изменилась
+router = APIRouter(prefix="/api/analytics", tags=["analytics"], dependencies=[Depends(conditional_get)])
 
 
 @router.get("/summary", response_model=SummaryResponse)
 async def get_financial_summary(manager: BudgetManager = Depends(get_budget_manager)):
     """Получить общую финансовую сводку"""
     try:
-        summary = manager.get_financial_summary()
+        summary = await run_analytics(manager.get_financial_summary)
         # Преобразуем данные в формат, ожидаемый SummaryResponse
         return SummaryResponse(
             total_income=summary.get("income", 0.0),
             total_expense=summary.get("expense", 0.0),
             balance=summary.get("balance", 0.0),
-            categories=manager.get_summary_by_category()
+            categories=await run_analytics(manager.get_summary_by_category)
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Ошибка получения сводки: {str(e)}")
@@ -35,7 +39,7 @@ async def get_categories_summary(manager: BudgetManager = Depends(get_budget_man
     """Получить сводку по категориям"""
     try:
         from src.core.summary import tran_type
-        categories = manager.get_summary_by_category(tran_type.All)
+        categories = await run_analytics(manager.get_summary_by_category, tran_type.All)
         return categories
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Ошибка получения сводки по категориям: {str(e)}")
@@ -45,7 +49,7 @@ async def get_categories_summary(manager: BudgetManager = Depends(get_budget_man
 async def get_expenses_by_weekday(manager: BudgetManager = Depends(get_budget_manager)):
     """Получить средние расходы по дням недели"""
     try:
-        weekday_expenses = manager.get_expenses_by_weekday()
+        weekday_expenses = await run_analytics(manager.get_expenses_by_weekday)
         return weekday_expenses
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Ошибка получения статистики по дням недели: {str(e)}")
@@ -58,29 +62,40 @@ async def get_top_expense_categories(
 ):
     """Получить топ категории расходов"""
     try:
-        top_categories = manager.get_top_expense_categories(top_n)
+        top_categories = await run_analytics(manager.get_top_expense_categories, top_n)
         return top_categories
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Ошибка получения топ категорий: {str(e)}")
 
 
 @router.get("/graph", response_model=List[List[float]])
-async def get_graph_data(manager: BudgetManager = Depends(get_budget_manager)):
-    """Получить данные для графика баланса"""
+async def get_graph_data(
+    media_type: str = Depends(formats.negotiate),
+    cache_headers: dict = Depends(conditional_get),
+    manager: BudgetManager = Depends(get_budget_manager)
+):
+    """
+    Получить данные для графика баланса: [[даты (timestamp)], [баланс]].
+    По Accept — столбцы date и balance в Arrow IPC или MessagePack
+    """
     try:
-        graph_data = manager.get_graph_summary()
-        return graph_data
+        graph_data = await run_analytics(manager.get_graph_summary)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Ошибка получения данных графика: {str(e)}")
+    if media_type == formats.JSON:
+        return graph_data
+    dates, balance = graph_data if graph_data else ([], [])
+    schema = formats.graph_schema() if media_type == formats.ARROW_STREAM else None
+    return formats.binary_response(media_type, {"date": dates, "balance": balance}, schema, cache_headers)
 
 
 @router.get("/full", response_model=AnalyticsResponse)
 async def get_full_analytics(manager: BudgetManager = Depends(get_budget_manager)):
     """Получить полную аналитику"""
     try:
-        expenses_by_weekday = manager.get_expenses_by_weekday()
-        top_categories = manager.get_top_expense_categories(5)
-        graph_data = manager.get_graph_summary()
+        expenses_by_weekday = await run_analytics(manager.get_expenses_by_weekday)
+        top_categories = await run_analytics(manager.get_top_expense_categories, 5)
+        graph_data = await run_analytics(manager.get_graph_summary)
         
         return AnalyticsResponse(
             expenses_by_weekday=expenses_by_weekday,
@@ -0,0 +1,119 @@
+"""
+Роутер для потока событий изменения данных: Server-Sent Events и WebSocket
+"""
+from fastapi import APIRouter, Depends, WebSocket
+from fastapi.responses import StreamingResponse
+import asyncio
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "..")))
+
+from ..dependencies import get_budget_manager
+from ..executors import run_read
+from ..responses import dumps
+from src.core.manager import BudgetManager
+
+router = APIRouter(prefix="/api/events", tags=["events"])
+
+# Сколько событий может ждать отправки одному клиенту; при переполнении клиент получает resync
+EVENT_QUEUE_SIZE = 1000
+# Пустое сообщение раз в HEARTBEAT_SECONDS не даёт прокси закрыть простаивающее соединение
+HEARTBEAT_SECONDS = 15
+RETRY_MS = 3000
+
+
+class Subscription:
+    """Очередь событий BudgetManager для одного клиента в event loop этого клиента"""
+
+    def __init__(self, manager: BudgetManager):
+        self.manager = manager
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(EVENT_QUEUE_SIZE)
+        self.token = None
+
+    def __enter__(self):
+        self.token = self.manager.events.subscribe(self._on_event)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.manager.events.unsubscribe(self.token)
+
+    def _on_event(self, event: dict):
+        # Вызывается в потоке, который записал изменения
+        self.loop.call_soon_threadsafe(self._put, event)
+
+    def _put(self, event: dict):
+        if self.queue.full():
+            # Клиент не успевает читать: пропущенные изменения он получит полной перезагрузкой
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            event = {"type": "resync", "seq": event["seq"]}
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout: float):
+        """Следующее событие или None, если за timeout секунд событий не было"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+def _sse(event: dict) -> str:
+    seq = f"id: {event['seq']}\n" if "seq" in event else ""
+    return f"{seq}event: {event['type']}\ndata: {dumps(event).decode('utf-8')}\n\n"
+
+
+async def sse_events(manager: BudgetManager):
+    """Поток SSE: событие ready с текущей версией данных, затем события изменений"""
+    with Subscription(manager) as subscription:
+        version = await run_read(manager.data_version)
+        yield f"retry: {RETRY_MS}\n" + _sse({"type": "ready", "version": version})
+        while True:
+            event = await subscription.get(HEARTBEAT_SECONDS)
+            if event is None:
+                yield ": ping\n\n"
+                continue
+            yield _sse(event)
+            if event["type"] == "resync":
+                return
+
+
+@router.get("")
+async def event_stream(manager: BudgetManager = Depends(get_budget_manager)):
+    """
+    Поток событий изменения данных (text/event-stream): вставка, изменение и удаление транзакций
+    с их ID, категориями и днями, новая версия данных и изменения плана.
+    Событие resync означает, что часть событий потеряна и данные нужно загрузить заново
+    """
+    return StreamingResponse(sse_events(manager), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@router.websocket("/ws")
+async def event_socket(websocket: WebSocket, manager: BudgetManager = Depends(get_budget_manager)):
+    """Те же события, что и в /api/events, в виде JSON сообщений WebSocket"""
+    await websocket.accept()
+    with Subscription(manager) as subscription:
+        await websocket.send_json({"type": "ready", "version": await run_read(manager.data_version)})
+        # Сообщения клиента не нужны, но только чтение сообщает об отключении
+        receiver = asyncio.ensure_future(websocket.receive())
+        getter = None
+        try:
+            while True:
+                if getter is None:
+                    getter = asyncio.ensure_future(subscription.get(HEARTBEAT_SECONDS))
+                done, _ = await asyncio.wait({receiver, getter}, return_when=asyncio.FIRST_COMPLETED)
+                if receiver in done:
+                    if receiver.result()["type"] == "websocket.disconnect":
+                        return
+                    receiver = asyncio.ensure_future(websocket.receive())
+                if getter in done:
+                    event, getter = getter.result(), None
+                    await websocket.send_json(event or {"type": "ping"})
+                    if event is not None and event["type"] == "resync":
+                        await websocket.close()
+                        return
+        finally:
+            for task in (receiver, getter):
+                if task is not None:
+                    task.cancel()
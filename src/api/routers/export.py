@@ -0,0 +1,91 @@
+"""
+Роутер для потоковой выгрузки транзакций
+"""
+from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
+import csv
+import io
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "..")))
+
+from ..dependencies import get_budget_manager, transaction_filters
+from ..executors import iterate_read
+from ..responses import dumps, rows_to_dicts
+from .. import formats
+from src.core.DBManager import DBManager
+from src.core.manager import BudgetManager
+
+router = APIRouter(prefix="/api/export", tags=["export"])
+
+# Сколько строк читается из базы и отправляется клиенту за один раз
+EXPORT_BATCH_SIZE = 5000
+
+
+def _ndjson_chunks(batches):
+    for rows in batches:
+        yield b"".join(dumps(item) + b"\n" for item in rows_to_dicts(DBManager.TRANSACTION_COLUMNS, rows))
+
+
+def _csv_chunks(batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # BOM нужен, чтобы Excel открыл кириллицу в UTF-8
+    buffer.write("\ufeff")
+    writer.writerow(DBManager.TRANSACTION_COLUMNS)
+    for rows in batches:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def _attachment(filename: str) -> dict:
+    return {"Content-Disposition": f'attachment; filename="{filename}"'}
+
+
+@router.get("/transactions.ndjson")
+async def export_transactions_ndjson(
+    filters: dict = Depends(transaction_filters),
+    manager: BudgetManager = Depends(get_budget_manager)
+):
+    """
+    Выгрузить транзакции в NDJSON (одна транзакция в строке).
+    Строки читаются из базы порциями в пуле чтения и отправляются по мере чтения
+    """
+    batches = manager.iter_transactions(filters, EXPORT_BATCH_SIZE)
+    return StreamingResponse(iterate_read(_ndjson_chunks(batches)), media_type="application/x-ndjson",
+                             headers=_attachment("transactions.ndjson"))
+
+
+@router.get("/transactions.csv")
+async def export_transactions_csv(
+    filters: dict = Depends(transaction_filters),
+    manager: BudgetManager = Depends(get_budget_manager)
+):
+    """Выгрузить транзакции в CSV, строки читаются из базы порциями и отправляются по мере чтения"""
+    batches = manager.iter_transactions(filters, EXPORT_BATCH_SIZE)
+    return StreamingResponse(iterate_read(_csv_chunks(batches)), media_type="text/csv; charset=utf-8",
+                             headers=_attachment("transactions.csv"))
+
+
+@router.get("/transactions")
+async def export_transactions(
+    filters: dict = Depends(transaction_filters),
+    media_type: str = Depends(formats.negotiate),
+    manager: BudgetManager = Depends(get_budget_manager)
+):
+    """
+    Выгрузить транзакции в формате из Accept: поток Arrow IPC (каждая порция — record batch),
+    MessagePack (словарь столбцов на порцию) или NDJSON по умолчанию
+    """
+    batches = manager.iter_transactions(filters, EXPORT_BATCH_SIZE)
+    if media_type == formats.JSON:
+        chunks, media_type = _ndjson_chunks(batches), "application/x-ndjson"
+    else:
+        names = DBManager.TRANSACTION_COLUMNS
+        schema = formats.transactions_schema(names) if media_type == formats.ARROW_STREAM else None
+        chunks = formats.stream_chunks(media_type, names, batches, schema)
+    return StreamingResponse(iterate_read(chunks), media_type=media_type)
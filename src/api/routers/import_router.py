@@ -1,17 +1,35 @@
 """
 Роутер для импорта данных
 """
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query
+from typing import List
+import hashlib
+import io
 import sys
 import os
+import tempfile
+import time
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "..")))
 
-from ..models import ImportResponse
-from ..dependencies import get_budget_manager
+from ..models import (ImportResponse, ImportJobResponse, ImportPreviewResponse,
+                      BankProfileCreate, BankProfileResponse)
+from ..dependencies import get_budget_manager, get_import_jobs, get_tenant, get_tenants
+from ..executors import run_read, run_write
+from ..jobs import ImportJobRegistry
 from src.core.manager import BudgetManager
+from src.core.parser import STATEMENT_EXTENSIONS
 
 router = APIRouter(prefix="/api/import", tags=["import"])
 
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+# Для предпросмотра текстовых выписок читается только начало загрузки
+PREVIEW_CSV_BYTES = 1024 * 1024
+PREVIEW_TEXT_EXTENSIONS = (".csv", ".ofx", ".qfx", ".qif")
+UNSUPPORTED_FORMAT = "Файл должен быть выпиской CSV, Excel (.xlsx или .xls), OFX/QFX, QIF или CAMT.053 (.xml)"
+# Загрузки до SPOOL_MAX_SIZE держатся в памяти, больше — во временном файле ОС
+SPOOL_MAX_SIZE = 16 * 1024 * 1024
+MAX_UPLOAD_SIZE = int(os.environ.get("BUDGET_MAX_UPLOAD_MB", "512")) * 1024 * 1024
+
 
 @router.post("/csv", response_model=ImportResponse)
 async def import_csv(
@@ -19,73 +37,169 @@ async def import_csv(
     manager: BudgetManager = Depends(get_budget_manager)
 ):
     """Импорт транзакций из CSV файла"""
+    # Проверяем тип файла
+    if not file.filename.endswith('.csv'):
+        raise HTTPException(status_code=400, detail="Файл должен быть в формате CSV")
+    return await _import_upload(file, manager)
+
+
+@router.post("/excel", response_model=ImportResponse)
+async def import_excel(
+    file: UploadFile = File(...),
+    manager: BudgetManager = Depends(get_budget_manager)
+):
+    """Импорт транзакций из Excel файла"""
+    # Проверяем тип файла
+    if not (file.filename.endswith('.xlsx') or file.filename.endswith('.xls')):
+        raise HTTPException(status_code=400, detail="Файл должен быть в формате Excel (.xlsx или .xls)")
+    return await _import_upload(file, manager)
+
+
+async def _import_upload(file: UploadFile, manager: BudgetManager) -> ImportResponse:
+    """Импортирует загруженный файл прямо из буфера, без временного файла в рабочей директории"""
+    buffer, sha256, _ = await receive_upload(file)
     try:
-        # Проверяем тип файла
-        if not file.filename.endswith('.csv'):
-            raise HTTPException(status_code=400, detail="Файл должен быть в формате CSV")
-        
-        # Сохраняем временный файл
-        temp_file_path = f"temp_{file.filename}"
-        with open(temp_file_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
-        
-        # Импортируем данные
-        report_id = manager.import_from_file(temp_file_path)
-        
-        # Удаляем временный файл
-        os.remove(temp_file_path)
-        
+        # Импортируем данные в пуле записи, чтобы не блокировать event loop
+        report_id = await run_write(manager.import_from_file, file.filename, source=buffer)
+
         # Получаем количество импортированных транзакций
-        transactions = manager.get_transactions()
-        imported_count = len([t for t in transactions if t.report_id == report_id])
-        
+        imported_count = await run_read(manager.count_transactions_by_report, report_id)
+
         return ImportResponse(
             report_id=report_id,
             transactions_count=imported_count,
-            message=f"Успешно импортировано {imported_count} транзакций"
+            message=f"Успешно импортировано {imported_count} транзакций",
+            content_sha256=sha256
         )
-        
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Ошибка импорта: {str(e)}")
+    finally:
+        buffer.close()
 
 
-@router.post("/excel", response_model=ImportResponse)
-async def import_excel(
+@router.post("/preview", response_model=ImportPreviewResponse)
+async def preview_import(
     file: UploadFile = File(...),
+    nrows: int = Query(20, ge=1, le=1000, description="Количество строк образца"),
     manager: BudgetManager = Depends(get_budget_manager)
 ):
-    """Импорт транзакций из Excel файла"""
+    """Предпросмотр импорта: диалект, соответствие столбцов, первые строки и ошибки без записи в базу"""
+    ext = os.path.splitext(file.filename)[1].lower()
+    if ext not in STATEMENT_EXTENSIONS:
+        raise HTTPException(status_code=400, detail=UNSUPPORTED_FORMAT)
+
+    if ext in PREVIEW_TEXT_EXTENSIONS:
+        # Начало файла, обрезанное по последней целой строке
+        head = await file.read(PREVIEW_CSV_BYTES)
+        if len(head) == PREVIEW_CSV_BYTES and b"\n" in head:
+            head = head[:head.rindex(b"\n") + 1]
+        buffer = io.BytesIO(head)
+    else:
+        # Оглавление xlsx лежит в конце архива, а XML должен быть разобран целиком
+        buffer, _, _ = await receive_upload(file)
     try:
-        # Проверяем тип файла
-        if not (file.filename.endswith('.xlsx') or file.filename.endswith('.xls')):
-            raise HTTPException(status_code=400, detail="Файл должен быть в формате Excel (.xlsx или .xls)")
-        
-        # Сохраняем временный файл
-        temp_file_path = f"temp_{file.filename}"
-        with open(temp_file_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
-        
-        # Импортируем данные
-        report_id = manager.import_from_file(temp_file_path)
-        
-        # Удаляем временный файл
-        os.remove(temp_file_path)
-        
-        # Получаем количество импортированных транзакций
-        transactions = manager.get_transactions()
-        imported_count = len([t for t in transactions if t.report_id == report_id])
-        
-        return ImportResponse(
-            report_id=report_id,
-            transactions_count=imported_count,
-            message=f"Успешно импортировано {imported_count} транзакций"
-        )
-        
+        preview = await run_read(manager.preview_file, file.filename, nrows, buffer)
+        return ImportPreviewResponse(**preview)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Ошибка импорта: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Ошибка предпросмотра: {str(e)}")
+    finally:
+        buffer.close()
+
+
+async def receive_upload(file: UploadFile, max_size: int = None):
+    """
+    Читает загрузку порциями в SpooledTemporaryFile: небольшие файлы остаются в памяти,
+    большие уходят во временный файл ОС. SHA-256 считается по ходу чтения.
+    Возвращает (буфер, sha256, размер). Файлы больше max_size отклоняются с кодом 413.
+    """
+    max_size = MAX_UPLOAD_SIZE if max_size is None else max_size
+    if file.size is not None and file.size > max_size:
+        raise HTTPException(status_code=413, detail=f"Файл больше {max_size // (1024 * 1024)} МБ")
+
+    buffer = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    digest = hashlib.sha256()
+    size = 0
+    while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+        size += len(chunk)
+        if size > max_size:
+            buffer.close()
+            raise HTTPException(status_code=413, detail=f"Файл больше {max_size // (1024 * 1024)} МБ")
+        digest.update(chunk)
+        buffer.write(chunk)
+    buffer.seek(0)
+    return buffer, digest.hexdigest(), size
+
+
+@router.post("/jobs", response_model=ImportJobResponse, status_code=202)
+async def create_import_job(
+    file: UploadFile = File(...),
+    manager: BudgetManager = Depends(get_budget_manager),
+    jobs: ImportJobRegistry = Depends(get_import_jobs),
+    tenant: str = Depends(get_tenant)
+):
+    """Поставить импорт выписки (CSV, Excel, OFX, QIF, CAMT.053) в очередь. Возвращает ID задачи сразу после загрузки"""
+    ext = os.path.splitext(file.filename)[1].lower()
+    if ext not in STATEMENT_EXTENSIONS:
+        raise HTTPException(status_code=400, detail=UNSUPPORTED_FORMAT)
+
+    # Буфер с загрузкой передаётся задаче, она же его и закроет
+    started = time.perf_counter()
+    buffer, sha256, _ = await receive_upload(file)
+    # Менеджер арендатора остаётся открытым, пока задача не завершится
+    job = jobs.submit(manager, buffer, file.filename, stages={"upload": time.perf_counter() - started}, sha256=sha256,
+                      on_done=get_tenants().retain(manager), tenant=tenant)
+    return ImportJobResponse(**job.to_dict())
+
+
+@router.get("/jobs/{job_id}", response_model=ImportJobResponse)
+async def get_import_job(
+    job_id: str,
+    jobs: ImportJobRegistry = Depends(get_import_jobs),
+    tenant: str = Depends(get_tenant)
+):
+    """Получить статус задачи импорта: прогресс, длительность этапов и ошибки"""
+    job = jobs.get(job_id, tenant)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Задача импорта {job_id} не найдена")
+    return ImportJobResponse(**job.to_dict())
+
+
+@router.delete("/jobs/{job_id}", response_model=ImportJobResponse)
+async def cancel_import_job(
+    job_id: str,
+    jobs: ImportJobRegistry = Depends(get_import_jobs),
+    tenant: str = Depends(get_tenant)
+):
+    """Отменить задачу импорта. Уже записанные строки будут удалены"""
+    job = jobs.cancel(job_id, tenant)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Задача импорта {job_id} не найдена")
+    return ImportJobResponse(**job.to_dict())
+
+
+@router.get("/profiles", response_model=List[BankProfileResponse])
+async def get_bank_profiles(manager: BudgetManager = Depends(get_budget_manager)):
+    """Получить зарегистрированные профили выписок банков"""
+    try:
+        return [BankProfileResponse(**profile.to_json()) for profile in await run_read(manager.get_profiles)]
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Ошибка получения профилей: {str(e)}")
+
+
+@router.post("/profiles", response_model=BankProfileResponse, status_code=201)
+async def register_bank_profile(
+    profile: BankProfileCreate,
+    manager: BudgetManager = Depends(get_budget_manager)
+):
+    """Зарегистрировать профиль выписки банка. Следующие импорты с таким заголовком используют его без определения формата"""
+    try:
+        saved = await run_write(manager.register_profile, **profile.model_dump())
+        return BankProfileResponse(**saved.to_json())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Ошибка сохранения профиля: {str(e)}")
@@ -8,6 +8,7 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".
 
 from ..models import PlanCreate, PlanResponse
 from ..dependencies import get_budget_manager
+from ..executors import run_read, run_write, run_analytics
 from src.core.manager import BudgetManager
 
 router = APIRouter(prefix="/api/plan", tags=["plan"])
@@ -17,11 +18,11 @@ router = APIRouter(prefix="/api/plan", tags=["plan"])
 async def get_plan(manager: BudgetManager = Depends(get_budget_manager)):
     """Получить текущий план бюджета"""
     try:
-        manager.load_plan()
+        await run_read(manager.load_plan)
         if not manager.plan:
             return PlanResponse(plan={})
         
-        return PlanResponse(plan=manager.get_current_plan_state())
+        return PlanResponse(plan=await run_read(manager.get_current_plan_state))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Ошибка получения плана: {str(e)}")
 
@@ -42,7 +43,7 @@ async def create_plan(
         plan = Plan([{"category": cat, "plan_expense": amount} for cat, amount in plan_dict.items()])
         
         # Сохраняем план
-        manager.save_plan(plan)
+        await run_write(manager.save_plan, plan)
         manager.plan = plan
         
         return {"message": "План успешно создан"}
@@ -60,7 +61,7 @@ async def update_plan(
         from src.core.plan import Plan
         
         # Получаем текущее состояние плана
-        old_state = manager.get_current_plan_state()
+        old_state = await run_read(manager.get_current_plan_state)
         
         # Преобразуем данные в формат Plan
         plan_dict = {item.category: item.plan_expense for item in plan_data.plan}
@@ -69,10 +70,10 @@ async def update_plan(
         plan = Plan([{"category": cat, "plan_expense": amount} for cat, amount in plan_dict.items()])
         
         # Сохраняем изменения в стек отмены
-        manager.save_plan_changes(old_state, plan_dict)
+        await run_write(manager.save_plan_changes, old_state, plan_dict)
         
         # Сохраняем план
-        manager.save_plan(plan)
+        await run_write(manager.save_plan, plan)
         manager.plan = plan
         
         return {"message": "План успешно обновлён"}
@@ -84,12 +85,12 @@ async def update_plan(
 async def get_plan_progress(manager: BudgetManager = Depends(get_budget_manager)):
     """Получить прогресс выполнения плана"""
     try:
-        manager.load_plan()
+        await run_read(manager.load_plan)
         if not manager.plan:
             return {"message": "План не найден"}
         
-        plan_state = manager.get_current_plan_state()
-        expenses_by_category = manager.get_summary_by_category()
+        plan_state = await run_read(manager.get_current_plan_state)
+        expenses_by_category = await run_analytics(manager.get_summary_by_category)
         
         progress = {}
         for category, planned_amount in plan_state.items():
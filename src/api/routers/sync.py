@@ -0,0 +1,43 @@
+"""
+Роутер для синхронизации клиентов по журналу изменений
+"""
+from fastapi import APIRouter, Depends, HTTPException, Query
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "..")))
+
+from ..models import SyncResponse
+from ..dependencies import get_budget_manager
+from ..executors import run_read
+from ..responses import FastJSONResponse, rows_to_dicts
+from src.core.DBManager import DBManager
+from src.core.manager import BudgetManager
+
+router = APIRouter(prefix="/api/sync", tags=["sync"])
+
+SYNC_PAGE_SIZE = 1000
+MAX_SYNC_PAGE_SIZE = 10_000
+
+
+@router.get("", response_model=SyncResponse)
+async def get_changes(
+    since: int = Query(0, ge=0, description="Номер изменения из поля next предыдущего ответа"),
+    limit: int = Query(SYNC_PAGE_SIZE, ge=1, le=MAX_SYNC_PAGE_SIZE, description="Размер страницы"),
+    manager: BudgetManager = Depends(get_budget_manager)
+):
+    """
+    Добавленные, изменённые и удалённые транзакции после номера since. Каждая транзакция входит
+    в ответ один раз, в последнем состоянии. Пока has_more, запрашивайте следующую страницу с since=next.
+    resync=true означает, что журнал сжат: загрузите данные целиком (например, /api/export/transactions)
+    и продолжайте с since=next
+    """
+    try:
+        changes = await run_read(manager.get_changes, since, limit)
+        if changes is None:
+            return FastJSONResponse({"since": since, "next": await run_read(manager.last_change),
+                                     "has_more": False, "resync": True, "upserts": [], "deletes": []})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Ошибка получения изменений: {str(e)}")
+    upserts, deletes, last, has_more = changes
+    return FastJSONResponse({"since": since, "next": last, "has_more": has_more, "resync": False,
+                             "upserts": rows_to_dicts(DBManager.TRANSACTION_COLUMNS, upserts), "deletes": deletes})
@@ -1,38 +1,90 @@
 """
 Роутер для работы с транзакциями
 """
-from fastapi import APIRouter, Depends, HTTPException
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from pydantic import ValidationError
+from typing import List, Optional
+import asyncio
+import base64
+import json
 import sys
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "..")))
 
-from ..models import TransactionCreate, TransactionResponse, TransactionUpdate
-from ..dependencies import get_budget_manager
+from ..models import (TransactionCreate, TransactionResponse, TransactionUpdate,
+                      BulkDeleteRequest, BulkItemResult, BulkResponse)
+from ..dependencies import get_budget_manager, transaction_filters
+from ..executors import run_read, run_write, run_analytics
+from ..caching import conditional_get
+from ..responses import FastJSONResponse, rows_to_dicts
+from .. import formats
+from src.core.DBManager import DBManager
 from src.core.manager import BudgetManager
 from src.core.transaction import Transaction
 
 router = APIRouter(prefix="/api/transactions", tags=["transactions"])
 
+# Сколько проверенных элементов массового добавления записывается одной пакетной вставкой
+BULK_BATCH_SIZE = 1000
+# Сколько секунд ждать следующую часть тела массового добавления, прежде чем ответить 408
+BULK_READ_TIMEOUT = float(os.environ.get("BUDGET_BULK_READ_TIMEOUT", 30))
+BODY_TIMEOUT = f"Тело запроса не получено за {BULK_READ_TIMEOUT:g} с"
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+MAX_PAGE_SIZE = 10_000
+
 
 @router.get("/", response_model=List[TransactionResponse])
-async def get_transactions(manager: BudgetManager = Depends(get_budget_manager)):
-    """Получить все транзакции"""
+async def get_transactions(
+    filters: dict = Depends(transaction_filters),
+    sort: str = Query("date", description="Поле сортировки: id, date, amount или category"),
+    order: str = Query("desc", pattern="^(asc|desc)$", description="Направление сортировки"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Размер страницы"),
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы из заголовка X-Next-Cursor"),
+    fields: Optional[str] = Query(None, description="Поля ответа через запятую, например id,amount,date"),
+    media_type: str = Depends(formats.negotiate),
+    cache_headers: dict = Depends(conditional_get),
+    manager: BudgetManager = Depends(get_budget_manager)
+):
+    """
+    Получить транзакции. Фильтры, сортировка и выбор полей выполняются запросом к базе.
+    При limit ответ — одна страница; если есть следующая, её курсор в заголовке X-Next-Cursor.
+    По Accept ответ может быть колоночным: Arrow IPC (application/vnd.apache.arrow.stream) или MessagePack
+    """
+    columns = [field.strip() for field in fields.split(",") if field.strip()] if fields else None
     try:
-        transactions = manager.get_transactions()
-        return [
-            TransactionResponse(
-                id=t.id,
-                amount=t.amount,
-                category=t.category,
-                note=t.note,
-                date=t.date,
-                type=t.type_,  # Используем alias 'type' вместо 'type_'
-                report_id=t.report_id
-            ) for t in transactions
-        ]
+        after = _decode_cursor(cursor, sort, order) if cursor else None
+        rows, next_key = await run_read(manager.query_transactions, filters, sort, order == "desc",
+                                        limit, after, columns)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Ошибка получения транзакций: {str(e)}")
+    names = columns or list(DBManager.TRANSACTION_COLUMNS)
+    headers = dict(cache_headers)
+    if next_key:
+        headers["X-Next-Cursor"] = _encode_cursor(next_key, sort, order)
+    if media_type != formats.JSON:
+        schema = formats.transactions_schema(names) if media_type == formats.ARROW_STREAM else None
+        return formats.binary_response(media_type, formats.columns(names, rows), schema, headers)
+    # Строки из базы сериализуются напрямую, без моделей TransactionResponse и их повторной проверки
+    return FastJSONResponse(rows_to_dicts(names, rows), headers=headers)
+
+
+def _encode_cursor(key, sort: str, order: str) -> str:
+    """Курсор страницы: ключ последней строки вместе с сортировкой, для которой он получен"""
+    data = json.dumps({"sort": sort, "order": order, "key": list(key)}, ensure_ascii=False)
+    return base64.urlsafe_b64encode(data.encode("utf-8")).decode("ascii")
+
+
+def _decode_cursor(cursor: str, sort: str, order: str) -> tuple:
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        key = tuple(data["key"])
+    except (ValueError, KeyError, TypeError):
+        raise ValueError("Некорректный курсор") from None
+    if (data.get("sort"), data.get("order")) != (sort, order) or len(key) != 2:
+        raise ValueError("Курсор получен для другой сортировки")
+    return key
 
 
 @router.post("/", response_model=dict)
@@ -50,12 +102,138 @@ async def create_transaction(
             type_=transaction.type_,
             report_id=transaction.report_id
         )
-        manager.add_transaction(new_transaction)
+        await run_write(manager.add_transaction, new_transaction)
         return {"message": "Транзакция успешно создана"}
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Ошибка создания транзакции: {str(e)}")
 
 
+@router.post("/bulk", response_model=BulkResponse)
+async def create_transactions_bulk(request: Request, manager: BudgetManager = Depends(get_budget_manager)):
+    """
+    Массовое добавление транзакций. Тело — JSON массив или поток NDJSON
+    (Content-Type: application/x-ndjson, одна транзакция в строке).
+    Элементы читаются и проверяются в event loop, а в поток записи передаются только готовые порции.
+    Ошибочные элементы пропускаются и попадают в результат. Всё добавление отменяется одним действием;
+    если тело перестало приходить дольше BULK_READ_TIMEOUT секунд, записанные порции удаляются и ответ — 408
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    if content_type in NDJSON_TYPES:
+        records = _ndjson_records(request)
+    else:
+        try:
+            body = await asyncio.wait_for(request.json(), BULK_READ_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=408, detail=BODY_TIMEOUT)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Тело запроса должно быть JSON массивом или NDJSON")
+        if not isinstance(body, list):
+            raise HTTPException(status_code=400, detail="Тело запроса должно быть JSON массивом или NDJSON")
+        records = _list_records(body)
+
+    items = []
+    written = []  # номера элементов в порядке записи
+    ids = []
+    try:
+        try:
+            async for batch in _validated_batches(records, items):
+                ids += await run_write(manager.insert_transactions, [row for _, row in batch])
+                written.extend(index for index, _ in batch)
+        except BaseException:
+            if ids:
+                await run_write(manager.discard_transactions, ids)
+            raise
+        await run_write(manager.finish_transactions_bulk, ids)
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Ошибка массового добавления: {str(e)}")
+
+    items += [BulkItemResult(index=index, status="created", id=id_) for index, id_ in zip(written, ids)]
+    items.sort(key=lambda item: item.index)
+    return BulkResponse(succeeded=len(ids), failed=len(items) - len(ids), items=items)
+
+
+async def _ndjson_records(request: Request):
+    """Строки NDJSON из потока тела запроса: пары (номер, байты строки)"""
+    index = 0
+    rest = b""
+    stream = request.stream()
+    while True:
+        try:
+            chunk = await asyncio.wait_for(anext(stream), BULK_READ_TIMEOUT)
+        except StopAsyncIteration:
+            break
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=408, detail=BODY_TIMEOUT)
+        lines = (rest + chunk).split(b"\n")
+        rest = lines.pop()
+        for line in lines:
+            if line.strip():
+                yield index, line
+                index += 1
+    if rest.strip():
+        yield index, rest
+
+
+async def _list_records(body: list):
+    for index, item in enumerate(body):
+        yield index, item
+
+
+async def _validated_batches(records, errors: list):
+    """
+    Проверяет элементы моделью TransactionCreate и собирает порции (номер, строка для вставки).
+    Ошибки проверки добавляются в errors.
+    """
+    batch = []
+    async for index, record in records:
+        try:
+            if isinstance(record, bytes):
+                t = TransactionCreate.model_validate_json(record)
+            else:
+                t = TransactionCreate.model_validate(record)
+        except ValidationError as e:
+            message = "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+            errors.append(BulkItemResult(index=index, status="error", error=message))
+            continue
+        batch.append((index, (t.report_id, t.amount, t.category, t.note, t.date, t.type_)))
+        if len(batch) >= BULK_BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+@router.post("/bulk-delete", response_model=BulkResponse)
+async def delete_transactions_bulk(
+    request: BulkDeleteRequest,
+    manager: BudgetManager = Depends(get_budget_manager)
+):
+    """
+    Массовое удаление по списку ID или по условию (даты, категории, тип, отчёт).
+    Всё удаление отменяется одним действием
+    """
+    filters = request.model_dump(exclude={"ids"}, by_alias=True)
+    try:
+        deleted = await run_write(manager.delete_transactions, request.ids, filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Ошибка массового удаления: {str(e)}")
+
+    if request.ids:
+        found = set(deleted)
+        items = [BulkItemResult(index=index, id=id_, status="deleted" if id_ in found else "not_found")
+                 for index, id_ in enumerate(request.ids)]
+    else:
+        items = [BulkItemResult(index=index, id=id_, status="deleted") for index, id_ in enumerate(deleted)]
+    failed = sum(1 for item in items if item.status != "deleted")
+    return BulkResponse(succeeded=len(items) - failed, failed=failed, items=items)
+
+
 @router.delete("/{transaction_id}", response_model=dict)
 async def delete_transaction(
     transaction_id: int,
@@ -63,7 +241,7 @@ async def delete_transaction(
 ):
     """Удалить транзакцию по ID"""
     try:
-        manager.delete_transaction(transaction_id)
+        await run_write(manager.delete_transaction, transaction_id)
         return {"message": f"Транзакция {transaction_id} успешно удалена"}
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
@@ -71,21 +249,72 @@ async def delete_transaction(
         raise HTTPException(status_code=500, detail=f"Ошибка удаления транзакции: {str(e)}")
 
 
-@router.get("/summary", response_model=dict)
+@router.get("/summary", response_model=dict, dependencies=[Depends(conditional_get)])
 async def get_transactions_summary(manager: BudgetManager = Depends(get_budget_manager)):
     """Получить сводку по транзакциям"""
     try:
-        summary = manager.get_financial_summary()
+        summary = await run_analytics(manager.get_financial_summary)
         return summary
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Ошибка получения сводки: {str(e)}")
 
 
-@router.get("/categories", response_model=List[str])
+@router.get("/categories", response_model=List[str], dependencies=[Depends(conditional_get)])
 async def get_categories(manager: BudgetManager = Depends(get_budget_manager)):
     """Получить все категории"""
     try:
-        categories = manager.get_all_categories()
+        categories = await run_read(manager.get_all_categories)
         return categories
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Ошибка получения категорий: {str(e)}")
+
+
+@router.get("/{transaction_id}", response_model=TransactionResponse)
+async def get_transaction(
+    transaction_id: int,
+    manager: BudgetManager = Depends(get_budget_manager)
+):
+    """Получить транзакцию по ID"""
+    try:
+        t = await run_read(manager.get_transaction, transaction_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Ошибка получения транзакции: {str(e)}")
+    if t is None:
+        raise HTTPException(status_code=404, detail=f"Транзакция с ID {transaction_id} не найдена")
+    return TransactionResponse(
+        id=t.id,
+        amount=t.amount,
+        category=t.category,
+        note=t.note,
+        date=t.date,
+        type=t.type_,
+        report_id=t.report_id
+    )
+
+
+@router.patch("/{transaction_id}", response_model=TransactionResponse)
+async def update_transaction(
+    transaction_id: int,
+    update: TransactionUpdate,
+    manager: BudgetManager = Depends(get_budget_manager)
+):
+    """Изменить поля транзакции. Передаются только изменяемые поля"""
+    fields = update.model_dump(exclude_unset=True, exclude_none=True, by_alias=True)
+    if not fields:
+        raise HTTPException(status_code=400, detail="Не указаны поля для изменения")
+    try:
+        await run_write(manager.update_transaction, transaction_id, fields)
+        t = await run_read(manager.get_transaction, transaction_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Ошибка изменения транзакции: {str(e)}")
+    return TransactionResponse(
+        id=t.id,
+        amount=t.amount,
+        category=t.category,
+        note=t.note,
+        date=t.date,
+        type=t.type_,
+        report_id=t.report_id
+    )
@@ -0,0 +1,164 @@
+"""
+Реестр BudgetManager по арендаторам (домохозяйствам): у каждого свой файл SQLite и свой план.
+Открытыми держатся последние max_open менеджеров; менеджер без запросов дольше idle_seconds
+закрывается вместе с соединениями и откроется заново при следующем запросе.
+"""
+import asyncio
+import os
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from src.core.manager import BudgetManager
+
+TENANTS_DIR = os.environ.get("BUDGET_TENANTS_DIR",
+                             os.path.join(os.path.dirname(__file__), "..", "data", "tenants"))
+TENANT_MAX_OPEN = int(os.environ.get("BUDGET_TENANT_MAX_OPEN", 64))
+TENANT_IDLE_SECONDS = float(os.environ.get("BUDGET_TENANT_IDLE_SECONDS", 600))
+# Как часто фоновая задача приложения закрывает простаивающие менеджеры
+TENANT_EVICT_INTERVAL = float(os.environ.get("BUDGET_TENANT_EVICT_INTERVAL", 60))
+# ID арендатора становится именем каталога, поэтому допускаются только безопасные символы
+TENANT_ID = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+# Запросы без ID арендатора работают с общей базой, как до появления арендаторов
+DEFAULT_TENANT = ""
+
+
+def check_tenant_id(tenant: str) -> str:
+    if tenant != DEFAULT_TENANT and not TENANT_ID.match(tenant):
+        raise ValueError("ID арендатора: от 1 до 64 латинских букв, цифр, '-' и '_'")
+    return tenant
+
+
+class _Entry:
+    def __init__(self):
+        self.manager = None
+        self.error = None
+        self.ready = threading.Event()  # Установлен, когда база открыта или открыть её не удалось
+        self.active = 0  # Запросы и фоновые задачи, которые сейчас используют менеджер
+        self.last_used = time.monotonic()
+
+
+class TenantRegistry:
+    """LRU открытых BudgetManager; занятые менеджеры не закрываются, даже если вытеснены из LRU"""
+
+    def __init__(self, base_dir: str = TENANTS_DIR, max_open: int = TENANT_MAX_OPEN,
+                 idle_seconds: float = TENANT_IDLE_SECONDS):
+        self.base_dir = base_dir
+        self.max_open = max_open
+        self.idle_seconds = idle_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create_manager(self, tenant: str) -> BudgetManager:
+        if tenant == DEFAULT_TENANT:
+            return BudgetManager()
+        directory = os.path.join(self.base_dir, tenant)
+        return BudgetManager(db_file=os.path.join(directory, "budget.db"),
+                             plan_file=os.path.join(directory, "user_plan.json"))
+
+    def acquire(self, tenant: str) -> BudgetManager:
+        """Менеджер арендатора, занятый до release(); открывается при первом обращении"""
+        check_tenant_id(tenant)
+        with self._lock:
+            entry = self._entries.get(tenant)
+            opening = entry is None
+            if opening:
+                entry = self._entries[tenant] = _Entry()
+            else:
+                self._entries.move_to_end(tenant)
+            entry.active += 1
+
+        # База открывается вне общей блокировки, чтобы не задерживать запросы других арендаторов;
+        # остальные запросы этого арендатора ждут, пока её откроет первый
+        if opening:
+            try:
+                entry.manager = self.create_manager(tenant)
+            except BaseException as e:
+                entry.error = e
+                with self._lock:
+                    if self._entries.get(tenant) is entry:
+                        del self._entries[tenant]
+                raise
+            finally:
+                entry.ready.set()
+        else:
+            entry.ready.wait()
+            if entry.manager is None:
+                raise entry.error
+
+        with self._lock:
+            evicted = self._evict_locked()
+        self._close(evicted)
+        return entry.manager
+
+    def release(self, tenant: str):
+        with self._lock:
+            entry = self._entries.get(tenant)
+            if entry is None:
+                return
+            entry.active -= 1
+            entry.last_used = time.monotonic()
+            evicted = self._evict_locked()
+        self._close(evicted)
+
+    def retain(self, manager: BudgetManager):
+        """
+        Занимает менеджер ещё раз (для фоновой задачи, которая переживёт запрос)
+        и возвращает функцию освобождения. Для менеджера не из реестра ничего не делает.
+        """
+        with self._lock:
+            for tenant, entry in self._entries.items():
+                if entry.manager is manager:
+                    entry.active += 1
+                    return lambda: self.release(tenant)
+        return lambda: None
+
+    def evict_idle(self):
+        """Закрывает менеджеры без запросов дольше idle_seconds"""
+        with self._lock:
+            evicted = self._evict_locked()
+        self._close(evicted)
+
+    async def evict_idle_forever(self, interval: float = TENANT_EVICT_INTERVAL):
+        """Фоновая задача приложения: раз в interval секунд закрывает простаивающие менеджеры"""
+        while True:
+            await asyncio.sleep(interval)
+            # Закрытие соединений блокирует, поэтому выполняется вне event loop
+            await asyncio.to_thread(self.evict_idle)
+
+    def _evict_locked(self) -> list[BudgetManager]:
+        cutoff = time.monotonic() - self.idle_seconds
+        excess = len(self._entries) - self.max_open
+        evicted = []
+        # Самые давно использованные — в начале
+        for tenant, entry in list(self._entries.items()):
+            if excess <= 0 and entry.last_used >= cutoff:
+                break
+            if entry.active:
+                continue
+            del self._entries[tenant]
+            evicted.append(entry.manager)
+            excess -= 1
+        return evicted
+
+    @staticmethod
+    def _close(managers):
+        for manager in managers:
+            try:
+                manager.close()
+            except Exception as e:
+                print(f"❌ Ошибка закрытия базы арендатора: {e}")
+
+    def close_all(self):
+        with self._lock:
+            managers = [entry.manager for entry in self._entries.values() if entry.manager is not None]
+            self._entries.clear()
+        self._close(managers)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"open": len(self._entries), "active": sum(1 for e in self._entries.values() if e.active),
+                    "max_open": self.max_open}
@@ -1,10 +1,57 @@
 import sqlite3
 import os
 import threading
+import time
 from datetime import datetime
 from contextlib import contextmanager
 
 from src.core.transaction import Transaction, from_list
+from src.core import metrics
+
+
+class _TimedCursor(sqlite3.Cursor):
+    """Курсор, который учитывает число и время SQL запросов в метриках"""
+
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            metrics.observe_query(sql, time.perf_counter() - started)
+
+    def executemany(self, sql, seq_of_parameters):
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            metrics.observe_query(sql, time.perf_counter() - started)
+
+
+class _TimedConnection(sqlite3.Connection):
+    """Соединение, которое учитывает в метриках запросы через execute() и через свои курсоры"""
+
+    def cursor(self, factory=_TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            metrics.observe_query(sql, time.perf_counter() - started)
+
+    def executemany(self, sql, seq_of_parameters):
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            metrics.observe_query(sql, time.perf_counter() - started)
+
+
+def connect(db_file):
+    """Соединение SQLite с учётом запросов в метриках"""
+    metrics.DB_CONNECTIONS.inc()
+    return sqlite3.connect(db_file, check_same_thread=False, factory=_TimedConnection)
 
 
 class DBManager:
@@ -12,6 +59,8 @@ class DBManager:
         os.makedirs(os.path.dirname(db_file), exist_ok=True)
         self.db_file = db_file
         self._local = threading.local()
+        self._connections = []  # Соединения всех потоков, чтобы close() мог их закрыть
+        self._connections_lock = threading.Lock()
         self._init_database()
     
     def _init_database(self):
@@ -32,20 +81,142 @@ class DBManager:
                                         type TEXT,
                                         FOREIGN KEY (report_id) REFERENCES reports(id)
                                     )''')
+            conn.execute('''CREATE TABLE IF NOT EXISTS bank_profiles (
+                                        signature TEXT PRIMARY KEY,
+                                        name TEXT,
+                                        profile TEXT
+                                    )''')
+            # Журнал отмены: stack = 'undo' или 'redo', action — описание действия в JSON
+            conn.execute('''CREATE TABLE IF NOT EXISTS undo_journal (
+                                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                                        stack TEXT NOT NULL,
+                                        action TEXT NOT NULL,
+                                        size INTEGER NOT NULL,
+                                        created TEXT
+                                    )''')
+            # Удалённые транзакции, которые ещё можно вернуть отменой; tag — метка действия
+            conn.execute('''CREATE TABLE IF NOT EXISTS transactions_trash (
+                                        id INTEGER PRIMARY KEY,
+                                        report_id INTEGER,
+                                        amount REAL,
+                                        category TEXT,
+                                        note TEXT,
+                                        date TEXT,
+                                        type TEXT,
+                                        tag TEXT NOT NULL
+                                    )''')
+            # Служебные значения; data_version увеличивается при каждой фиксации изменений
+            conn.execute('''CREATE TABLE IF NOT EXISTS meta (
+                                        key TEXT PRIMARY KEY,
+                                        value INTEGER NOT NULL
+                                    )''')
+            conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('data_version', 0)")
+            # Журнал изменений для синхронизации клиентов: последняя операция над каждой транзакцией
+            # с возрастающим номером seq. Пишется триггерами, поэтому учитывает любые изменения,
+            # включая отмену, повтор и удаление отчётов. change_log_floor — до какого номера журнал сжат
+            has_log = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'change_log'").fetchone()
+            conn.execute('''CREATE TABLE IF NOT EXISTS change_log (
+                                        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                                        transaction_id INTEGER NOT NULL UNIQUE,
+                                        op TEXT NOT NULL
+                                    )''')
+            if not has_log:
+                # Транзакции, записанные до появления журнала, синхронизируются как добавленные
+                conn.execute("INSERT INTO change_log (transaction_id, op) SELECT id, 'upsert' FROM transactions ORDER BY id")
+            for event, row, op in (("INSERT", "NEW", "upsert"), ("UPDATE", "NEW", "upsert"), ("DELETE", "OLD", "delete")):
+                conn.execute(f"CREATE TRIGGER IF NOT EXISTS change_log_{event.lower()} AFTER {event} ON transactions "
+                             f"BEGIN DELETE FROM change_log WHERE transaction_id = {row}.id; "
+                             f"INSERT INTO change_log (transaction_id, op) VALUES ({row}.id, '{op}'); END")
+            conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('change_log_floor', 0)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_change_log_op ON change_log(op, seq)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_trash_tag ON transactions_trash(tag)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_transactions_report ON transactions(report_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_transactions_date ON transactions(date)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_transactions_amount ON transactions(amount)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_transactions_category ON transactions(category)")
     
     @contextmanager
     def _get_connection(self):
         """Get a thread-local database connection"""
         if not hasattr(self._local, 'conn') or self._local.conn is None:
-            self._local.conn = sqlite3.connect(self.db_file, check_same_thread=False)
+            self._local.conn = connect(self.db_file)
+            with self._connections_lock:
+                self._connections.append(self._local.conn)
+        if getattr(self._local, 'savepoints', 0):
+            # Внутри savepoint() фиксацией и откатом управляет сама точка сохранения
+            yield self._local.conn
+            return
+        changes = self._local.conn.total_changes
         try:
             yield self._local.conn
         except Exception:
             self._local.conn.rollback()
             raise
         else:
+            if self._local.conn.total_changes != changes:
+                self._local.conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'data_version'")
             self._local.conn.commit()
 
+    def close(self):
+        """Закрывает соединения всех потоков; потоки, обратившиеся к базе позже, откроют новые"""
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+            self._local = threading.local()
+        for conn in connections:
+            conn.close()
+
+    def data_version(self) -> int:
+        """Версия данных: меняется при каждой записи, по ней API строит ETag"""
+        with self._get_connection() as conn:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'data_version'").fetchone()
+            return row[0] if row else 0
+
+    @contextmanager
+    def savepoint(self):
+        """
+        Объединяет все изменения внутри блока в одну транзакцию SQLite.
+        Вложенные блоки становятся точками сохранения: ошибка откатывает только свой блок,
+        а фиксация происходит при выходе из самого внешнего.
+        """
+        depth = getattr(self._local, 'savepoints', 0)
+        try:
+            with self._get_connection() as conn:
+                name = f"sp_{depth}"
+                conn.execute(f"SAVEPOINT {name}")
+                self._local.savepoints = depth + 1
+                try:
+                    yield conn
+                except BaseException:
+                    conn.execute(f"ROLLBACK TO {name}")
+                    conn.execute(f"RELEASE {name}")
+                    raise
+                else:
+                    conn.execute(f"RELEASE {name}")
+                finally:
+                    self._local.savepoints = depth
+        except BaseException:
+            # Вызовы после фиксации, отложенные внутри откатанного блока, не выполняются
+            self._local.on_commit = [(level, callback) for level, callback in getattr(self._local, 'on_commit', [])
+                                     if level <= depth]
+            raise
+        if depth == 0:
+            callbacks, self._local.on_commit = getattr(self._local, 'on_commit', []), []
+            for _, callback in callbacks:
+                callback()
+
+    def on_commit(self, callback):
+        """
+        Вызывает callback после фиксации изменений текущего потока: сразу, если savepoint() не открыт,
+        иначе — после выхода из самого внешнего блока. При откате блока его вызовы отбрасываются.
+        """
+        depth = getattr(self._local, 'savepoints', 0)
+        if not depth:
+            callback()
+            return
+        if not hasattr(self._local, 'on_commit'):
+            self._local.on_commit = []
+        self._local.on_commit.append((depth, callback))
+
     def get_categories(self) -> list[str]:
         """Возвращает список уникальных категорий из базы"""
         with self._get_connection() as conn:
@@ -89,11 +260,74 @@ class DBManager:
             )
             return cursor.lastrowid  # Возвращаем ID созданной транзакции
 
+    def add_transactions(self, report_id: int, rows) -> int:
+        """Пакетно вставляет строки (amount, category, note, date, type) в отчёт одним commit"""
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.executemany(
+                "INSERT INTO transactions (report_id, amount, category, note, date, type) VALUES (?, ?, ?, ?, ?, ?)",
+                [(report_id, *row) for row in rows]
+            )
+            return cursor.rowcount
+
+    def insert_transactions(self, rows) -> list[int]:
+        """
+        Пакетно вставляет строки (report_id, amount, category, note, date, type).
+        Возвращает ID вставленных транзакций по порядку строк.
+        """
+        rows = list(rows)
+        if not rows:
+            return []
+        with self._get_connection() as conn:
+            conn.executemany(
+                "INSERT INTO transactions (report_id, amount, category, note, date, type) VALUES (?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            # Пока транзакция записи открыта, AUTOINCREMENT выдаёт ID подряд, последний — в sqlite_sequence
+            last = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'transactions'").fetchone()[0]
+            return list(range(last - len(rows) + 1, last + 1))
+
+    # Столбцы транзакции, которые можно изменить через update_transaction
+    UPDATABLE_COLUMNS = ("amount", "category", "note", "date", "type", "report_id")
+
+    def update_transaction(self, transaction_id: int, fields: dict):
+        """
+        Изменяет транзакцию одним UPDATE только тех столбцов, значения которых отличаются.
+        Возвращает (прежние значения, новые значения) изменённых столбцов или None, если транзакции нет.
+        """
+        unknown = [column for column in fields if column not in self.UPDATABLE_COLUMNS]
+        if unknown:
+            raise ValueError(f"Нельзя изменить поля: {', '.join(unknown)}")
+        columns = list(fields)
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT {', '.join(['id'] + columns)} FROM transactions WHERE id = ?", (transaction_id,))
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            old = {column: value for column, value in zip(columns, row[1:]) if value != fields[column]}
+            new = {column: fields[column] for column in old}
+            if new:
+                cursor.execute(f"UPDATE transactions SET {', '.join(f'{column} = ?' for column in new)} WHERE id = ?",
+                               (*new.values(), transaction_id))
+            return old, new
+
     def delete_report(self, report_id: int):
         with self._get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("DELETE FROM transactions WHERE report_id = ?", (report_id,))
 
+    def discard_report(self, report_id: int):
+        """Удаляет отчёт вместе с его транзакциями, например после прерванного импорта"""
+        with self._get_connection() as conn:
+            conn.execute("DELETE FROM transactions WHERE report_id = ?", (report_id,))
+            conn.execute("DELETE FROM reports WHERE id = ?", (report_id,))
+
+    def delete_transactions(self, start_id: int, end_id: int):
+        """Удаляет транзакции с ID от start_id до end_id включительно"""
+        with self._get_connection() as conn:
+            conn.execute("DELETE FROM transactions WHERE id BETWEEN ? AND ?", (start_id, end_id))
+
     def delete_transaction(self, transaction_id: int):
         """Удаляет отдельную транзакцию по её ID"""
         with self._get_connection() as conn:
@@ -107,6 +341,322 @@ class DBManager:
             raw_trans = cursor.fetchall()
             return from_list(raw_trans)
 
+    @staticmethod
+    def _build_filter(filters: dict = None) -> tuple[str, list]:
+        """
+        Собирает условие WHERE по фильтрам операций:
+        date_from, date_to (включительно, сравниваются строки дат), category (строка или список),
+        amount_min, amount_max, type и report_id. Возвращает (SQL с WHERE или пустую строку, параметры).
+        """
+        conditions, params = [], []
+        filters = {key: value for key, value in (filters or {}).items() if value is not None}
+        if "date_from" in filters:
+            conditions.append("date >= ?")
+            params.append(str(filters["date_from"]))
+        if "date_to" in filters:
+            # Дата без времени включает весь день
+            conditions.append("date <= ?")
+            date_to = str(filters["date_to"])
+            params.append(date_to + " 23:59:59" if len(date_to) == 10 else date_to)
+        if "category" in filters:
+            categories = filters["category"]
+            categories = [categories] if isinstance(categories, str) else list(categories)
+            conditions.append(f"category IN ({', '.join('?' * len(categories))})")
+            params.extend(categories)
+        if "amount_min" in filters:
+            conditions.append("amount >= ?")
+            params.append(float(filters["amount_min"]))
+        if "amount_max" in filters:
+            conditions.append("amount <= ?")
+            params.append(float(filters["amount_max"]))
+        if "type" in filters:
+            conditions.append("type = ?")
+            params.append(filters["type"])
+        if "report_id" in filters:
+            conditions.append("report_id = ?")
+            params.append(filters["report_id"])
+        return (" WHERE " + " AND ".join(conditions)) if conditions else "", params
+
+    def iter_transactions(self, filters: dict = None, batch_size: int = 100_000):
+        """
+        Потоково читает операции порциями по batch_size строк
+        (id, report_id, amount, category, note, date, type) в порядке id.
+        Чтение идёт через отдельное соединение, чтобы не держать общее соединение потока.
+        Порции могут запрашиваться из разных потоков пула, но всегда по одной.
+        """
+        where, params = self._build_filter(filters)
+        conn = connect(self.db_file)
+        try:
+            cursor = conn.execute("SELECT id, report_id, amount, category, note, date, type FROM transactions"
+                                  + where + " ORDER BY id", params)
+            while rows := cursor.fetchmany(batch_size):
+                yield rows
+        finally:
+            conn.close()
+
+    # Столбцы транзакции в порядке выборки и столбцы, по которым можно сортировать (все с индексом)
+    TRANSACTION_COLUMNS = ("id", "report_id", "amount", "category", "note", "date", "type")
+    SORT_COLUMNS = ("id", "date", "amount", "category")
+
+    def query_transactions(self, filters: dict = None, sort: str = "id", descending: bool = False,
+                           limit: int = None, after=None, fields=None) -> tuple[list[tuple], tuple]:
+        """
+        Страница операций с фильтрами (см. _build_filter), сортировкой и выбором столбцов.
+        Страницы листаются по ключу (after — (значение сортировки, id) последней строки
+        предыдущей страницы), поэтому запрос не пропускает строки через OFFSET.
+        Возвращает (строки со столбцами fields, ключ последней строки или None, если страница последняя).
+        """
+        fields = list(fields or self.TRANSACTION_COLUMNS)
+        unknown = [field for field in fields if field not in self.TRANSACTION_COLUMNS]
+        if unknown:
+            raise ValueError(f"Неизвестные поля: {', '.join(unknown)}")
+        if sort not in self.SORT_COLUMNS:
+            raise ValueError(f"Сортировка возможна по полям: {', '.join(self.SORT_COLUMNS)}")
+        where, params = self._build_filter(filters)
+        direction = "DESC" if descending else "ASC"
+        if after is not None:
+            where += (" AND " if where else " WHERE ")
+            if sort == "id":
+                where += f"id {'<' if descending else '>'} ?"
+                params.append(after[1])
+            else:
+                where += f"({sort}, id) {'<' if descending else '>'} (?, ?)"
+                params.extend(after)
+        order = f" ORDER BY id {direction}" if sort == "id" else f" ORDER BY {sort} {direction}, id {direction}"
+        # Ключ страницы выбирается вместе с запрошенными полями и отрезается от строк
+        sql = f"SELECT {sort}, id, {', '.join(fields)} FROM transactions{where}{order}"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit + 1)
+        with self._get_connection() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        next_key = None
+        if limit is not None and len(rows) > limit:
+            rows = rows[:limit]
+            next_key = tuple(rows[-1][:2])
+        return [row[2:] for row in rows], next_key
+
+    def get_change_scope(self, ids=None, report_id: int = None) -> tuple[list[str], list[str]]:
+        """
+        Категории и дни (YYYY-MM-DD) транзакций с ID из отрезков ids или транзакций отчёта report_id.
+        Строки ищутся и в таблице транзакций, и в корзине, поэтому подходит и для удалённых.
+        """
+        if ids:
+            # SQLite ограничивает число параметров в одном запросе
+            parts = [ids[start:start + 400] for start in range(0, len(ids), 400)]
+            conditions = [(" OR ".join("id BETWEEN ? AND ?" for _ in part), [v for r in part for v in r])
+                          for part in parts]
+        else:
+            conditions = [("report_id = ?", [report_id])]
+        scope = set()
+        with self._get_connection() as conn:
+            for where, params in conditions:
+                scope.update(conn.execute(f"SELECT DISTINCT category, substr(date, 1, 10) FROM transactions "
+                                          f"WHERE {where} UNION SELECT DISTINCT category, substr(date, 1, 10) "
+                                          f"FROM transactions_trash WHERE {where}", params * 2).fetchall())
+        categories = sorted({category for category, _ in scope if category is not None})
+        days = sorted({day for _, day in scope if day})
+        return categories, days
+
+    def get_changes(self, since: int, limit: int):
+        """
+        Изменения транзакций с номером больше since, не больше limit:
+        (строки добавленных и изменённых транзакций в порядке TRANSACTION_COLUMNS, ID удалённых,
+        номер последнего изменения, есть ли ещё изменения). None, если журнал сжат после since
+        или since больше номера последнего изменения (база заменена): клиенту нужна полная синхронизация.
+        """
+        columns = ", ".join(f"t.{name}" for name in self.TRANSACTION_COLUMNS)
+        # Границы журнала и строки читаются в одной транзакции SQLite
+        with self.savepoint() as conn:
+            floor = conn.execute("SELECT value FROM meta WHERE key = 'change_log_floor'").fetchone()[0]
+            if since < floor or since > self.last_change():
+                return None
+            rows = conn.execute(f"SELECT c.seq, c.op, c.transaction_id, {columns} FROM change_log c "
+                                f"LEFT JOIN transactions t ON t.id = c.transaction_id "
+                                f"WHERE c.seq > ? ORDER BY c.seq LIMIT ?", (since, limit + 1)).fetchall()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        upserts = [row[3:] for row in rows if row[1] == 'upsert' and row[3] is not None]
+        deletes = [row[2] for row in rows if row[1] != 'upsert' or row[3] is None]
+        return upserts, deletes, rows[-1][0] if rows else since, has_more
+
+    def last_change(self) -> int:
+        """Номер последнего изменения в журнале изменений"""
+        with self._get_connection() as conn:
+            row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'change_log'").fetchone()
+            return row[0] if row else 0
+
+    def compact_change_log(self, keep_deletes: int) -> int:
+        """
+        Оставляет в журнале изменений только keep_deletes последних записей об удалении.
+        Клиентам, синхронизированным до сжатой части, get_changes ответит None. Возвращает число удалённых записей.
+        """
+        with self._get_connection() as conn:
+            row = conn.execute("SELECT seq FROM change_log WHERE op = 'delete' ORDER BY seq DESC LIMIT 1 OFFSET ?",
+                               (keep_deletes,)).fetchone()
+            if row is None:
+                return 0
+            conn.execute("UPDATE meta SET value = MAX(value, ?) WHERE key = 'change_log_floor'", (row[0],))
+            return conn.execute("DELETE FROM change_log WHERE op = 'delete' AND seq <= ?", (row[0],)).rowcount
+
+    def get_reports(self, report_ids=None) -> list[tuple]:
+        """Возвращает отчёты (id, filename, import_date), при report_ids — только указанные"""
+        with self._get_connection() as conn:
+            if report_ids is None:
+                return conn.execute("SELECT id, filename, import_date FROM reports ORDER BY id").fetchall()
+            report_ids = list(report_ids)
+            reports = []
+            # SQLite ограничивает число параметров в одном запросе
+            for start in range(0, len(report_ids), 500):
+                part = report_ids[start:start + 500]
+                reports += conn.execute(f"SELECT id, filename, import_date FROM reports "
+                                        f"WHERE id IN ({', '.join('?' * len(part))})", part).fetchall()
+            return sorted(reports)
+
+    def import_archive(self, reports, batches, default_filename: str) -> tuple[dict, int]:
+        """
+        Записывает отчёты и операции из архива одной транзакцией.
+        reports — строки (id, filename, import_date), batches — порции строк
+        (report_id, amount, category, note, date, type) со старыми ID отчётов.
+        Каждый отчёт получает новый ID; операции без отчёта попадают в отчёт default_filename.
+        Возвращает (соответствие старых ID отчётов новым, число операций).
+        """
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            mapping = {}
+            for report_id, filename, import_date in reports:
+                cursor.execute("INSERT INTO reports (filename, import_date) VALUES (?, ?)", (filename, import_date))
+                mapping[report_id] = cursor.lastrowid
+            count = 0
+            for rows in batches:
+                for report_id in {row[0] for row in rows} - mapping.keys():
+                    cursor.execute("INSERT INTO reports (filename, import_date) VALUES (?, ?)",
+                                   (default_filename, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+                    mapping[report_id] = cursor.lastrowid
+                cursor.executemany(
+                    "INSERT INTO transactions (report_id, amount, category, note, date, type) VALUES (?, ?, ?, ?, ?, ?)",
+                    [(mapping[row[0]], *row[1:]) for row in rows]
+                )
+                count += len(rows)
+            return mapping, count
+
+    def move_to_trash(self, tag: str, ids=None, filters: dict = None) -> int:
+        """
+        Переносит транзакции в корзину с меткой tag: по отрезкам ID [[от, до], ...]
+        или по фильтрам (см. _build_filter). Возвращает количество перенесённых строк.
+        """
+        if ids is None:
+            where, params = self._build_filter(filters)
+            if not where:
+                raise ValueError("Не задано условие удаления")
+            conditions = [(where, params)]
+        else:
+            conditions = [(" WHERE id BETWEEN ? AND ?", (start, end)) for start, end in ids]
+        moved = 0
+        with self._get_connection() as conn:
+            for where, params in conditions:
+                conn.execute("INSERT INTO transactions_trash (id, report_id, amount, category, note, date, type, tag) "
+                             "SELECT id, report_id, amount, category, note, date, type, ? FROM transactions"
+                             + where, (tag, *params))
+                moved += conn.execute("DELETE FROM transactions" + where, params).rowcount
+        return moved
+
+    def get_trash_ids(self, tag: str) -> list[int]:
+        """ID транзакций в корзине с меткой tag"""
+        with self._get_connection() as conn:
+            rows = conn.execute("SELECT id FROM transactions_trash WHERE tag = ? ORDER BY id", (tag,)).fetchall()
+            return [r[0] for r in rows]
+
+    def restore_from_trash(self, tag: str) -> int:
+        """Возвращает из корзины транзакции с меткой tag под прежними ID"""
+        with self._get_connection() as conn:
+            conn.execute("INSERT INTO transactions (id, report_id, amount, category, note, date, type) "
+                         "SELECT id, report_id, amount, category, note, date, type FROM transactions_trash "
+                         "WHERE tag = ?", (tag,))
+            return conn.execute("DELETE FROM transactions_trash WHERE tag = ?", (tag,)).rowcount
+
+    def purge_trash(self, tags):
+        """Окончательно удаляет строки корзины с указанными метками"""
+        with self._get_connection() as conn:
+            conn.executemany("DELETE FROM transactions_trash WHERE tag = ?", [(tag,) for tag in tags])
+
+    def trash_size(self, tags) -> int:
+        """Примерный объём строк корзины с указанными метками в байтах"""
+        size = 0
+        with self._get_connection() as conn:
+            for tag in tags:
+                row = conn.execute("SELECT SUM(LENGTH(category) + LENGTH(note) + LENGTH(date) + LENGTH(type) + 24) "
+                                   "FROM transactions_trash WHERE tag = ?", (tag,)).fetchone()
+                size += row[0] or 0
+        return size
+
+    def journal_push(self, stack: str, action: str, size: int):
+        with self._get_connection() as conn:
+            conn.execute("INSERT INTO undo_journal (stack, action, size, created) VALUES (?, ?, ?, ?)",
+                         (stack, action, size, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+
+    def journal_pop(self, stack: str, oldest: bool = False):
+        """Забирает последнее (или самое старое) описание действия из стека; None, если стек пуст"""
+        order = "ASC" if oldest else "DESC"
+        with self._get_connection() as conn:
+            row = conn.execute(f"DELETE FROM undo_journal WHERE id = (SELECT id FROM undo_journal WHERE stack = ? "
+                               f"ORDER BY id {order} LIMIT 1) RETURNING action", (stack,)).fetchone()
+            return row[0] if row else None
+
+    def journal_entries(self, stack: str) -> list[str]:
+        """Описания действий стека от старых к новым"""
+        with self._get_connection() as conn:
+            rows = conn.execute("SELECT action FROM undo_journal WHERE stack = ? ORDER BY id", (stack,)).fetchall()
+            return [r[0] for r in rows]
+
+    def journal_stats(self) -> tuple[int, int]:
+        """Количество записей стека отмены и объём всего журнала в байтах"""
+        with self._get_connection() as conn:
+            count = conn.execute("SELECT COUNT(*) FROM undo_journal WHERE stack = 'undo'").fetchone()[0]
+            size = conn.execute("SELECT COALESCE(SUM(size), 0) FROM undo_journal").fetchone()[0]
+            return count, size
+
+    def journal_clear(self, stack: str) -> list[str]:
+        """Очищает стек и возвращает удалённые описания действий"""
+        with self._get_connection() as conn:
+            rows = conn.execute("DELETE FROM undo_journal WHERE stack = ? RETURNING action", (stack,)).fetchall()
+            return [r[0] for r in rows]
+
+    def get_bank_profiles(self) -> list[tuple[str, str]]:
+        """Возвращает профили выписок банков: пары (подпись заголовка, профиль в JSON)"""
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT signature, profile FROM bank_profiles")
+            return cursor.fetchall()
+
+    def save_bank_profile(self, signature: str, name: str, profile: str):
+        """Сохраняет профиль выписки банка, заменяя профиль с той же подписью"""
+        with self._get_connection() as conn:
+            conn.execute("INSERT OR REPLACE INTO bank_profiles (signature, name, profile) VALUES (?, ?, ?)",
+                         (signature, name, profile))
+
+    def get_transaction(self, transaction_id: int):
+        """Возвращает транзакцию по ID (поиск по первичному ключу) или None"""
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT id, date, amount, category, note, report_id, type FROM transactions WHERE id = ?",
+                           (transaction_id,))
+            row = cursor.fetchone()
+            return from_list([row])[0] if row else None
+
+    def get_transactions_by_report(self, report_id: int) -> list[Transaction]:
+        """Возвращает транзакции отчёта по индексу report_id"""
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT id, date, amount, category, note, report_id, type FROM transactions "
+                           "WHERE report_id = ? ORDER BY date DESC", (report_id,))
+            return from_list(cursor.fetchall())
+
+    def count_transactions_by_report(self, report_id: int) -> int:
+        """Число транзакций отчёта без чтения самих строк (по индексу report_id)"""
+        with self._get_connection() as conn:
+            return conn.execute("SELECT COUNT(*) FROM transactions WHERE report_id = ?", (report_id,)).fetchone()[0]
+
     def get_next_report_id(self, filename) -> int:
         with self._get_connection() as conn:
             cursor = conn.cursor()
@@ -0,0 +1,88 @@
+"""
+События изменения данных для клиентов: BudgetManager публикует их в EventBroadcaster
+после фиксации изменений, API рассылает подписчикам через SSE и WebSocket.
+
+Событие транзакций: {"type": "transactions", "action": "inserted" | "deleted" | "updated",
+"ids": [[первый, последний], ...], "report_id", "categories", "days", "version", "seq"}.
+Событие плана: {"type": "plan", "plan": {категория: сумма}, "version", "seq"}.
+"""
+import threading
+from itertools import count
+
+# Как меняются строки при выполнении действия журнала отмены; при отмене — наоборот
+_ACTIONS = {
+    'add_transaction': 'inserted',
+    'add_transactions': 'inserted',
+    'import_report': 'inserted',
+    'delete_transaction': 'deleted',
+    'delete_transactions': 'deleted',
+    'delete_report': 'deleted',
+    'update_transaction': 'updated',
+}
+_INVERSE = {'inserted': 'deleted', 'deleted': 'inserted', 'updated': 'updated'}
+
+
+class EventBroadcaster:
+    """Рассылка событий подписчикам в том же процессе; callback вызывается в потоке публикации"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+        self._tokens = count(1)
+        self._seq = count(1)
+
+    def subscribe(self, callback) -> int:
+        with self._lock:
+            token = next(self._tokens)
+            self._subscribers[token] = callback
+            return token
+
+    def unsubscribe(self, token: int):
+        with self._lock:
+            self._subscribers.pop(token, None)
+
+    def has_subscribers(self) -> bool:
+        return bool(self._subscribers)
+
+    def publish(self, event: dict) -> dict:
+        """Присваивает событию порядковый номер seq и передаёт его всем подписчикам"""
+        with self._lock:
+            event["seq"] = next(self._seq)
+            subscribers = list(self._subscribers.values())
+        for callback in subscribers:
+            try:
+                callback(event)
+            except Exception as e:
+                print(f"❌ Ошибка подписчика событий: {e}")
+        return event
+
+
+def change_events(action: dict, scope, undo: bool = False) -> list[dict]:
+    """
+    События для действия журнала отмены (при undo=True — для его отмены).
+    scope(ids=..., report_id=...) возвращает (категории, дни) затронутых строк.
+    """
+    if action['type'] == 'batch':
+        inner = reversed(action['actions']) if undo else action['actions']
+        return [event for a in inner for event in change_events(a, scope, undo)]
+    kind = _ACTIONS.get(action['type'])
+    if kind is None:
+        # План меняется через файл и публикуется при сохранении
+        return []
+    event = {"type": "transactions", "action": _INVERSE[kind] if undo else kind}
+    if 'report_id' in action and action['type'] in ('import_report', 'delete_report'):
+        event["report_id"] = action['report_id']
+        categories, days = scope(report_id=action['report_id'])
+    else:
+        event["ids"] = action.get('ids') or [[action['transaction_id'], action['transaction_id']]]
+        categories, days = scope(ids=event["ids"])
+    if kind == 'updated':
+        # Прежняя категория и дата тоже затронуты изменением
+        for values in (action['old'], action['new']):
+            if values.get('category') is not None:
+                categories = sorted(set(categories) | {values['category']})
+            if values.get('date'):
+                days = sorted(set(days) | {str(values['date'])[:10]})
+    event["categories"] = categories
+    event["days"] = days
+    return [event]
@@ -0,0 +1,54 @@
+"""
+Журнал отмены: компактные описания действий для хранения в таблице undo_journal.
+Описание хранит только ID и метки корзины (transactions_trash), а не копии строк.
+"""
+import json
+import uuid
+
+
+def new_trash_tag() -> str:
+    """Метка строк, перенесённых в корзину одним действием"""
+    return uuid.uuid4().hex
+
+
+def id_ranges(ids) -> list[list[int]]:
+    """Сжимает ID в отрезки: [1, 2, 3, 7] -> [[1, 3], [7, 7]]"""
+    ranges = []
+    for id_ in sorted(ids):
+        if ranges and id_ == ranges[-1][1] + 1:
+            ranges[-1][1] = id_
+        else:
+            ranges.append([id_, id_])
+    return ranges
+
+
+def trash_tags(action: dict) -> list[str]:
+    """Метки корзины, на которые ссылается действие (включая действия пакета)"""
+    tags = [action['trash']] if action.get('trash') else []
+    for inner in action.get('actions', []):
+        tags += trash_tags(inner)
+    return tags
+
+
+def compact_actions(actions: list[dict]) -> list[dict]:
+    """Сливает подряд идущие добавления транзакций в одно действие с отрезками ID"""
+    compacted = []
+    for action in actions:
+        if action['type'] == 'add_transaction':
+            if compacted and compacted[-1]['type'] == 'add_transactions':
+                compacted[-1]['ids'].append(action['transaction_id'])
+                continue
+            action = {'type': 'add_transactions', 'ids': [action['transaction_id']]}
+        compacted.append(action)
+    for action in compacted:
+        if action['type'] == 'add_transactions':
+            action['ids'] = id_ranges(action['ids'])
+    return compacted
+
+
+def encode(action: dict) -> str:
+    return json.dumps(action, ensure_ascii=False, separators=(",", ":"))
+
+
+def decode(data: str) -> dict:
+    return json.loads(data)
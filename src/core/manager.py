@@ -1,59 +1,183 @@
 import os
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime
 from .transaction import from_list, Transaction
 from .summary import Summary, tran_type
-from .parser import Parser
+from .parser import Parser, ImportCancelled, _iter_parallel, _normalize_file
+from .statements import STATEMENT_READERS
+from .profiles import BankProfile, ProfileRegistry, header_signature
 from .plan import PlanParser, Plan
 from .DBManager import DBManager
+from . import journal, parquet
+from .journal import new_trash_tag, id_ranges
+from .events import EventBroadcaster, change_events
+# Как и в DBManager: один модуль метрик при импорте и как core, и как src.core
+from src.core import metrics
+
+
+def _timed(iterable, timings, stage):
+    """Перебирает iterable, прибавляя время получения каждого элемента к timings[stage]"""
+    iterator = iter(iterable)
+    while True:
+        started = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            timings[stage] += time.perf_counter() - started
+        yield item
 
 
 class BudgetManager:
-    def __init__(self):
+    # Ограничения журнала отмены: число действий и объём описаний вместе со строками корзины
+    UNDO_MAX_DEPTH = int(os.environ.get("BUDGET_UNDO_MAX_DEPTH", "200"))
+    UNDO_MAX_BYTES = int(os.environ.get("BUDGET_UNDO_MAX_MB", "64")) * 1024 * 1024
+    # Сколько записей об удалении хранит журнал изменений для синхронизации клиентов
+    CHANGE_LOG_KEEP_DELETES = int(os.environ.get("BUDGET_CHANGE_LOG_KEEP_DELETES", "100000"))
+
+    def __init__(self, db_file=None, plan_file=None):
         self.plan = None
-        self.PLAN_FILE = "user_plan.json"
-        self.DB_FILE = os.path.join(os.path.dirname(__file__), "..", "data", "budget.db")
-        self.undo_stack = []
-        self.redo_stack = []
+        self.PLAN_FILE = plan_file or "user_plan.json"
+        self.DB_FILE = db_file or os.path.join(os.path.dirname(__file__), "..", "data", "budget.db")
+        self._batches = threading.local()  # Открытые batch() каждого потока
+        self._events = EventBroadcaster()
         self.dbmanager = DBManager(self.DB_FILE)
+        self.profiles = ProfileRegistry(self.dbmanager)
         self.is_undoing_redoing = False  # Флаг для предотвращения сохранения изменений во время отмены/повтора
 
     def add_transaction(self, tran : Transaction):
         transaction_id = self.dbmanager.add_transaction(tran)
         # Сохраняем действие в стек отмены
-        self._save_to_undo_stack('add_transaction', transaction_id=transaction_id, transaction=tran)
+        self._save_to_undo_stack('add_transaction', transaction_id=transaction_id)
+        return transaction_id
 
     def delete_transaction(self, transaction_id: int):
         """Удаляет отдельную транзакцию с поддержкой отмены"""
-        # Получаем транзакцию перед удалением
-        transactions = self.get_transactions()
-        transaction_to_delete = None
-        for t in transactions:
-            if t.id == transaction_id:
-                transaction_to_delete = t
-                break
-        
-        if transaction_to_delete is None:
+        # Транзакция переносится в корзину, откуда её вернёт отмена
+        tag = new_trash_tag()
+        if not self.dbmanager.move_to_trash(tag, ids=[[transaction_id, transaction_id]]):
             raise ValueError(f"Транзакция с ID {transaction_id} не найдена")
-        
-        # Удаляем транзакцию
-        self.dbmanager.delete_transaction(transaction_id)
         # Сохраняем действие в стек отмены
-        self._save_to_undo_stack('delete_transaction', transaction_id=transaction_id, transaction=transaction_to_delete)
+        self._save_to_undo_stack('delete_transaction', transaction_id=transaction_id, trash=tag)
         print(f"✅ Транзакция ID {transaction_id} удалена")
 
+    def update_transaction(self, transaction_id: int, fields: dict) -> dict:
+        """
+        Изменяет поля транзакции (amount, category, note, date, type, report_id).
+        В стек отмены попадают только изменённые поля. Возвращает изменённые поля с новыми значениями.
+        """
+        result = self.dbmanager.update_transaction(transaction_id, fields)
+        if result is None:
+            raise ValueError(f"Транзакция с ID {transaction_id} не найдена")
+        old, new = result
+        if new:
+            self._save_to_undo_stack('update_transaction', transaction_id=transaction_id, old=old, new=new)
+            print(f"✅ Транзакция ID {transaction_id} изменена")
+        return new
+
+    def add_transactions_bulk(self, batches) -> list[int]:
+        """
+        Добавляет транзакции порциями строк (report_id, amount, category, note, date, type).
+        Каждая порция — одна пакетная вставка; если перебор порций прерван ошибкой,
+        уже записанные строки удаляются. Всё добавление отменяется одним действием.
+        Возвращает ID новых транзакций по порядку строк.
+        """
+        ids = []
+        try:
+            for rows in batches:
+                ids += self.insert_transactions(rows)
+        except BaseException:
+            self.discard_transactions(ids)
+            raise
+        self.finish_transactions_bulk(ids)
+        return ids
+
+    def insert_transactions(self, rows) -> list[int]:
+        """
+        Записывает одну порцию массового добавления отдельной транзакцией SQLite, без действия отмены:
+        его добавляет finish_transactions_bulk после последней порции, а при ошибке
+        записанные порции удаляет discard_transactions. Возвращает ID новых транзакций.
+        """
+        return self.dbmanager.insert_transactions(rows)
+
+    def discard_transactions(self, ids):
+        """Удаляет порции прерванного массового добавления"""
+        for start, end in id_ranges(ids):
+            self.dbmanager.delete_transactions(start, end)
+
+    def finish_transactions_bulk(self, ids):
+        """Завершает массовое добавление: все его порции отменяются одним действием"""
+        if ids:
+            self._save_to_undo_stack('add_transactions', ids=id_ranges(ids))
+            print(f"✅ Добавлено {len(ids)} транзакций")
+
+    def delete_transactions(self, ids=None, filters=None) -> list[int]:
+        """
+        Удаляет транзакции по списку ID или по фильтрам (date_from, date_to, category, type, report_id)
+        одним действием отмены. Возвращает ID удалённых транзакций.
+        """
+        if not ids and not any(value is not None for value in (filters or {}).values()):
+            raise ValueError("Укажите ID транзакций или условие удаления")
+        tag = new_trash_tag()
+        with self.dbmanager.savepoint():
+            if ids:
+                self.dbmanager.move_to_trash(tag, ids=id_ranges(set(ids)))
+            else:
+                self.dbmanager.move_to_trash(tag, filters=filters)
+            deleted = self.dbmanager.get_trash_ids(tag)
+            if deleted:
+                self._save_to_undo_stack('delete_transactions', ids=id_ranges(deleted), trash=tag)
+        print(f"✅ Удалено {len(deleted)} транзакций")
+        return deleted
+
     def delete_report(self, report_id: int):
-        # Получаем все транзакции отчёта перед удалением
-        transactions = self.get_transactions()
-        report_transactions = [t for t in transactions if t.report_id == report_id]
-        
-        self.dbmanager.delete_report(report_id)
+        tag = new_trash_tag()
+        self.dbmanager.move_to_trash(tag, filters={'report_id': report_id})
         # Сохраняем действие в стек отмены
-        self._save_to_undo_stack('delete_report', report_id=report_id, transactions=report_transactions)
+        self._save_to_undo_stack('delete_report', report_id=report_id, trash=tag)
         print(f"✅ Удалены все транзакции для отчёта ID {report_id}")
 
+    def close(self):
+        """Закрывает соединения с базой; следующее обращение откроет их заново"""
+        self.dbmanager.close()
+
     def get_transactions(self) -> list[Transaction]:
         return self.dbmanager.get_transactions()
 
+    def query_transactions(self, filters: dict = None, sort: str = "id", descending: bool = False,
+                           limit: int = None, after=None, fields=None) -> tuple[list[tuple], tuple]:
+        """Страница транзакций с фильтрами, сортировкой и выбором полей (см. DBManager.query_transactions)"""
+        return self.dbmanager.query_transactions(filters, sort, descending, limit, after, fields)
+
+    def iter_transactions(self, filters: dict = None, batch_size: int = 100_000):
+        """Потоково отдаёт транзакции порциями строк (id, report_id, amount, category, note, date, type)"""
+        return self.dbmanager.iter_transactions(filters, batch_size)
+
+    def data_version(self) -> int:
+        """Версия данных, которая меняется при каждой записи в базу"""
+        return self.dbmanager.data_version()
+
+    def get_changes(self, since: int, limit: int):
+        """Изменения транзакций после номера since для синхронизации клиентов (см. DBManager.get_changes)"""
+        return self.dbmanager.get_changes(since, limit)
+
+    def last_change(self) -> int:
+        """Номер последнего изменения: с него синхронизация продолжается после полной загрузки данных"""
+        return self.dbmanager.last_change()
+
+    def get_transaction(self, transaction_id: int):
+        """Возвращает транзакцию по ID или None"""
+        return self.dbmanager.get_transaction(transaction_id)
+
+    def get_transactions_by_report(self, report_id: int) -> list[Transaction]:
+        return self.dbmanager.get_transactions_by_report(report_id)
+
+    def count_transactions_by_report(self, report_id: int) -> int:
+        return self.dbmanager.count_transactions_by_report(report_id)
+
     def get_summary_by_category(self, tran_type_ = tran_type.All) -> dict[str, float]:
         transactions = self.get_transactions()
         return Summary.get_summary_by_category(transactions, tran_type_)
@@ -65,33 +189,203 @@ class BudgetManager:
     def get_next_report_id(self, filename) -> int:
         return self.dbmanager.get_next_report_id(filename)
 
-    def import_from_file(self, filepath) -> int:
+    def import_from_file(self, filepath, chunksize=None, progress_callback=None, cancel_event=None, workers=None,
+                         timings=None, source=None) -> int:
+        """
+        Импортирует покупки из .CSV, .XLSX, OFX/QFX, QIF или CAMT.053 (.xml) файла.
+        Если задан chunksize, файл читается и записывается порциями (см. _import_chunked).
+        workers > 1 разбирает листы многостраничной .xlsx в нескольких процессах.
+        source — открытый бинарный файл с содержимым (например, загрузка через API);
+        тогда filepath используется только как имя отчёта и для определения формата.
+        Столбцы, диалект и правила разбора берутся из профиля банка, найденного по заголовку
+        (профили регистрируются через register_profile); без профиля диалект определяется по файлу.
+        """
+        started = time.perf_counter()
+        _, profile = self.find_profile(filepath, source)
+        if not chunksize and os.path.splitext(filepath)[1].lower() in STATEMENT_READERS:
+            # Выписки OFX/QIF/CAMT.053 читаются только потоково
+            chunksize = Parser.CHUNK_SIZE
+        if chunksize:
+            report_id, rows = self._import_chunked(filepath, chunksize, progress_callback, cancel_event, workers,
+                                                   timings, source, profile)
+        else:
+            df = Parser.parse_file(filepath, source, profile)
+            Parser.check_columns(df.columns, profile)
+
+            normalized = Parser.normalize_chunk(df, profile)
+
+            # Весь импорт — одна транзакция SQLite и одно действие отмены
+            with self.batch(f"Импорт {os.path.basename(filepath)}"):
+                report_id = self.get_next_report_id(filepath)
+
+                for amount, category, note, date, type_ in normalized:
+                    transaction = Transaction(amount = amount,
+                                              report_id = report_id,
+                                              category = category,
+                                              note = note,
+                                              date = date,
+                                              type_ = type_)
+                    self.add_transaction(transaction)
+            # Строки с нечисловой суммой пропущены, поэтому считаются записанные, а не прочитанные
+            rows = len(normalized)
+            print(f"✅ Импорт завершён. Добавлено {rows} операций в отчёт #{report_id}")
+
+        metrics.record_import(metrics.file_format(filepath), rows, time.perf_counter() - started)
+        return report_id
+
+    def find_profile(self, filepath, source=None):
+        """Возвращает (подпись заголовка, профиль банка или None) для выписки"""
+        if os.path.splitext(filepath)[1].lower() not in (".csv", ".xlsx"):
+            return None, None
+        signature = Parser.header_signature(filepath, source)
+        return signature, self.profiles.find(signature)
+
+    def register_profile(self, name, mapping, header=None, signature=None, dialect=None, dtypes=None,
+                         date_format=None, sign_rule="type_column") -> BankProfile:
         """
-        Импортирует покупки из .CSV или .XLSX файла
+        Регистрирует профиль выписки банка. Профиль узнаётся по подписи заголовка:
+        её можно передать готовой (signature) или вычислить по списку столбцов (header).
         """
-        df = Parser.parse_file(filepath)
+        if signature is None:
+            if not header:
+                raise ValueError("Нужен заголовок выписки или его подпись")
+            signature = header_signature(header)
+        profile = BankProfile(name, mapping, dialect=dialect, dtypes=dtypes, date_format=date_format,
+                              sign_rule=sign_rule, signature=signature)
+        self.profiles.register(profile)
+        print(f"✅ Профиль выписки '{name}' сохранён")
+        return profile
 
-        expected_cols = ["Дата операции", "Номер счета", "Описание операции", "Сумма", "Категория", "Тип", "Комментарий", "Кэшбэк"]
-        missing = [c for c in expected_cols if c not in df.columns]
-        if missing:
-            raise ValueError(f"Не найдены столбцы: {', '.join(missing)}")
+    def get_profiles(self) -> list[BankProfile]:
+        return self.profiles.list()
 
-        report_id = self.get_next_report_id(filepath)
+    def _import_chunked(self, filepath, chunksize, progress_callback=None, cancel_event=None, workers=None,
+                        timings=None, source=None, profile=None) -> tuple[int, int]:
+        """
+        Потоковый импорт: каждая порция проверяется, нормализуется и записывается
+        в один и тот же отчёт, поэтому память не зависит от размера файла.
+        Возвращает (ID отчёта, число записанных операций).
+        progress_callback(rows, bytes) вызывается после каждой порции.
+        Если cancel_event (threading.Event) установлен, выбрасывается ImportCancelled.
+        При отмене и любой ошибке разбора или записи уже записанные строки и сам отчёт удаляются.
+        В словарь timings, если он передан, накапливается время этапов "parse" и "write" в секундах.
+        """
+        if timings is None:
+            timings = {}
+        timings.setdefault("parse", 0.0)
+        timings.setdefault("write", 0.0)
+        report_id = None
+        rows_done = 0
+        try:
+            for rows, bytes_read in _timed(Parser.iter_batches(filepath, chunksize, workers, source, profile), timings, "parse"):
+                if cancel_event is not None and cancel_event.is_set():
+                    raise ImportCancelled(f"Импорт {os.path.basename(filepath)} отменён")
+                started = time.perf_counter()
+                if report_id is None:
+                    report_id = self.get_next_report_id(filepath)
+                self.dbmanager.add_transactions(report_id, rows)
+                timings["write"] += time.perf_counter() - started
+                rows_done += len(rows)
+                if progress_callback is not None:
+                    progress_callback(rows_done, bytes_read)
+        except BaseException:
+            if report_id is not None:
+                self.dbmanager.discard_report(report_id)
+            raise
+
+        if report_id is None:
+            # В файле только заголовок
+            report_id = self.get_next_report_id(filepath)
+        # Весь импорт отменяется одним действием
+        self._save_to_undo_stack('import_report', report_id=report_id)
+        print(f"✅ Импорт завершён. Добавлено {rows_done} операций в отчёт #{report_id}")
+        return report_id, rows_done
+
+    def preview_file(self, filepath, nrows=20, source=None) -> dict:
+        """
+        Предпросмотр выписки перед импортом: разбирает только первые nrows строк
+        и возвращает профиль банка, диалект, соответствие столбцов, образец строк и ошибки.
+        """
+        _, profile = self.find_profile(filepath, source)
+        return Parser.preview(filepath, nrows, source, profile)
 
-        for _, row in df.iterrows():
+    def import_many(self, paths, workers=None, chunksize=Parser.CHUNK_SIZE) -> list[dict]:
+        """
+        Импортирует несколько выписок и .zip архивов с ними.
+        Файлы разбираются параллельно в пуле процессов, которые передают нормализованные порции
+        по мере готовности, а записывает их один писатель. Каждая порция записывается своей короткой
+        транзакцией; каждый файл — отдельный отчёт и отдельное действие отмены.
+        Ошибка файла (в том числе повреждённого архива) попадает в его результат, уже записанные
+        строки этого файла удаляются, а остальные файлы импортируются.
+        Возвращает результаты по каждому файлу в исходном порядке:
+        {"file", "report_id", "rows", "error"}.
+        """
+        sources, results = [], []
+        for path in paths:
             try:
-                amount = float(row["Сумма"])
-            except ValueError:
+                expanded = Parser.expand_sources([path])
+            except Exception as e:
+                results.append({"file": os.path.basename(path), "report_id": None, "rows": 0, "error": str(e)})
                 continue
-            transaction = Transaction(amount = amount,
-                                      report_id = report_id,
-                                      category = str(row["Категория"]),
-                                      note = f"{row['Описание операции']} ({row['Комментарий']})",
-                                      date = str(row["Дата операции"]),
-                                      type_ = str(row["Тип"]))
-            self.add_transaction(transaction)
-        print(f"✅ Импорт завершён. Добавлено {len(df)} операций в отчёт #{report_id}")
-        return report_id
+            for source in expanded:
+                sources.append((source, len(results)))
+                results.append({"file": source[2], "report_id": None, "rows": 0, "error": None})
+        if not sources:
+            return results
+
+        profiles = {profile.signature: profile for profile in self.get_profiles()}
+        tasks = [(path, member, chunksize, profiles) for (path, member, _), _ in sources]
+        finished = set()
+        try:
+            for index, kind, payload in _iter_parallel(_normalize_file, tasks, workers):
+                result = results[sources[index][1]]
+                if kind == "error":
+                    if result["report_id"] is not None:
+                        self.dbmanager.discard_report(result["report_id"])
+                    result.update(report_id=None, rows=0, error=str(payload))
+                    continue
+                if result["report_id"] is None:
+                    result["report_id"] = self.get_next_report_id(result["file"])
+                if kind == "rows":
+                    self.dbmanager.add_transactions(result["report_id"], payload)
+                    result["rows"] += len(payload)
+                else:
+                    finished.add(index)
+                    self._save_to_undo_stack('import_report', report_id=result["report_id"])
+        except BaseException:
+            # Недочитанные файлы не оставляют после себя неполных отчётов
+            for index, (_, position) in enumerate(sources):
+                report_id = results[position]["report_id"]
+                if index not in finished and report_id is not None:
+                    self.dbmanager.discard_report(report_id)
+            raise
+
+        for result in results:
+            if result["error"] is None:
+                metrics.record_import(metrics.file_format(result["file"]), result["rows"])
+        imported = sum(1 for r in results if r["error"] is None)
+        print(f"✅ Импортировано файлов: {imported} из {len(results)}")
+        return results
+
+    def export_parquet(self, path, filters=None) -> int:
+        """
+        Выгружает операции и их отчёты в каталог path в формате Parquet (сжатие zstd).
+        filters: date_from, date_to, category, type, report_id. Возвращает число операций.
+        """
+        count = parquet.export_parquet(self.dbmanager, path, filters)
+        print(f"✅ Выгружено {count} операций в {path}")
+        return count
+
+    def import_parquet(self, path) -> int:
+        """Загружает архив Parquet из каталога path; каждый отчёт архива становится новым отчётом"""
+        started = time.perf_counter()
+        with self.batch(f"Загрузка {os.path.basename(os.path.normpath(path))}"):
+            mapping, count = parquet.import_parquet(self.dbmanager, path)
+            for report_id in mapping.values():
+                self._save_to_undo_stack('import_report', report_id=report_id)
+        metrics.record_import("parquet", count, time.perf_counter() - started)
+        print(f"✅ Загружено {count} операций из {path}")
+        return count
 
     def get_graph_summary(self) -> list[list[float]]:
         """Возвращает список точек (date, cumulative_balance)"""
@@ -116,6 +410,8 @@ class BudgetManager:
 
     def save_plan(self, plan):
         PlanParser.save_plan(plan, self.PLAN_FILE)
+        if self.events.has_subscribers():
+            self.events.publish({"type": "plan", "plan": dict(plan.plan), "version": self.dbmanager.data_version()})
 
     def load_plan(self):
         raw_plan  = PlanParser.parse(self.PLAN_FILE)
@@ -175,64 +471,208 @@ class BudgetManager:
                 expense_categories.add(transaction.category)
         return sorted(expense_categories)
 
+    @property
+    def undo_stack(self) -> list[dict]:
+        """Действия, которые можно отменить, от старых к новым (читаются из журнала)"""
+        return [journal.decode(data) for data in self.dbmanager.journal_entries('undo')]
+
+    @undo_stack.setter
+    def undo_stack(self, actions):
+        self._replace_stack('undo', actions)
+
+    @property
+    def redo_stack(self) -> list[dict]:
+        """Отменённые действия, которые можно повторить"""
+        return [journal.decode(data) for data in self.dbmanager.journal_entries('redo')]
+
+    @redo_stack.setter
+    def redo_stack(self, actions):
+        self._replace_stack('redo', actions)
+
+    def _replace_stack(self, stack, actions):
+        self._purge(self.dbmanager.journal_clear(stack))
+        for action in actions:
+            self._journal_push(stack, action)
+
     def undo(self):
         """Отменяет последнее действие"""
-        if not self.undo_stack:
-            return False
-        
-        self.is_undoing_redoing = True  # Устанавливаем флаг
-        last_action = self.undo_stack.pop()
-        self.redo_stack.append(last_action)
-        
-        if last_action['type'] == 'add_transaction':
-            # Удаляем транзакцию
-            self.dbmanager.delete_transaction(last_action['transaction_id'])
-        elif last_action['type'] == 'delete_transaction':
-            # Восстанавливаем транзакцию
-            transaction = last_action['transaction']
-            self.dbmanager.add_transaction(transaction)
-            print(f"✅ Транзакция ID {transaction.id} восстановлена")
-        elif last_action['type'] == 'delete_report':
-            # Восстанавливаем все транзакции отчёта
-            for transaction in last_action['transactions']:
-                self.dbmanager.add_transaction(transaction)
-        elif last_action['type'] == 'update_plan':
-            # Восстанавливаем предыдущее состояние плана
-            old_state = last_action['old_state']
-            self.apply_plan_state(old_state)
-        
+        with self.dbmanager.savepoint():
+            data = self.dbmanager.journal_pop('undo')
+            if data is None:
+                return False
+
+            self.is_undoing_redoing = True  # Устанавливаем флаг
+            last_action = journal.decode(data)
+            self._undo_action(last_action)
+            self._journal_push('redo', last_action)
+            self._notify(last_action, undo=True)
         return True
 
     def redo(self):
         """Повторяет отменённое действие"""
-        if not self.redo_stack:
-            return False
-        
-        self.is_undoing_redoing = True  # Устанавливаем флаг
-        action = self.redo_stack.pop()
-        self.undo_stack.append(action)
-        
-        if action['type'] == 'add_transaction':
-            # Добавляем транзакцию обратно
-            transaction = action['transaction']
-            self.dbmanager.add_transaction(transaction)
+        with self.dbmanager.savepoint():
+            data = self.dbmanager.journal_pop('redo')
+            if data is None:
+                return False
+
+            self.is_undoing_redoing = True  # Устанавливаем флаг
+            action = journal.decode(data)
+            self._redo_action(action)
+            self._journal_push('undo', action)
+            self._notify(action)
+        return True
+
+    def _undo_action(self, action):
+        if action['type'] in ('add_transaction', 'add_transactions'):
+            # Переносим добавленные транзакции в корзину, повтор вернёт их под теми же ID
+            ids = action.get('ids') or [[action['transaction_id'], action['transaction_id']]]
+            action['trash'] = action.get('trash') or new_trash_tag()
+            self.dbmanager.move_to_trash(action['trash'], ids=ids)
+        elif action['type'] == 'delete_transactions':
+            self.dbmanager.restore_from_trash(action['trash'])
+        elif action['type'] == 'delete_transaction':
+            # Возвращаем транзакцию из корзины с прежним ID
+            self.dbmanager.restore_from_trash(action['trash'])
+            print(f"✅ Транзакция ID {action['transaction_id']} восстановлена")
+        elif action['type'] == 'delete_report':
+            # Восстанавливаем все транзакции отчёта
+            self.dbmanager.restore_from_trash(action['trash'])
+        elif action['type'] == 'import_report':
+            # Переносим строки импорта в корзину
+            action['trash'] = action.get('trash') or new_trash_tag()
+            self.dbmanager.move_to_trash(action['trash'], filters={'report_id': action['report_id']})
+        elif action['type'] == 'update_transaction':
+            # Возвращаем прежние значения изменённых полей
+            self.dbmanager.update_transaction(action['transaction_id'], action['old'])
+        elif action['type'] == 'update_plan':
+            # Восстанавливаем предыдущее состояние плана
+            old_state = action['old_state']
+            self.apply_plan_state(old_state)
+        elif action['type'] == 'batch':
+            # Действия пакета отменяются в обратном порядке одной транзакцией
+            with self.dbmanager.savepoint():
+                for inner in reversed(action['actions']):
+                    self._undo_action(inner)
+
+    def _redo_action(self, action):
+        if action['type'] in ('add_transaction', 'add_transactions', 'import_report'):
+            # Возвращаем строки из корзины под теми же ID
+            self.dbmanager.restore_from_trash(action['trash'])
+        elif action['type'] == 'delete_transactions':
+            self.dbmanager.move_to_trash(action['trash'], ids=action['ids'])
         elif action['type'] == 'delete_transaction':
             # Удаляем транзакцию
-            self.dbmanager.delete_transaction(action['transaction_id'])
+            self.dbmanager.move_to_trash(action['trash'], ids=[[action['transaction_id'], action['transaction_id']]])
             print(f"✅ Транзакция ID {action['transaction_id']} удалена повторно")
         elif action['type'] == 'delete_report':
             # Удаляем все транзакции отчёта
-            self.dbmanager.delete_report(action['report_id'])
+            self.dbmanager.move_to_trash(action['trash'], filters={'report_id': action['report_id']})
+        elif action['type'] == 'update_transaction':
+            self.dbmanager.update_transaction(action['transaction_id'], action['new'])
         elif action['type'] == 'update_plan':
             # Применяем новое состояние плана
             new_state = action['new_state']
             self.apply_plan_state(new_state)
-        
-        return True
+        elif action['type'] == 'batch':
+            with self.dbmanager.savepoint():
+                for inner in action['actions']:
+                    self._redo_action(inner)
+
+    @contextmanager
+    def batch(self, label: str):
+        """
+        Группирует изменения внутри блока в одну транзакцию SQLite и одно действие отмены:
+            with manager.batch("Импорт выписки"):
+                manager.add_transaction(...)
+                manager.delete_transaction(...)
+        Вложенные пакеты сливаются с внешним. При ошибке изменения блока в базе откатываются,
+        план возвращается в прежнее состояние, а стек отмены не меняется.
+        """
+        frames = self._batch_frames()
+        actions = []
+        frames.append(actions)
+        try:
+            with self.dbmanager.savepoint():
+                yield self
+        except BaseException:
+            # База откатывается точкой сохранения, план хранится в файле и возвращается вручную
+            for action in reversed(actions):
+                if action['type'] == 'update_plan':
+                    self.apply_plan_state(action['old_state'])
+            raise
+        finally:
+            frames.pop()
+        if not actions:
+            return
+        if frames:
+            frames[-1].extend(actions)
+        else:
+            self._push_undo({'type': 'batch', 'label': label, 'actions': journal.compact_actions(actions)})
+
+    def _batch_frames(self) -> list:
+        """Стек открытых пакетов текущего потока"""
+        # setdefault — на случай объекта, созданного в обход __init__
+        batches = vars(self).setdefault('_batches', threading.local())
+        if not hasattr(batches, 'frames'):
+            batches.frames = []
+        return batches.frames
 
     def _save_to_undo_stack(self, action_type, **kwargs):
-        """Сохраняет действие в стек отмены"""
+        """Сохраняет действие в стек отмены, а внутри batch() — в открытый пакет"""
         action = {'type': action_type, **kwargs}
-        self.undo_stack.append(action)
-        # Очищаем стек повтора при новом действии
-        self.redo_stack.clear()
\ No newline at end of file
+        frames = self._batch_frames()
+        if frames:
+            frames[-1].append(action)
+        else:
+            self._push_undo(action)
+
+    def _push_undo(self, action):
+        with self.dbmanager.savepoint():
+            self._journal_push('undo', action)
+            # Очищаем стек повтора при новом действии
+            self._purge(self.dbmanager.journal_clear('redo'))
+        self._notify(action)
+
+    @property
+    def events(self) -> EventBroadcaster:
+        """События изменения данных (см. core/events.py)"""
+        # setdefault — на случай объекта, созданного в обход __init__
+        return vars(self).setdefault('_events', EventBroadcaster())
+
+    def _notify(self, action, undo=False):
+        """Публикует события действия (или его отмены) после фиксации изменений в базе"""
+        if self.events.has_subscribers():
+            self.dbmanager.on_commit(lambda: self._publish_changes(action, undo))
+
+    def _publish_changes(self, action, undo):
+        try:
+            events = change_events(action, self.dbmanager.get_change_scope, undo)
+            version = self.dbmanager.data_version()
+        except Exception as e:
+            print(f"❌ Не удалось подготовить события изменения: {e}")
+            return
+        for event in events:
+            event["version"] = version
+            self.events.publish(event)
+
+    def _journal_push(self, stack, action):
+        """
+        Записывает действие в журнал и вытесняет самые старые действия отмены,
+        пока журнал не уложится в UNDO_MAX_DEPTH и UNDO_MAX_BYTES.
+        """
+        data = journal.encode(action)
+        size = len(data.encode("utf-8")) + self.dbmanager.trash_size(journal.trash_tags(action))
+        self.dbmanager.journal_push(stack, data, size)
+        count, total = self.dbmanager.journal_stats()
+        while count > self.UNDO_MAX_DEPTH or (total > self.UNDO_MAX_BYTES and count > 1):
+            evicted = self.dbmanager.journal_pop('undo', oldest=True)
+            self._purge([evicted])
+            count, total = self.dbmanager.journal_stats()
+
+    def _purge(self, entries):
+        """Удаляет из корзины строки, которые больше не вернёт ни одно действие журнала"""
+        tags = [tag for data in entries for tag in journal.trash_tags(journal.decode(data))]
+        if tags:
+            self.dbmanager.purge_trash(tags)
+            # Удалённые строки больше не вернутся: старые записи об удалении можно сжать
+            self.dbmanager.compact_change_log(self.CHANGE_LOG_KEEP_DELETES)
\ No newline at end of file
@@ -0,0 +1,190 @@
+"""
+Счётчики и гистограммы в памяти процесса с выводом в текстовом формате Prometheus.
+Обновление метрики — поиск по словарю и пара сложений под блокировкой, поэтому их можно
+обновлять на каждом HTTP и SQL запросе. Метрики базы и импорта объявлены здесь,
+метрики API — в src/api/metrics.py; GET /metrics отдаёт REGISTRY.render().
+"""
+import os
+import threading
+from bisect import bisect_left
+
+# Границы корзин гистограмм задержки в секундах
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Registry:
+    """Набор метрик процесса"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        """Добавляет метрику; метрика с тем же именем заменяется (повторный импорт модуля)"""
+        with self._lock:
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """Все метрики в текстовом формате Prometheus"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), registry: Registry = REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    def _labels(self, values, extra: str = "") -> str:
+        pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter(_Metric):
+    """Возрастающий счётчик; значения меток передаются позиционно в порядке labelnames"""
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels) -> float:
+        return self._values.get(labels, 0)
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{self._labels(labels)} {_number(value)}" for labels, value in items]
+
+
+class Histogram(_Metric):
+    """Распределение значений по корзинам с суммой и количеством"""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=LATENCY_BUCKETS,
+                 registry: Registry = REGISTRY):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                # Счётчики корзин (предпоследний — +Inf) и сумма значений в последнем элементе
+                state = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            state[index] += 1
+            state[-1] += value
+
+    def snapshot(self, *labels) -> tuple[int, float]:
+        """Количество и сумма наблюдений с указанными метками"""
+        with self._lock:
+            state = self._values.get(labels)
+            return (sum(state[:-1]), state[-1]) if state else (0, 0.0)
+
+    def samples(self):
+        with self._lock:
+            items = sorted((labels, list(state)) for labels, state in self._values.items())
+        lines = []
+        for labels, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), state):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _number(bound)
+                extra = f'le="{le}"'
+                lines.append(f"{self.name}_bucket{self._labels(labels, extra)} {cumulative}")
+            lines.append(f"{self.name}_sum{self._labels(labels)} {_number(state[-1])}")
+            lines.append(f"{self.name}_count{self._labels(labels)} {cumulative}")
+        return lines
+
+
+class Gauge(_Metric):
+    """Мгновенные значения, которые функция collect() возвращает при каждом чтении: {метки: значение}"""
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), collect=None, registry: Registry = REGISTRY):
+        super().__init__(name, documentation, labelnames, registry)
+        self.collect = collect
+
+    def samples(self):
+        try:
+            values = self.collect() if self.collect is not None else {}
+        except Exception as e:
+            print(f"❌ Ошибка чтения метрики {self.name}: {e}")
+            return []
+        return [f"{self.name}{self._labels(labels)} {_number(value)}" for labels, value in sorted(values.items())]
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _number(value) -> str:
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+# Число запросов — budget_db_query_duration_seconds_count
+DB_QUERY_SECONDS = Histogram("budget_db_query_duration_seconds",
+                             "Время выполнения SQL запроса по виду оператора (для SELECT — до первой строки)",
+                             ["statement"])
+DB_CONNECTIONS = Counter("budget_db_connections_opened_total", "Открытые соединения SQLite")
+IMPORT_ROWS = Counter("budget_import_rows_total", "Импортированные операции по формату файла", ["format"])
+IMPORT_SECONDS = Histogram("budget_import_duration_seconds", "Время импорта файла по формату", ["format"])
+
+# Виды операторов, которые учитываются отдельно; остальные попадают в other
+STATEMENTS = frozenset(("SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "SAVEPOINT", "RELEASE", "ROLLBACK"))
+
+
+# Вид оператора по тексту запроса: тексты почти всегда одни и те же, разбор нужен один раз
+_KINDS = {}
+_KINDS_MAX = 4096
+
+
+def statement_kind(sql: str) -> str:
+    """Вид SQL оператора по первому слову"""
+    kind = _KINDS.get(sql)
+    if kind is None:
+        word = sql.lstrip()[:10].split(None, 1)
+        kind = word[0].upper() if word else ""
+        kind = kind if kind in STATEMENTS else "other"
+        if len(_KINDS) < _KINDS_MAX:
+            _KINDS[sql] = kind
+    return kind
+
+
+def observe_query(sql: str, seconds: float):
+    DB_QUERY_SECONDS.observe(seconds, statement_kind(sql))
+
+
+def file_format(filename: str) -> str:
+    """Формат файла для метрик импорта — расширение без точки"""
+    return os.path.splitext(filename)[1].lower().lstrip(".") or "other"
+
+
+def record_import(file_format: str, rows: int, seconds: float = None):
+    """Учитывает импортированный файл: число операций и, если известно, время импорта"""
+    IMPORT_ROWS.inc(file_format, amount=rows)
+    if seconds is not None:
+        IMPORT_SECONDS.observe(seconds, file_format)
@@ -0,0 +1,94 @@
+"""
+Выгрузка и загрузка хранилища операций в формате Parquet (нужен пакет pyarrow).
+Архив — каталог с файлами transactions.parquet и reports.parquet.
+"""
+import os
+
+TRANSACTIONS_FILE = "transactions.parquet"
+REPORTS_FILE = "reports.parquet"
+ROW_GROUP_SIZE = 100_000
+COMPRESSION = "zstd"
+
+
+def _pyarrow():
+    """pyarrow нужен только для Parquet, поэтому импортируется при первом обращении"""
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("Для работы с Parquet установите пакет pyarrow: pip install pyarrow") from None
+    return pyarrow
+
+
+def transactions_schema():
+    pa = _pyarrow()
+    return pa.schema([
+        ("id", pa.int64()),
+        ("report_id", pa.int64()),
+        ("amount", pa.float64()),
+        ("category", pa.string()),
+        ("note", pa.string()),
+        ("date", pa.string()),
+        ("type", pa.string()),
+    ])
+
+
+def reports_schema():
+    pa = _pyarrow()
+    return pa.schema([
+        ("id", pa.int64()),
+        ("filename", pa.string()),
+        ("import_date", pa.string()),
+    ])
+
+
+def export_parquet(dbmanager, path, filters=None, row_group_size=ROW_GROUP_SIZE) -> int:
+    """
+    Выгружает операции (с фильтрами DBManager._build_filter) и их отчёты в каталог path.
+    Операции пишутся потоково: каждая порция из базы — отдельная группа строк.
+    Возвращает количество выгруженных операций.
+    """
+    pa = _pyarrow()
+    os.makedirs(path, exist_ok=True)
+    schema = transactions_schema()
+    report_ids = set()
+    count = 0
+    with pa.parquet.ParquetWriter(os.path.join(path, TRANSACTIONS_FILE), schema,
+                                  compression=COMPRESSION) as writer:
+        for rows in dbmanager.iter_transactions(filters, row_group_size):
+            columns = list(zip(*rows))
+            writer.write_table(pa.Table.from_arrays([pa.array(column, type=field.type)
+                                                     for column, field in zip(columns, schema)], schema=schema))
+            report_ids.update(columns[1])
+            count += len(rows)
+
+    reports = dbmanager.get_reports(report_id for report_id in report_ids if report_id is not None)
+    table = pa.Table.from_pylist([dict(zip(reports_schema().names, report)) for report in reports],
+                                 schema=reports_schema())
+    pa.parquet.write_table(table, os.path.join(path, REPORTS_FILE), compression=COMPRESSION)
+    return count
+
+
+def import_parquet(dbmanager, path, batch_size=ROW_GROUP_SIZE) -> tuple[dict, int]:
+    """
+    Загружает архив из каталога path одной транзакцией, читая операции порциями.
+    Отчёты получают новые ID. Возвращает (соответствие старых ID отчётов новым, число операций).
+    """
+    pa = _pyarrow()
+    transactions_path = os.path.join(path, TRANSACTIONS_FILE)
+    if not os.path.exists(transactions_path):
+        raise ValueError(f"В каталоге {path} нет файла {TRANSACTIONS_FILE}")
+    reports_path = os.path.join(path, REPORTS_FILE)
+    reports = []
+    if os.path.exists(reports_path):
+        table = pa.parquet.read_table(reports_path, columns=reports_schema().names)
+        reports = list(zip(*(table.column(name).to_pylist() for name in reports_schema().names)))
+
+    columns = ["report_id", "amount", "category", "note", "date", "type"]
+    parquet_file = pa.parquet.ParquetFile(transactions_path)
+    missing = [c for c in columns if c not in parquet_file.schema_arrow.names]
+    if missing:
+        raise ValueError(f"В архиве нет столбцов: {', '.join(missing)}")
+    batches = (list(zip(*(batch.column(name).to_pylist() for name in columns)))
+               for batch in parquet_file.iter_batches(batch_size=batch_size, columns=columns))
+    return dbmanager.import_archive(reports, batches, os.path.basename(os.path.normpath(path)))
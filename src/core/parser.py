@@ -1,14 +1,571 @@
+import csv
+import multiprocessing
+import pickle
+import queue
+import re
+import tempfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from itertools import islice
+
+import openpyxl
 import pandas as pd
 import os
 
+from .profiles import COLUMN_MAPPING, DEFAULT_PROFILE, header_signature
+from .statements import STATEMENT_READERS
+from .summary import EXPENSE_TYPE, INCOME_TYPE
+
+# Столбцы стандартной банковской выписки, без которых импорт невозможен
+EXPECTED_COLUMNS = list(COLUMN_MAPPING.values())
+
+STATEMENT_EXTENSIONS = (".csv", ".xlsx", ".xls", *STATEMENT_READERS)
+# Поля строки, которую отдают normalize_chunk и читатели выписок OFX/QIF/CAMT.053
+ROW_FIELDS = ("amount", "category", "note", "date", "type")
+
+CSV_DELIMITERS = ";,\t|"
+# Поле, похожее на денежную сумму: "-1 234,56" или "1234.5"
+_AMOUNT_RE = re.compile(r"^[-+]?\d[\d \u00a0]*([.,])\d{1,2}$")
+
+
+class ImportCancelled(Exception):
+    """Импорт прерван по запросу пользователя"""
+
+
 class Parser:
+    CHUNK_SIZE = 50_000
+    SAMPLE_SIZE = 64 * 1024
+
     @staticmethod
-    def parse_file(filename) -> pd.DataFrame:
+    def parse_file(filename, source=None, profile=None) -> pd.DataFrame:
+        """
+        Читает выписку целиком. filename задаёт формат по расширению;
+        source — открытый бинарный файл с содержимым, если его нет на диске под этим именем.
+        profile (BankProfile) с закреплённым диалектом избавляет от его определения.
+        """
+        source = filename if source is None else source
         ext = os.path.splitext(filename)[1].lower()
         if ext == ".csv":
-            df = pd.read_csv(filename, sep=None, engine='python')
-        elif ext in (".xlsx", ".xls"):
-            df = pd.read_excel(filename)
+            dialect = _csv_dialect(source, profile)
+            with _open_source(source) as f:
+                df = pd.read_csv(f, **Parser.csv_options(dialect, profile))
+            # По диалекту normalize_chunk разбирает суммы, которые pandas оставил текстом
+            df.attrs["dialect"] = dialect
+        elif ext == ".xlsx":
+            df = pd.concat([frame for sheet in Parser._import_sheets(source, profile)
+                            for frame in Parser._iter_sheet_frames(source, sheet, chunksize=None)],
+                           ignore_index=True)
+        elif ext == ".xls":
+            with _open_source(source) as f:
+                df = pd.read_excel(f)
         else:
             raise ValueError("Поддерживаются только файлы CSV или XLSX")
-        return df
\ No newline at end of file
+        return df
+
+    @staticmethod
+    def iter_chunks(filename, chunksize=CHUNK_SIZE, source=None, profile=None):
+        """
+        Читает файл порциями по chunksize строк.
+        Возвращает пары (DataFrame, количество прочитанных байт).
+        """
+        source = filename if source is None else source
+        ext = os.path.splitext(filename)[1].lower()
+        if ext == ".csv":
+            dialect = _csv_dialect(source, profile)
+            with _open_source(source) as f:
+                for chunk in pd.read_csv(f, chunksize=chunksize, **Parser.csv_options(dialect, profile)):
+                    chunk.attrs["dialect"] = dialect
+                    yield chunk, f.tell()
+        elif ext == ".xlsx":
+            sheets = Parser._import_sheets(source, profile)
+            size = _source_size(source)
+            for done, sheet in enumerate(sheets, 1):
+                for chunk in Parser._iter_sheet_frames(source, sheet, chunksize):
+                    yield chunk, size * done // len(sheets)
+        elif ext == ".xls":
+            # Старый формат читается только целиком
+            with _open_source(source) as f:
+                df = pd.read_excel(f)
+            size = _source_size(source)
+            for start in range(0, len(df), chunksize):
+                yield df.iloc[start:start + chunksize], size
+        else:
+            raise ValueError("Поддерживаются только файлы CSV или XLSX")
+
+    @staticmethod
+    def iter_batches(filename, chunksize=CHUNK_SIZE, workers=None, source=None, profile=None):
+        """
+        Отдаёт проверенные и нормализованные порции (rows, bytes_read) для DBManager.add_transactions.
+        Листы многостраничной .xlsx на диске при workers > 1 разбираются параллельно в пуле процессов.
+        Выписки OFX/QFX, QIF и CAMT.053 (.xml) разбираются потоково читателями из statements.
+        """
+        profile = profile or DEFAULT_PROFILE
+        ext = os.path.splitext(filename)[1].lower()
+        if ext in STATEMENT_READERS:
+            yield from Parser._iter_statement_batches(filename if source is None else source,
+                                                      STATEMENT_READERS[ext], chunksize)
+            return
+        parallel = workers and workers > 1 and source is None and ext == ".xlsx"
+        sheets = Parser.excel_data_sheets(filename, profile.columns) if parallel else []
+        if len(sheets) > 1:
+            size = os.path.getsize(filename)
+            done = 0
+            tasks = [(filename, sheet, chunksize, profile) for sheet in sheets]
+            for _, kind, payload in _iter_parallel(_normalize_sheet, tasks, min(workers, len(sheets))):
+                if kind == "error":
+                    raise payload
+                if kind == "done":
+                    done += 1
+                else:
+                    yield payload, size * done // len(sheets)
+            return
+
+        checked = False
+        for chunk, bytes_read in Parser.iter_chunks(filename, chunksize, source, profile):
+            if not checked:
+                Parser.check_columns(chunk.columns, profile)
+                checked = True
+            yield Parser.normalize_chunk(chunk, profile), bytes_read
+
+    @staticmethod
+    def _iter_statement_batches(source, reader, chunksize):
+        """Собирает строки читателя выписки в порции по chunksize"""
+        with _open_source(source) as f:
+            rows = reader(f)
+            while batch := list(islice(rows, chunksize)):
+                yield batch, f.tell()
+
+    @staticmethod
+    def preview(filename, nrows=20, source=None, profile=None) -> dict:
+        """
+        Разбирает только первые nrows строк выписки, ничего не записывая.
+        Возвращает формат, профиль банка, диалект CSV, найденные столбцы,
+        соответствие полей столбцам, строки образца и ошибки проверки.
+        """
+        source = filename if source is None else source
+        known_profile = profile
+        profile = profile or DEFAULT_PROFILE
+        ext = os.path.splitext(filename)[1].lower()
+        dialect = None
+        if ext in STATEMENT_READERS:
+            with _open_source(source) as f:
+                rows = [dict(zip(ROW_FIELDS, row)) for row in islice(STATEMENT_READERS[ext](f), nrows)]
+            return {"format": ext.lstrip("."), "profile": None, "dialect": None, "columns": list(ROW_FIELDS),
+                    "mapping": {field: field for field in ROW_FIELDS}, "rows": rows,
+                    "errors": [] if rows else ["Операции в выписке не найдены"]}
+        if ext == ".csv":
+            dialect = _csv_dialect(source, known_profile)
+            with _open_source(source) as f:
+                df = pd.read_csv(f, nrows=nrows, **Parser.csv_options(dialect, known_profile))
+        elif ext == ".xlsx":
+            sheets = Parser.excel_data_sheets(source, profile.columns) or [None]
+            frames = Parser._iter_sheet_frames(source, sheets[0], nrows)
+            df = next(frames)
+            frames.close()
+        elif ext == ".xls":
+            with _open_source(source) as f:
+                df = pd.read_excel(f, nrows=nrows)
+        else:
+            raise ValueError("Поддерживаются только файлы CSV, XLSX, OFX/QFX, QIF или CAMT.053")
+
+        columns = [str(c) for c in df.columns]
+        mapping = {field: (column if column in columns else None) for field, column in profile.mapping.items()}
+        errors = [f"Не найден столбец: {column}" for column in profile.columns if column not in columns]
+        if mapping.get("amount"):
+            amounts = pd.to_numeric(df[mapping["amount"]], errors="coerce")
+            for i in df.index[amounts.isna()]:
+                errors.append(f"Строка {i + 1}: сумма '{df.at[i, mapping['amount']]}' не число, строка будет пропущена")
+
+        rows = [{column: _json_value(value) for column, value in zip(columns, row)}
+                for row in df.itertuples(index=False, name=None)]
+        return {"format": ext.lstrip("."), "profile": known_profile.name if known_profile else None,
+                "dialect": dialect, "columns": columns, "mapping": mapping, "rows": rows, "errors": errors}
+
+    @staticmethod
+    def read_header(filename, source=None) -> list[str]:
+        """
+        Читает только строку заголовка выписки (для CSV — первую строку файла,
+        для XLSX — первую строку первого листа). Используется для поиска профиля банка.
+        """
+        source = filename if source is None else source
+        ext = os.path.splitext(filename)[1].lower()
+        if ext == ".csv":
+            with _open_source(source) as f:
+                line = f.readline(Parser.SAMPLE_SIZE)
+            if line.startswith(b"\xef\xbb\xbf"):
+                line = line[3:]
+            try:
+                text = line.decode("utf-8")
+            except UnicodeDecodeError:
+                text = line.decode("cp1251")
+            text = text.rstrip("\r\n")
+            sep = max(CSV_DELIMITERS, key=text.count) if text else ","
+            return next(csv.reader([text], delimiter=sep), [])
+        if ext == ".xlsx":
+            wb = _load_workbook(source)
+            try:
+                header = next(wb.worksheets[0].iter_rows(max_row=1, values_only=True), ())
+            finally:
+                wb.close()
+            return [str(c) for c in header if c is not None]
+        return []
+
+    @staticmethod
+    def header_signature(filename, source=None) -> str:
+        """Подпись заголовка выписки для поиска профиля банка"""
+        return header_signature(Parser.read_header(filename, source))
+
+    @staticmethod
+    def expand_sources(paths) -> list[tuple]:
+        """
+        Раскрывает .zip архивы в списке файлов.
+        Возвращает тройки (путь, имя файла в архиве или None, имя для отчёта).
+        """
+        sources = []
+        for path in paths:
+            if os.path.splitext(path)[1].lower() != ".zip":
+                sources.append((path, None, os.path.basename(path)))
+                continue
+            with zipfile.ZipFile(path) as archive:
+                for member in archive.namelist():
+                    if os.path.splitext(member)[1].lower() in STATEMENT_EXTENSIONS:
+                        sources.append((path, member, f"{os.path.basename(path)}:{os.path.basename(member)}"))
+        return sources
+
+    @staticmethod
+    def excel_data_sheets(source, columns=EXPECTED_COLUMNS) -> list[str]:
+        """Возвращает листы .xlsx, в заголовке которых есть все нужные столбцы"""
+        wb = _load_workbook(source)
+        try:
+            sheets = []
+            for ws in wb.worksheets:
+                header = next(ws.iter_rows(max_row=1, values_only=True), ())
+                if all(c in header for c in columns):
+                    sheets.append(ws.title)
+            return sheets
+        finally:
+            wb.close()
+
+    @staticmethod
+    def _import_sheets(source, profile=None) -> list:
+        """
+        Листы .xlsx, которые импортируются: все листы с нужными столбцами,
+        а если таких нет — первый лист (его столбцы проверит check_columns)
+        """
+        return Parser.excel_data_sheets(source, (profile or DEFAULT_PROFILE).columns) or [None]
+
+    @staticmethod
+    def _iter_sheet_frames(source, sheet_name=None, chunksize=CHUNK_SIZE):
+        """
+        Читает лист .xlsx построчно в режиме read_only и отдаёт DataFrame по chunksize строк
+        (chunksize=None — весь лист). Без sheet_name читается первый лист.
+        Хотя бы один DataFrame отдаётся всегда, чтобы можно было проверить столбцы.
+        """
+        wb = _load_workbook(source)
+        try:
+            ws = wb[sheet_name] if sheet_name else wb.worksheets[0]
+            rows = ws.iter_rows(values_only=True)
+            header = next(rows, ())
+            columns = [str(c) if c is not None else f"Unnamed: {i}" for i, c in enumerate(header)]
+            width = len(columns)
+            batch = []
+            yielded = False
+            for row in rows:
+                if all(v is None for v in row):
+                    continue
+                batch.append(tuple(row[:width]) + (None,) * (width - len(row)))
+                if chunksize and len(batch) >= chunksize:
+                    yield pd.DataFrame(batch, columns=columns)
+                    yielded = True
+                    batch = []
+            if batch or not yielded:
+                yield pd.DataFrame(batch, columns=columns)
+        finally:
+            wb.close()
+
+    @staticmethod
+    def detect_dialect(source, sample_size=SAMPLE_SIZE) -> dict:
+        """
+        Определяет кодировку, разделитель, кавычки и десятичный разделитель CSV
+        по первым sample_size байтам файла (путь или открытый бинарный файл).
+        """
+        with _open_source(source) as f:
+            sample = f.read(sample_size)
+
+        if sample.startswith(b"\xef\xbb\xbf"):
+            encoding = "utf-8-sig"
+        else:
+            try:
+                sample.decode("utf-8")
+                encoding = "utf-8"
+            except UnicodeDecodeError as e:
+                # Образец мог оборвать многобайтовый символ на последних байтах
+                encoding = "utf-8" if e.start >= len(sample) - 3 else "cp1251"
+        text = sample.decode(encoding, errors="ignore")
+        lines = text.splitlines()
+        if len(sample) == sample_size and len(lines) > 1:
+            lines = lines[:-1]  # последняя строка образца может быть неполной
+
+        header = lines[0] if lines else ""
+        try:
+            sniffed = csv.Sniffer().sniff("\n".join(lines[:50]), delimiters=CSV_DELIMITERS)
+            sep, quotechar = sniffed.delimiter, sniffed.quotechar or '"'
+        except csv.Error:
+            sep = max(CSV_DELIMITERS, key=header.count) if header else ","
+            quotechar = '"'
+
+        decimal, thousands = ".", None
+        if sep != ",":
+            amounts = [field.strip() for row in csv.reader(lines[1:], delimiter=sep, quotechar=quotechar)
+                       for field in row if _AMOUNT_RE.match(field.strip())]
+            marks = [_AMOUNT_RE.match(a).group(1) for a in amounts]
+            if marks.count(",") > marks.count("."):
+                decimal = ","
+                for space in (" ", "\u00a0"):
+                    if any(space in a for a in amounts):
+                        thousands = space
+                        break
+
+        return {"encoding": encoding, "sep": sep, "quotechar": quotechar,
+                "decimal": decimal, "thousands": thousands}
+
+    @staticmethod
+    def csv_options(dialect: dict, profile=None) -> dict:
+        """Параметры pd.read_csv для быстрого C-парсера по диалекту и типам столбцов профиля"""
+        dtypes = (profile or DEFAULT_PROFILE).dtypes
+        return {
+            "engine": "c",
+            "encoding": dialect["encoding"],
+            "sep": dialect["sep"],
+            "quotechar": dialect["quotechar"],
+            "decimal": dialect["decimal"],
+            "thousands": dialect["thousands"],
+            "dtype": {column: (str if kind == "str" else float) for column, kind in dtypes.items()},
+        }
+
+    @staticmethod
+    def check_columns(columns, profile=None):
+        """Проверяет, что в выписке есть все столбцы профиля"""
+        missing = [c for c in (profile or DEFAULT_PROFILE).columns if c not in columns]
+        if missing:
+            raise ValueError(f"Не найдены столбцы: {', '.join(missing)}")
+
+    @staticmethod
+    def normalize_chunk(df: pd.DataFrame, profile=None) -> list[tuple]:
+        """
+        Преобразует порцию выписки в строки (amount, category, note, date, type)
+        для DBManager.add_transactions по правилам профиля банка.
+        Строки с нечисловой суммой пропускаются.
+        """
+        mapping = (profile or DEFAULT_PROFILE).mapping
+        amounts = _parse_amounts(df[mapping["amount"]], df.attrs.get("dialect"))
+        valid = amounts.notna()
+        df = df[valid]
+        amounts = amounts[valid].astype(float)
+
+        if profile is not None and profile.sign_rule == "signed_amount":
+            types = amounts.map(lambda a: EXPENSE_TYPE if a < 0 else INCOME_TYPE)
+            amounts = amounts.abs()
+        else:
+            types = df[mapping["type"]].astype(str)
+
+        if "description" in mapping:
+            notes = df[mapping["description"]].astype(str)
+            if "comment" in mapping:
+                notes = notes + " (" + df[mapping["comment"]].astype(str) + ")"
+        else:
+            notes = pd.Series("", index=df.index)
+
+        dates = df[mapping["date"]]
+        if profile is not None and profile.date_format:
+            parsed = pd.to_datetime(dates, format=profile.date_format, errors="coerce")
+            dates = parsed.dt.strftime("%Y-%m-%d %H:%M:%S").where(parsed.notna(), dates.astype(str))
+        else:
+            dates = dates.astype(str)
+
+        categories = df[mapping["category"]].astype(str) if "category" in mapping else pd.Series("", index=df.index)
+        return list(zip(amounts.tolist(),
+                        categories.tolist(),
+                        notes.tolist(),
+                        dates.tolist(),
+                        types.tolist()))
+
+
+def _parse_amounts(column: pd.Series, dialect=None) -> pd.Series:
+    """
+    Суммы порции как числа; нечисловые — NaN. Если в столбце есть хоть одна нечисловая ячейка,
+    read_csv оставляет его текстом, не применив decimal и thousands диалекта, — тогда
+    разделитель тысяч убирается и десятичная запятая заменяется точкой здесь
+    """
+    if dialect and not pd.api.types.is_numeric_dtype(column):
+        column = column.astype(str)
+        if dialect.get("thousands"):
+            column = column.str.replace(dialect["thousands"], "", regex=False)
+        if dialect.get("decimal", ".") != ".":
+            column = column.str.replace(dialect["decimal"], ".", regex=False)
+    return pd.to_numeric(column, errors="coerce")
+
+
+@contextmanager
+def _open_source(source):
+    """Открывает путь на чтение в бинарном режиме или перематывает в начало уже открытый файл"""
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            yield f
+    else:
+        source.seek(0)
+        yield source
+
+
+def _source_size(source) -> int:
+    """Размер файла по пути или открытого файла в байтах"""
+    if isinstance(source, (str, os.PathLike)):
+        return os.path.getsize(source)
+    position = source.tell()
+    size = source.seek(0, os.SEEK_END)
+    source.seek(position)
+    return size
+
+
+def _csv_dialect(source, profile=None) -> dict:
+    """
+    Диалект CSV из профиля банка, а если он не закреплён или не подходит к файлу
+    (образец не декодируется в его кодировке или в заголовке нет его разделителя) — определённый по образцу
+    """
+    if profile is not None and profile.dialect and _dialect_fits(source, profile.dialect):
+        return profile.dialect
+    return Parser.detect_dialect(source)
+
+
+def _dialect_fits(source, dialect) -> bool:
+    with _open_source(source) as f:
+        sample = f.read(Parser.SAMPLE_SIZE)
+    try:
+        text = sample.decode(dialect["encoding"])
+    except UnicodeDecodeError as e:
+        # Образец мог оборвать многобайтовый символ на последних байтах
+        if len(sample) < Parser.SAMPLE_SIZE or e.start < len(sample) - 3:
+            return False
+        text = sample[:e.start].decode(dialect["encoding"])
+    except LookupError:
+        return False
+    header = text.lstrip("\ufeff").split("\n", 1)[0]
+    return dialect["sep"] in header
+
+
+def _load_workbook(source):
+    """Открывает книгу .xlsx в потоковом режиме read_only"""
+    if not isinstance(source, (str, os.PathLike)):
+        source.seek(0)
+    return openpyxl.load_workbook(source, read_only=True, data_only=True)
+
+
+def _json_value(value):
+    """Приводит значение ячейки к типу, который можно отдать в JSON"""
+    if value is None or (isinstance(value, float) and value != value):
+        return None
+    if isinstance(value, (str, bool, int, float)):
+        return value
+    if hasattr(value, "item"):  # скаляры numpy
+        return _json_value(value.item())
+    return str(value)
+
+
+def _normalize_sheet(filename, sheet_name, chunksize, profile=None):
+    """Выполняется в дочернем процессе: читает один лист и отдаёт его нормализованные порции"""
+    for df in Parser._iter_sheet_frames(filename, sheet_name, chunksize):
+        yield Parser.normalize_chunk(df, profile)
+
+
+def _normalize_file(path, member, chunksize, profiles=None):
+    """
+    Выполняется в дочернем процессе: разбирает файл (или файл из архива)
+    и отдаёт его нормализованные порции.
+    profiles — профили банков {подпись заголовка: BankProfile}.
+    """
+    if member is None:
+        yield from _normalize_path(path, chunksize, profiles)
+        return
+    # Парсеру нужен путь с расширением, поэтому файл из архива распаковывается во временный
+    with zipfile.ZipFile(path) as archive, archive.open(member) as src:
+        with tempfile.NamedTemporaryFile(suffix=os.path.splitext(member)[1], delete=False) as tmp:
+            while block := src.read(1024 * 1024):
+                tmp.write(block)
+    try:
+        yield from _normalize_path(tmp.name, chunksize, profiles)
+    finally:
+        os.remove(tmp.name)
+
+
+def _normalize_path(path, chunksize, profiles=None):
+    profile = (profiles or {}).get(Parser.header_signature(path))
+    for rows, _ in Parser.iter_batches(path, chunksize, profile=profile):
+        yield rows
+
+
+# Очередь порций и признак остановки дочернего процесса пула _iter_parallel
+_worker_results = None
+_worker_stop = None
+
+
+def _init_worker(results, stop):
+    global _worker_results, _worker_stop
+    _worker_results, _worker_stop = results, stop
+
+
+def _stream_task(func, index, args):
+    """Выполняется в дочернем процессе: отправляет порции генератора func(*args) в очередь по одной"""
+    try:
+        for rows in func(*args):
+            if _worker_stop.is_set():
+                return
+            _worker_results.put((index, "rows", rows))
+    except Exception as e:
+        try:
+            pickle.dumps(e)
+        except Exception:
+            e = RuntimeError(str(e))
+        _worker_results.put((index, "error", e))
+        return
+    _worker_results.put((index, "done", None))
+
+
+def _iter_parallel(func, tasks, workers=None):
+    """
+    Выполняет генераторы порций func(*args) для каждого args из tasks в пуле процессов
+    и отдаёт сообщения по мере готовности: (номер задачи, "rows", порция), а в конце задачи —
+    (номер, "done", None) или (номер, "error", исключение). Очередь ограничена, поэтому
+    в памяти одновременно лишь несколько порций, а не файлы целиком.
+    """
+    workers = workers or os.cpu_count() or 1
+    context = multiprocessing.get_context()
+    results = context.Queue(maxsize=2 * workers)
+    stop = context.Event()
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker,
+                             initargs=(results, stop)) as pool:
+        futures = [pool.submit(_stream_task, func, index, args) for index, args in enumerate(tasks)]
+        pending = len(futures)
+        try:
+            while pending:
+                try:
+                    message = results.get(timeout=1)
+                except queue.Empty:
+                    # Упавший дочерний процесс уже ничего не отправит
+                    for future in futures:
+                        if future.done() and future.exception() is not None:
+                            raise future.exception()
+                    continue
+                if message[1] != "rows":
+                    pending -= 1
+                yield message
+        finally:
+            # Если порции больше не нужны, дочерние процессы не должны зависнуть на полной очереди
+            stop.set()
+            for future in futures:
+                future.cancel()
+            while not all(future.done() for future in futures):
+                try:
+                    results.get(timeout=0.1)
+                except queue.Empty:
+                    pass
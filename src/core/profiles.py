@@ -0,0 +1,118 @@
+import hashlib
+import json
+
+# Соответствие полей операции столбцам стандартной банковской выписки
+COLUMN_MAPPING = {
+    "date": "Дата операции",
+    "account": "Номер счета",
+    "description": "Описание операции",
+    "amount": "Сумма",
+    "category": "Категория",
+    "type": "Тип",
+    "comment": "Комментарий",
+    "cashback": "Кэшбэк",
+}
+# Поля, без которых операцию нельзя сохранить
+REQUIRED_FIELDS = ("date", "amount")
+# type_column — тип операции берётся из столбца "type";
+# signed_amount — отрицательная сумма означает списание, положительная — пополнение
+SIGN_RULES = ("type_column", "signed_amount")
+NUMERIC_FIELDS = ("amount", "cashback")
+
+
+def header_signature(header) -> str:
+    """Подпись заголовка выписки: по ней узнаётся формат выгрузки банка"""
+    cells = [str(c).strip() for c in header if c is not None and str(c).strip()]
+    return hashlib.sha1("\x1f".join(cells).encode("utf-8")).hexdigest()
+
+
+class BankProfile:
+    """
+    Настройки разбора выписки одного банка: соответствие столбцов, типы столбцов,
+    диалект CSV, формат даты и правило знака суммы.
+    """
+
+    def __init__(self, name, mapping, dialect=None, dtypes=None, date_format=None,
+                 sign_rule="type_column", signature=None):
+        self.name = name
+        self.mapping = {field: column for field, column in mapping.items() if column}
+        self.dialect = dialect
+        # Текстовые столбцы читаются как строки, чтобы pandas не угадывал их тип на каждой порции;
+        # числовые приводятся в normalize_chunk, где нечисловые суммы пропускаются
+        self.dtypes = dtypes or {column: "str" for field, column in self.mapping.items()
+                                 if field not in NUMERIC_FIELDS}
+        self.date_format = date_format
+        self.sign_rule = sign_rule
+        self.signature = signature
+
+    @property
+    def columns(self) -> list[str]:
+        """Столбцы, которые должны быть в выписке"""
+        return list(self.mapping.values())
+
+    def validate(self):
+        missing = [field for field in REQUIRED_FIELDS if field not in self.mapping]
+        if missing:
+            raise ValueError(f"В профиле не указаны столбцы для полей: {', '.join(missing)}")
+        if self.sign_rule not in SIGN_RULES:
+            raise ValueError(f"Неизвестное правило знака: {self.sign_rule}")
+        if self.sign_rule == "type_column" and "type" not in self.mapping:
+            raise ValueError("Для правила type_column нужен столбец типа операции (type)")
+
+    def to_json(self) -> dict:
+        return {
+            "name": self.name,
+            "signature": self.signature,
+            "mapping": self.mapping,
+            "dialect": self.dialect,
+            "dtypes": self.dtypes,
+            "date_format": self.date_format,
+            "sign_rule": self.sign_rule,
+        }
+
+    @staticmethod
+    def from_json(data: dict) -> "BankProfile":
+        return BankProfile(name=data["name"],
+                           mapping=data["mapping"],
+                           dialect=data.get("dialect"),
+                           dtypes=data.get("dtypes"),
+                           date_format=data.get("date_format"),
+                           sign_rule=data.get("sign_rule", "type_column"),
+                           signature=data.get("signature"))
+
+
+DEFAULT_PROFILE = BankProfile("Стандартная выписка", COLUMN_MAPPING)
+
+
+class ProfileRegistry:
+    """
+    Реестр профилей банковских выписок по подписи заголовка.
+    Профили хранятся в базе и кэшируются в памяти при первом обращении.
+    """
+
+    def __init__(self, dbmanager):
+        self.dbmanager = dbmanager
+        self._profiles = None
+
+    def _load(self) -> dict:
+        if self._profiles is None:
+            self._profiles = {signature: BankProfile.from_json(json.loads(data))
+                              for signature, data in self.dbmanager.get_bank_profiles()}
+        return self._profiles
+
+    def find(self, signature: str):
+        """Возвращает профиль по подписи заголовка или None"""
+        return self._load().get(signature)
+
+    def list(self) -> list[BankProfile]:
+        return list(self._load().values())
+
+    def register(self, profile: BankProfile) -> BankProfile:
+        """Проверяет и сохраняет профиль; профиль с той же подписью заменяется"""
+        if not profile.signature:
+            raise ValueError("У профиля нет подписи заголовка")
+        profile.validate()
+        self.dbmanager.save_bank_profile(profile.signature, profile.name,
+                                         json.dumps(profile.to_json(), ensure_ascii=False))
+        self._load()[profile.signature] = profile
+        return profile
@@ -0,0 +1,266 @@
+"""
+Потоковый разбор банковских выписок в форматах OFX/QFX, QIF и ISO 20022 CAMT.053.
+Каждый читатель принимает открытый бинарный файл и по одной отдаёт строки
+(amount, category, note, date, type) для DBManager.add_transactions,
+поэтому память не зависит от размера выписки.
+"""
+import html
+import io
+import re
+import xml.etree.ElementTree as ET
+from datetime import datetime
+
+from .summary import EXPENSE_TYPE, INCOME_TYPE
+
+BLOCK_SIZE = 64 * 1024
+
+_OFX_TAG_RE = re.compile(r"<(/?)([A-Za-z0-9.]+)>([^<]*)")
+_OFX_CHARSET_RE = re.compile(rb"CHARSET:\s*(\w+)")
+_XML_ENCODING_RE = re.compile(rb"encoding=[\"']([\w.-]+)[\"']")
+
+QIF_DATE_FORMATS = ("%m/%d/%Y", "%m/%d/%y", "%d.%m.%Y", "%d.%m.%y", "%Y-%m-%d")
+# Разделы QIF с операциями по счетам; списки счетов, категорий и инвестиций пропускаются
+QIF_TRANSACTION_TYPES = ("bank", "cash", "ccard", "oth a", "oth l")
+
+
+def parse_amount(text: str) -> float:
+    """Сумма из выписки: "1,234.56", "-1 234,56" или "150.5" """
+    text = text.strip().replace(" ", "").replace("\u00a0", "")
+    if "," in text and "." in text:
+        text = text.replace(",", "")
+    return float(text.replace(",", "."))
+
+
+def _row(amount: float, category: str, note: str, date: str) -> tuple:
+    """Строка для записи: знак суммы определяет тип операции"""
+    return abs(amount), category, note, date, EXPENSE_TYPE if amount < 0 else INCOME_TYPE
+
+
+def _note(name: str, memo: str) -> str:
+    if name and memo and memo != name:
+        return f"{name} ({memo})"
+    return name or memo or ""
+
+
+def _text(f, encoding):
+    """Текстовая обёртка над бинарным файлом, которая не закрывает сам файл"""
+    wrapper = io.TextIOWrapper(f, encoding=encoding, errors="replace", newline="")
+    try:
+        yield from iter(lambda: wrapper.read(BLOCK_SIZE), "")
+    finally:
+        wrapper.detach()
+
+
+def _ofx_encoding(head: bytes) -> str:
+    match = _XML_ENCODING_RE.search(head)
+    if match:
+        return match.group(1).decode("ascii")
+    match = _OFX_CHARSET_RE.search(head)
+    if match and match.group(1).isdigit():
+        return "cp" + match.group(1).decode("ascii")
+    return "utf-8"
+
+
+def _ofx_date(value: str) -> str:
+    """20250105 или 20250105120000.000[+3:MSK] -> 2025-01-05 или 2025-01-05 12:00:00"""
+    digits = value[:14]
+    if len(digits) == 14 and digits.isdigit() and digits[8:] != "000000":
+        return datetime.strptime(digits, "%Y%m%d%H%M%S").strftime("%Y-%m-%d %H:%M:%S")
+    if digits[:8].isdigit():
+        return datetime.strptime(digits[:8], "%Y%m%d").strftime("%Y-%m-%d")
+    return value
+
+
+def iter_ofx(f):
+    """
+    Операции OFX/QFX (как SGML версии 1.x, так и XML версии 2.x).
+    Файл разбирается по тегам блоками, в памяти держится только текущая операция.
+    """
+    encoding = _ofx_encoding(f.read(BLOCK_SIZE)[:4096])
+    f.seek(0)
+    holder = [None]
+    rest = ""
+    for block in _text(f, encoding):
+        data = rest + block
+        # Последний тег может быть обрезан границей блока
+        cut = data.rfind("<")
+        rest = data[cut:] if cut >= 0 else ""
+        yield from _ofx_tags(data[:cut] if cut >= 0 else data, holder)
+    yield from _ofx_tags(rest, holder)
+    if holder[0] is not None:
+        # Файл оборван до закрытия списка операций
+        row = _ofx_row(holder[0])
+        if row is not None:
+            yield row
+
+
+def _ofx_tags(data: str, holder: list):
+    """Разбирает теги OFX, holder[0] — незавершённая операция между вызовами"""
+    for closing, tag, value in _OFX_TAG_RE.findall(data):
+        tag = tag.upper()
+        if tag == "STMTTRN":
+            # В SGML операция может не иметь закрывающего тега до начала следующей
+            if holder[0] is not None:
+                row = _ofx_row(holder[0])
+                if row is not None:
+                    yield row
+            holder[0] = None if closing else {}
+        elif tag == "BANKTRANLIST" and closing and holder[0] is not None:
+            row = _ofx_row(holder[0])
+            if row is not None:
+                yield row
+            holder[0] = None
+        elif holder[0] is not None and not closing:
+            holder[0][tag] = html.unescape(value.strip())
+
+
+def _ofx_row(fields: dict):
+    try:
+        amount = parse_amount(fields.get("TRNAMT", ""))
+    except ValueError:
+        return None
+    return _row(amount, "", _note(fields.get("NAME", ""), fields.get("MEMO", "")),
+                _ofx_date(fields.get("DTPOSTED", "")))
+
+
+def _qif_encoding(sample: bytes) -> str:
+    if sample.startswith(b"\xef\xbb\xbf"):
+        return "utf-8-sig"
+    # Образец обрезается по последней целой строке, чтобы не разрезать символ UTF-8
+    if b"\n" in sample:
+        sample = sample[:sample.rindex(b"\n")]
+    try:
+        sample.decode("utf-8")
+        return "utf-8"
+    except UnicodeDecodeError:
+        return "cp1251"
+
+
+def _qif_date(value: str) -> str:
+    value = value.strip().replace("'", "/").replace(" ", "")
+    for date_format in QIF_DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format).strftime("%Y-%m-%d")
+        except ValueError:
+            continue
+    return value
+
+
+def iter_qif(f):
+    """Операции QIF: записи из строк с кодом поля в первом символе, запись завершается '^'"""
+    encoding = _qif_encoding(f.read(BLOCK_SIZE))
+    f.seek(0)
+    section = None
+    record = {}
+    rest = ""
+    for block in _text(f, encoding):
+        lines = (rest + block).split("\n")
+        rest = lines.pop()
+        for line in lines:
+            section, record, row = _qif_line(line.rstrip("\r"), section, record)
+            if row is not None:
+                yield row
+    for line in (rest, "^"):
+        section, record, row = _qif_line(line.rstrip("\r"), section, record)
+        if row is not None:
+            yield row
+
+
+def _qif_line(line: str, section, record: dict):
+    """Разбирает строку QIF. Возвращает (раздел, текущая запись, готовая строка или None)"""
+    if not line:
+        return section, record, None
+    code, value = line[0], line[1:].strip()
+    if code == "!":
+        if value.lower().startswith("type:"):
+            return value[5:].strip().lower(), {}, None
+        return value.lower(), {}, None
+    if code != "^":
+        # Поля разбивки (S, E, $) не нужны: сумма операции уже есть в T
+        record.setdefault(code, value)
+        return section, record, None
+    row = None
+    if section in QIF_TRANSACTION_TYPES and "D" in record:
+        try:
+            amount = parse_amount(record.get("T") or record.get("U", ""))
+        except ValueError:
+            amount = None
+        if amount is not None:
+            category = record.get("L", "").strip("[]")
+            row = _row(amount, category, _note(record.get("P", ""), record.get("M", "")), _qif_date(record["D"]))
+    return section, {}, row
+
+
+def _local(tag: str) -> str:
+    """Имя тега XML без пространства имён"""
+    return tag.rsplit("}", 1)[-1]
+
+
+def _find(elem, *path):
+    """Ищет потомка по цепочке имён тегов без учёта пространства имён"""
+    for name in path:
+        elem = next((child for child in elem if _local(child.tag) == name), None)
+        if elem is None:
+            return None
+    return elem
+
+
+def _find_text(elem, *path) -> str:
+    found = _find(elem, *path)
+    return (found.text or "").strip() if found is not None else ""
+
+
+def _camt_date(entry) -> str:
+    for date_tag in ("BookgDt", "ValDt"):
+        value = _find_text(entry, date_tag, "Dt")
+        if value:
+            return value
+        value = _find_text(entry, date_tag, "DtTm")
+        if value:
+            return value[:19].replace("T", " ")
+    return ""
+
+
+def _camt_row(entry):
+    try:
+        amount = parse_amount(_find_text(entry, "Amt"))
+    except ValueError:
+        return None
+    if _find_text(entry, "CdtDbtInd") == "DBIT":
+        amount = -amount
+    details = _find(entry, "NtryDtls", "TxDtls")
+    name, memo = "", _find_text(entry, "AddtlNtryInf")
+    if details is not None:
+        party = "Cdtr" if amount < 0 else "Dbtr"
+        name = _find_text(details, "RltdPties", party, "Nm") or _find_text(details, "RltdPties", party, "Pty", "Nm")
+        memo = _find_text(details, "RmtInf", "Ustrd") or memo
+    return _row(amount, "", _note(name, memo), _camt_date(entry))
+
+
+def iter_camt053(f):
+    """
+    Операции выписки ISO 20022 CAMT.053 (любой версии схемы).
+    XML читается через iterparse: каждая запись Ntry после разбора удаляется из дерева.
+    """
+    parents = []
+    for event, elem in ET.iterparse(f, events=("start", "end")):
+        if event == "start":
+            parents.append(elem)
+            continue
+        parents.pop()
+        if _local(elem.tag) != "Ntry":
+            continue
+        row = _camt_row(elem)
+        if row is not None:
+            yield row
+        elem.clear()
+        if parents:
+            parents[-1].remove(elem)
+
+
+STATEMENT_READERS = {
+    ".ofx": iter_ofx,
+    ".qfx": iter_ofx,
+    ".qif": iter_qif,
+    ".xml": iter_camt053,
+}
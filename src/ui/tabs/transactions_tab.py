@@ -160,7 +160,7 @@ class TransactionsTab(QWidget):
 
     def import_report(self):
         file_path, _ = QFileDialog.getOpenFileName(
-            self, "Выберите файл отчёта", "", "Excel (*.xlsx *.xls);;CSV (*.csv)"
+            self, "Выберите файл отчёта", "", "Excel (*.xlsx *.xls);;CSV (*.csv);;Выписки банка (*.ofx *.qfx *.qif *.xml)"
         )
         if not file_path:
             return
@@ -100,6 +100,13 @@ def sample_transactions():
     ]
 
 
+@pytest.fixture
+def manager(temp_db_file):
+    """BudgetManager, работающий с временной базой данных"""
+    with patch('core.manager.DBManager', lambda _: DBManager(temp_db_file)):
+        yield BudgetManager()
+
+
 @pytest.fixture
 def populated_db_manager(db_manager, sample_transactions):
     """Фикстура для DBManager с заполненными данными"""
@@ -4,6 +4,9 @@
 import pytest
 import json
 import tempfile
+import time
+import hashlib
+import io
 import os
 from fastapi.testclient import TestClient
 from unittest.mock import patch, MagicMock
@@ -13,6 +16,9 @@ import sys
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
 
 from api.main import app
+from api import dependencies
+from src.core.DBManager import DBManager as ApiDBManager
+from src.core.manager import BudgetManager as ApiBudgetManager
 from core.transaction import Transaction
 from core.summary import EXPENSE_TYPE, INCOME_TYPE
 
@@ -385,6 +391,14 @@ class TestAPIGeneral:
         assert data["status"] == "healthy"
         assert "Budget Tracker API работает" in data["message"]
     
+    def test_executors_stats(self, client):
+        """Загрузка пулов потоков видна через /health/executors"""
+        response = client.get("/health/executors")
+
+        assert response.status_code == 200
+        assert set(response.json()) == {"read", "write", "analytics"}
+        assert response.json()["read"]["queued"] == 0
+
     def test_root_endpoint(self, client):
         """Тест главной страницы API"""
         response = client.get("/")
@@ -415,5 +429,418 @@ class TestAPIGeneral:
         assert "text/html" in response.headers["content-type"]
 
 
+class _RealManagerClient:
+    """Тесты эндпоинтов на настоящем BudgetManager вместо мока"""
+
+    @pytest.fixture
+    def client(self, temp_db_file):
+        """Тестовый клиент с настоящим BudgetManager на временной базе"""
+        with patch('src.core.manager.DBManager', lambda _: ApiDBManager(temp_db_file)):
+            manager = ApiBudgetManager()
+        app.dependency_overrides[dependencies.get_budget_manager] = lambda: manager
+        yield TestClient(app)
+        app.dependency_overrides.clear()
+
+
+class TestAPIImportJobs(_RealManagerClient):
+    """Тесты фоновых задач импорта, загрузки и профилей выписок"""
+
+    def wait_for_job(self, client, job_id):
+        for _ in range(100):
+            job = client.get(f"/api/import/jobs/{job_id}").json()
+            if job["status"] not in ("queued", "running"):
+                return job
+            time.sleep(0.05)
+        raise AssertionError("Задача импорта не завершилась")
+
+    def test_import_job(self, client, sample_csv_content):
+        """POST возвращает ID задачи сразу, статус показывает результат"""
+        files = {"file": ("statement.csv", sample_csv_content.encode("utf-8"), "text/csv")}
+
+        response = client.post("/api/import/jobs", files=files)
+
+        assert response.status_code == 202
+        job = self.wait_for_job(client, response.json()["job_id"])
+        assert job["status"] == "done"
+        assert job["rows_processed"] == 4
+        assert job["report_id"] is not None
+        assert {"upload", "queued", "parse", "write"} <= set(job["stages"])
+        assert len(client.get("/api/transactions").json()) == 4
+
+    def test_import_job_failure(self, client):
+        """Ошибки разбора попадают в статус задачи"""
+        files = {"file": ("broken.csv", b"a,b\n1,2\n", "text/csv")}
+
+        job = self.wait_for_job(client, client.post("/api/import/jobs", files=files).json()["job_id"])
+
+        assert job["status"] == "failed"
+        assert "Не найдены столбцы" in job["error"]
+
+    def test_unknown_job(self, client):
+        """Неизвестная задача — 404"""
+        assert client.get("/api/import/jobs/unknown").status_code == 404
+
+    def test_import_csv_from_buffer(self, client, sample_csv_content, tmp_path, monkeypatch):
+        """Загрузка импортируется без временных файлов в рабочей директории, хеш считается на лету"""
+        monkeypatch.chdir(tmp_path)
+        content = sample_csv_content.encode("utf-8")
+
+        response = client.post("/api/import/csv", files={"file": ("statement.csv", content, "text/csv")})
+
+        assert response.status_code == 200
+        assert response.json()["transactions_count"] == 4
+        assert response.json()["content_sha256"] == hashlib.sha256(content).hexdigest()
+        assert os.listdir(tmp_path) == []
+
+    def test_preview(self, client, sample_csv_content):
+        """Предпросмотр возвращает образец строк и не импортирует файл"""
+        files = {"file": ("statement.csv", sample_csv_content.encode("utf-8"), "text/csv")}
+
+        response = client.post("/api/import/preview?nrows=2", files=files)
+
+        assert response.status_code == 200
+        assert len(response.json()["rows"]) == 2
+        assert response.json()["mapping"]["date"] == "Дата операции"
+        assert client.get("/api/transactions").json() == []
+
+    def test_upload_size_limit(self, client, sample_csv_content):
+        """Слишком большой файл отклоняется с кодом 413"""
+        files = {"file": ("statement.csv", sample_csv_content.encode("utf-8"), "text/csv")}
+
+        with patch('api.routers.import_router.MAX_UPLOAD_SIZE', 16):
+            response = client.post("/api/import/jobs", files=files)
+
+        assert response.status_code == 413
+
+    def test_register_bank_profile(self, client):
+        """Зарегистрированный профиль возвращается в списке, неполный отклоняется"""
+        profile = {"name": "Банк", "header": ["Дата", "Сумма", "Тип"],
+                   "mapping": {"date": "Дата", "amount": "Сумма", "type": "Тип"}}
+
+        response = client.post("/api/import/profiles", json=profile)
+        invalid = client.post("/api/import/profiles", json={**profile, "mapping": {"date": "Дата"}})
+
+        assert response.status_code == 201
+        assert len(response.json()["signature"]) == 40
+        assert [p["name"] for p in client.get("/api/import/profiles").json()] == ["Банк"]
+        assert invalid.status_code == 400
+
+
+class TestAPITransactionQueries(_RealManagerClient):
+    """Тесты получения и изменения транзакций запросами к базе"""
+
+    def test_get_transaction_by_id(self, client, sample_csv_content):
+        """Транзакция возвращается по ID, неизвестная — 404, служебные пути не перехватываются"""
+        files = {"file": ("statement.csv", sample_csv_content.encode("utf-8"), "text/csv")}
+        client.post("/api/import/csv", files=files)
+        transaction = client.get("/api/transactions").json()[0]
+
+        response = client.get(f"/api/transactions/{transaction['id']}")
+
+        assert response.status_code == 200
+        assert response.json() == transaction
+        assert client.get("/api/transactions/100000").status_code == 404
+        assert client.get("/api/transactions/categories").status_code == 200
+
+    def test_list_transactions_query(self, client, sample_csv_content):
+        """Фильтры, сортировка, выбор полей и страницы по курсору"""
+        files = {"file": ("statement.csv", sample_csv_content.encode("utf-8"), "text/csv")}
+        client.post("/api/import/csv", files=files)
+
+        first = client.get("/api/transactions", params={"sort": "amount", "order": "asc", "limit": 2,
+                                                        "fields": "id,amount"})
+        second = client.get("/api/transactions", params={"sort": "amount", "order": "asc", "limit": 2,
+                                                         "fields": "id,amount",
+                                                         "cursor": first.headers["X-Next-Cursor"]})
+        filtered = client.get("/api/transactions", params={"type": EXPENSE_TYPE, "amount_max": 1000})
+
+        assert first.status_code == 200
+        assert all(set(item) == {"id", "amount"} for item in first.json() + second.json())
+        amounts = [item["amount"] for item in first.json() + second.json()]
+        assert amounts == sorted(amounts) and len(amounts) == 4
+        assert "X-Next-Cursor" not in second.headers
+        assert all(item["type"] == EXPENSE_TYPE and item["amount"] <= 1000 for item in filtered.json())
+        assert client.get("/api/transactions", params={"sort": "note"}).status_code == 400
+        assert client.get("/api/transactions", params={"fields": "id,secret"}).status_code == 400
+        assert client.get("/api/transactions", params={"sort": "date", "limit": 2,
+                                                       "cursor": first.headers["X-Next-Cursor"]}).status_code == 400
+
+    def test_patch_transaction(self, client, sample_csv_content):
+        """PATCH меняет только переданные поля"""
+        files = {"file": ("statement.csv", sample_csv_content.encode("utf-8"), "text/csv")}
+        client.post("/api/import/csv", files=files)
+        transaction = client.get("/api/transactions").json()[0]
+
+        response = client.patch(f"/api/transactions/{transaction['id']}", json={"category": "Кафе", "type": "Пополнение"})
+
+        assert response.status_code == 200
+        assert response.json() == {**transaction, "category": "Кафе", "type": "Пополнение"}
+        assert client.patch("/api/transactions/100000", json={"amount": 1}).status_code == 404
+        assert client.patch(f"/api/transactions/{transaction['id']}", json={}).status_code == 400
+
+
+class TestAPIBulkTransactions(_RealManagerClient):
+    """Тесты массового добавления и удаления транзакций"""
+
+    def test_bulk_create_json_and_ndjson(self, client):
+        """Массовое добавление из JSON массива и NDJSON, ошибочные элементы пропускаются"""
+        item = {"amount": 10.0, "category": "Кафе", "note": "Обед", "date": "2025-01-05", "type": "Списание"}
+        ndjson = "\n".join(json.dumps({**item, "amount": i}) for i in range(5)) + "\n{\"amount\": \"x\"}\n"
+
+        response = client.post("/api/transactions/bulk", json=[item, {"amount": 1}, item])
+        streamed = client.post("/api/transactions/bulk", content=ndjson.encode("utf-8"),
+                               headers={"Content-Type": "application/x-ndjson"})
+
+        assert response.status_code == 200
+        assert (response.json()["succeeded"], response.json()["failed"]) == (2, 1)
+        assert [i["status"] for i in response.json()["items"]] == ["created", "error", "created"]
+        assert streamed.json()["succeeded"] == 5
+        assert streamed.json()["items"][5]["status"] == "error"
+        assert len(client.get("/api/transactions").json()) == 7
+
+    def test_bulk_create_undo(self, client):
+        """Массовое добавление отменяется одним действием"""
+        manager = app.dependency_overrides[dependencies.get_budget_manager]()
+        item = {"amount": 10.0, "category": "Кафе", "note": "Обед", "date": "2025-01-05", "type": "Списание"}
+        with patch('api.routers.transactions.BULK_BATCH_SIZE', 2):
+            ids = [i["id"] for i in client.post("/api/transactions/bulk", json=[item] * 5).json()["items"]]
+
+        assert ids == list(range(ids[0], ids[0] + 5))
+        assert manager.undo()
+        assert client.get("/api/transactions").json() == []
+
+    def test_bulk_create_body_timeout(self, client):
+        """Если тело перестало приходить, записанные порции удаляются и ответ — 408"""
+        import asyncio
+        import httpx
+        item = {"amount": 10.0, "category": "Кафе", "note": "Обед", "date": "2025-01-05", "type": "Списание"}
+
+        async def body():
+            yield ("\n".join([json.dumps(item)] * 3) + "\n").encode("utf-8")
+            await asyncio.sleep(10)
+
+        async def post():
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+                return await http.post("/api/transactions/bulk", content=body(),
+                                       headers={"Content-Type": "application/x-ndjson"})
+
+        with patch('api.routers.transactions.BULK_BATCH_SIZE', 2), \
+                patch('api.routers.transactions.BULK_READ_TIMEOUT', 0.2):
+            response = asyncio.run(post())
+
+        assert response.status_code == 408
+        assert client.get("/api/transactions").json() == []
+
+    def test_bulk_delete(self, client, sample_csv_content):
+        """Массовое удаление по ID и по условию, одно действие отмены"""
+        manager = app.dependency_overrides[dependencies.get_budget_manager]()
+        files = {"file": ("statement.csv", sample_csv_content.encode("utf-8"), "text/csv")}
+        client.post("/api/import/csv", files=files)
+        ids = sorted(t["id"] for t in client.get("/api/transactions").json())
+
+        by_ids = client.post("/api/transactions/bulk-delete", json={"ids": [ids[0], 100000]})
+        by_filter = client.post("/api/transactions/bulk-delete", json={"category": ["Транспорт", "Зарплата"],
+                                                                      "date_from": "2025-01-02"})
+
+        assert [i["status"] for i in by_ids.json()["items"]] == ["deleted", "not_found"]
+        assert by_filter.json()["succeeded"] == 2
+        assert len(client.get("/api/transactions").json()) == 1
+        assert client.post("/api/transactions/bulk-delete", json={}).status_code == 400
+        assert manager.undo()
+        assert len(client.get("/api/transactions").json()) == 3
+
+
+class TestAPIExport(_RealManagerClient):
+    """Тесты потоковой выгрузки транзакций"""
+
+    def test_export_ndjson_and_csv(self, client, sample_csv_content):
+        """Выгрузка NDJSON и CSV с фильтрами списка транзакций"""
+        files = {"file": ("statement.csv", sample_csv_content.encode("utf-8"), "text/csv")}
+        client.post("/api/import/csv", files=files)
+
+        ndjson = client.get("/api/export/transactions.ndjson", params={"type": EXPENSE_TYPE})
+        exported = client.get("/api/export/transactions.csv", params={"category": ["Продукты", "Зарплата"]})
+
+        assert ndjson.status_code == 200
+        assert ndjson.headers["content-type"] == "application/x-ndjson"
+        items = [json.loads(line) for line in ndjson.text.splitlines()]
+        assert len(items) == 3 and all(item["type"] == EXPENSE_TYPE for item in items)
+        lines = exported.content.decode("utf-8-sig").splitlines()
+        assert lines[0] == "id,report_id,amount,category,note,date,type"
+        assert len(lines) == 3
+        assert "attachment" in exported.headers["content-disposition"]
+
+    def test_export_streams_batches(self):
+        """Каждая порция из базы отправляется отдельным фрагментом"""
+        from api.routers.export import _csv_chunks, _ndjson_chunks
+        batches = [[(1, 1, 10.0, "Кафе", "", "2025-01-01", EXPENSE_TYPE)]] * 3
+
+        assert len(list(_ndjson_chunks(iter(batches)))) == 3
+        assert len(list(_csv_chunks(iter(batches)))) == 3
+        assert list(_csv_chunks(iter([]))) == ["\ufeffid,report_id,amount,category,note,date,type\r\n".encode("utf-8")]
+
+
+class TestAPIResponses(_RealManagerClient):
+    """Тесты условных GET-запросов, сжатия и форматов ответов"""
+
+    def test_conditional_get(self, client, sample_csv_content):
+        """ETag по версии данных: 304 без выполнения запроса, новая версия после записи"""
+        manager = app.dependency_overrides[dependencies.get_budget_manager]()
+        files = {"file": ("statement.csv", sample_csv_content.encode("utf-8"), "text/csv")}
+        client.post("/api/import/csv", files=files)
+
+        first = client.get("/api/analytics/summary")
+        etag = first.headers["ETag"]
+        with patch.object(manager, "get_financial_summary", side_effect=AssertionError("запрос выполнен")):
+            cached = client.get("/api/analytics/summary", headers={"If-None-Match": etag})
+        listing = client.get("/api/transactions", params={"limit": 2})
+        other_query = client.get("/api/transactions", params={"limit": 3})
+        listing_cached = client.get("/api/transactions", params={"limit": 2},
+                                    headers={"If-None-Match": listing.headers["ETag"]})
+        client.delete(f"/api/transactions/{listing.json()[0]['id']}")
+        changed = client.get("/api/analytics/summary", headers={"If-None-Match": etag})
+
+        assert etag.startswith('W/"')
+        assert first.headers["Cache-Control"] == "private, no-cache"
+        assert cached.status_code == 304 and cached.content == b""
+        assert cached.headers["ETag"] == etag
+        assert listing.headers["ETag"] != other_query.headers["ETag"]
+        assert listing_cached.status_code == 304
+        assert changed.status_code == 200
+        assert changed.headers["ETag"] != etag
+
+    def test_compressed_responses(self, client):
+        """Большие ответы сжимаются выбранным клиентом способом, маленькие отдаются как есть"""
+        pytest.importorskip("zstandard")
+        item = {"amount": 10.0, "category": "Кафе", "note": "Обед в кафе", "date": "2025-01-05", "type": "Списание"}
+        client.post("/api/transactions/bulk", json=[item] * 200)
+
+        gzipped = client.get("/api/transactions", headers={"Accept-Encoding": "gzip"})
+        zstd = client.get("/api/transactions", headers={"Accept-Encoding": "gzip;q=0.5, zstd"})
+        small = client.get("/api/transactions", params={"limit": 1}, headers={"Accept-Encoding": "gzip"})
+        plain = client.get("/api/transactions", headers={"Accept-Encoding": "identity"})
+        exported = client.get("/api/export/transactions.ndjson", headers={"Accept-Encoding": "gzip"})
+
+        assert gzipped.headers["content-encoding"] == "gzip"
+        assert "Accept-Encoding" in gzipped.headers["vary"]
+        assert len(gzipped.json()) == 200
+        assert zstd.headers["content-encoding"] == "zstd"
+        assert "content-encoding" not in small.headers
+        assert "content-encoding" not in plain.headers
+        assert plain.json() == gzipped.json()
+        assert exported.headers["content-encoding"] == "gzip"
+        assert len(exported.text.splitlines()) == 200
+
+    def test_compression_choice(self):
+        """Разбор Accept-Encoding с весами"""
+        pytest.importorskip("zstandard")
+        from api.compression import choose_encoding
+
+        assert choose_encoding("gzip, deflate, br, zstd") == "zstd"
+        assert choose_encoding("zstd;q=0, gzip") == "gzip"
+        assert choose_encoding("*") == "zstd"
+        assert choose_encoding("identity") is None
+        assert choose_encoding("") is None
+
+    def test_binary_formats(self, client, sample_csv_content):
+        """Arrow IPC и MessagePack по заголовку Accept для списка, графика и выгрузки"""
+        pa = pytest.importorskip("pyarrow")
+        msgpack = pytest.importorskip("msgpack")
+        files = {"file": ("statement.csv", sample_csv_content.encode("utf-8"), "text/csv")}
+        client.post("/api/import/csv", files=files)
+        arrow = {"Accept": "application/vnd.apache.arrow.stream"}
+
+        table = pa.ipc.open_stream(client.get("/api/transactions", params={"fields": "id,amount"},
+                                              headers=arrow).content).read_all()
+        packed = client.get("/api/transactions", params={"sort": "amount", "order": "asc"},
+                            headers={"Accept": "application/msgpack"})
+        graph = pa.ipc.open_stream(client.get("/api/analytics/graph", headers=arrow).content).read_all()
+        exported = pa.ipc.open_stream(client.get("/api/export/transactions", headers=arrow).content).read_all()
+        unpacked = list(msgpack.Unpacker(io.BytesIO(client.get("/api/export/transactions",
+                                                               headers={"Accept": "application/msgpack"}).content)))
+
+        assert table.column_names == ["id", "amount"]
+        assert table.schema.field("amount").type == pa.float64()
+        assert packed.headers["content-type"] == "application/msgpack"
+        assert msgpack.unpackb(packed.content)["amount"] == [200.0, 500.0, 1000.0, 2000.0]
+        assert graph.column_names == ["date", "balance"] and graph.num_rows == 4
+        assert exported.num_rows == 4
+        assert sum(len(batch["id"]) for batch in unpacked) == 4
+        assert client.get("/api/transactions", headers={"Accept": "application/json"}).json()[0]["id"]
+
+    def test_binary_format_without_package(self, client):
+        """Без пакета формата ответ 406, если клиент не принимает другие форматы"""
+        with patch.dict(sys.modules, {"msgpack": None}):
+            response = client.get("/api/transactions", headers={"Accept": "application/msgpack"})
+            fallback = client.get("/api/transactions", headers={"Accept": "application/msgpack;q=0.5, */*;q=0.1"})
+
+        assert response.status_code == 406
+        assert fallback.status_code == 200 and fallback.json() == []
+        assert client.get("/api/transactions", headers={"Accept": "text/html, */*;q=0.8"}).status_code == 200
+
+
+class TestAPIChangeFeed(_RealManagerClient):
+    """Тесты живой ленты изменений и синхронизации"""
+
+    def test_events_websocket(self, client):
+        """WebSocket получает ready, затем событие добавления транзакции"""
+        item = {"amount": 10.0, "category": "Кафе", "note": "Обед", "date": "2025-01-05", "type": "Списание"}
+
+        with client.websocket_connect("/api/events/ws") as websocket:
+            ready = websocket.receive_json()
+            client.post("/api/transactions", json=item)
+            event = websocket.receive_json()
+        created = client.get("/api/transactions").json()[0]
+
+        assert ready["type"] == "ready"
+        assert (event["type"], event["action"]) == ("transactions", "inserted")
+        assert event["ids"] == [[created["id"], created["id"]]]
+        assert (event["categories"], event["days"]) == (["Кафе"], ["2025-01-05"])
+        assert event["version"] > ready["version"]
+
+    def test_sync(self, client, sample_csv_content):
+        """Синхронизация страницами с since=next, после сжатия журнала — resync"""
+        files = {"file": ("statement.csv", sample_csv_content.encode("utf-8"), "text/csv")}
+        client.post("/api/import/csv", files=files)
+        manager = app.dependency_overrides[dependencies.get_budget_manager]()
+
+        first = client.get("/api/sync", params={"limit": 3}).json()
+        second = client.get("/api/sync", params={"since": first["next"], "limit": 3}).json()
+        deleted = second["upserts"][0]["id"]
+        client.delete(f"/api/transactions/{deleted}")
+        third = client.get("/api/sync", params={"since": second["next"]}).json()
+        manager.dbmanager.compact_change_log(keep_deletes=0)
+        stale = client.get("/api/sync", params={"since": second["next"]}).json()
+
+        assert (len(first["upserts"]), first["has_more"], first["resync"]) == (3, True, False)
+        assert (len(second["upserts"]), second["has_more"]) == (1, False)
+        assert set(first["upserts"][0]) == {"id", "report_id", "amount", "category", "note", "date", "type"}
+        assert (third["upserts"], third["deletes"]) == ([], [deleted])
+        assert (stale["resync"], stale["next"]) == (True, third["next"])
+        assert client.get("/api/sync", params={"since": third["next"]}).json()["deletes"] == []
+
+
+class TestAPIMetrics(_RealManagerClient):
+    """Тесты эндпоинта метрик Prometheus"""
+
+    def test_metrics(self, client):
+        """GET /metrics: запросы по шаблону маршрута, проверки ETag, запросы к базе и пулы потоков"""
+        etag = client.get("/api/analytics/summary").headers["ETag"]
+        client.get("/api/analytics/summary", headers={"If-None-Match": etag})
+        client.get("/api/transactions/100000")
+
+        response = client.get("/metrics")
+        text = response.text
+
+        assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+        assert 'budget_http_requests_total{method="GET",route="/api/transactions/{transaction_id}",status="404"}' in text
+        assert 'budget_http_request_duration_seconds_bucket{method="GET",route="/api/analytics/summary",le="+Inf"}' in text
+        assert 'budget_http_cache_requests_total{result="hit"}' in text
+        assert 'budget_db_query_duration_seconds_count{statement="SELECT"}' in text
+        assert 'budget_executor_tasks{pool="read",state="queued"} 0' in text
+        assert "# TYPE budget_import_rows_total counter" in text
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
@@ -0,0 +1,162 @@
+"""
+Тесты для Budget Tracker - события изменения данных
+"""
+import asyncio
+import pytest
+import os
+
+# Добавляем путь к src для импорта модулей
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from core.events import EventBroadcaster, change_events
+from core.plan import Plan
+from core.summary import EXPENSE_TYPE
+from core.transaction import Transaction
+
+
+@pytest.fixture
+def events(manager):
+    """События, опубликованные менеджером"""
+    received = []
+    manager.events.subscribe(received.append)
+    return received
+
+
+def expense(amount=10.0, category="Кафе", date="2025-03-01"):
+    return Transaction(amount=amount, category=category, note="Обед", date=date, type_=EXPENSE_TYPE)
+
+
+class TestEventBroadcaster:
+    """Тесты рассылки событий"""
+
+    def test_publish_and_unsubscribe(self):
+        """Подписчики получают события с возрастающим seq, ошибка подписчика не мешает остальным"""
+        broadcaster = EventBroadcaster()
+        received = []
+
+        def broken(event):
+            raise RuntimeError("сбой")
+
+        broadcaster.subscribe(broken)
+        token = broadcaster.subscribe(received.append)
+        broadcaster.publish({"type": "a"})
+        broadcaster.unsubscribe(token)
+        broadcaster.publish({"type": "b"})
+
+        assert received == [{"type": "a", "seq": 1}]
+        assert broadcaster.has_subscribers()
+
+    def test_change_events_undo_batch(self):
+        """Отмена пакета даёт обратные события в обратном порядке"""
+        action = {"type": "batch", "label": "x", "actions": [
+            {"type": "add_transaction", "transaction_id": 1},
+            {"type": "update_transaction", "transaction_id": 2, "old": {"category": "Кафе"},
+             "new": {"category": "Еда"}},
+        ]}
+
+        events = change_events(action, lambda ids=None, report_id=None: ([], []), undo=True)
+
+        assert [e["action"] for e in events] == ["updated", "deleted"]
+        assert events[0]["categories"] == ["Еда", "Кафе"]
+        assert events[1]["ids"] == [[1, 1]]
+
+
+class TestManagerEvents:
+    """Тесты публикации событий BudgetManager"""
+
+    def test_insert_update_delete(self, manager, events):
+        """Каждое изменение публикуется с ID, категориями, днями и версией данных"""
+        transaction_id = manager.add_transaction(expense())
+        manager.update_transaction(transaction_id, {"category": "Еда", "date": "2025-03-02"})
+        manager.delete_transaction(transaction_id)
+
+        assert [e["action"] for e in events] == ["inserted", "updated", "deleted"]
+        assert events[0]["ids"] == [[transaction_id, transaction_id]]
+        assert events[0]["categories"] == ["Кафе"] and events[0]["days"] == ["2025-03-01"]
+        assert events[1]["categories"] == ["Еда", "Кафе"]
+        assert events[1]["days"] == ["2025-03-01", "2025-03-02"]
+        assert events[2]["categories"] == ["Еда"]
+        assert [e["seq"] for e in events] == [1, 2, 3]
+        assert events[2]["version"] == manager.data_version() > events[0]["version"]
+
+    def test_undo_redo_inverted(self, manager, events):
+        """Отмена добавления публикуется как удаление, повтор — как добавление"""
+        transaction_id = manager.add_transaction(expense())
+        manager.undo()
+        manager.redo()
+
+        assert [e["action"] for e in events] == ["inserted", "deleted", "inserted"]
+        assert all(e["ids"] == [[transaction_id, transaction_id]] for e in events)
+        assert events[1]["categories"] == ["Кафе"]
+
+    def test_batch_published_after_commit(self, manager, events):
+        """События пакета публикуются один раз после фиксации, откат не публикует ничего"""
+        with manager.batch("Правка"):
+            first = manager.add_transaction(expense())
+            manager.add_transaction(expense(category="Такси"))
+            assert events == []
+        with pytest.raises(RuntimeError):
+            with manager.batch("Сбой"):
+                manager.delete_transaction(first)
+                raise RuntimeError("сбой")
+
+        assert len(events) == 1
+        assert events[0]["ids"] == [[first, first + 1]]
+        assert events[0]["categories"] == ["Кафе", "Такси"]
+
+    def test_bulk_delete_by_report(self, manager, events):
+        """Удаление отчёта публикуется с report_id"""
+        report_id = manager.get_next_report_id("march.csv")
+        manager.add_transactions_bulk([[(report_id, 5.0, "Кафе", "Обед", "2025-03-04", EXPENSE_TYPE)]])
+        manager.delete_report(report_id)
+
+        assert events[-1]["report_id"] == report_id
+        assert (events[-1]["action"], events[-1]["days"]) == ("deleted", ["2025-03-04"])
+
+    def test_plan_event(self, manager, events, tmp_path):
+        plan = Plan([{"category": "Кафе", "plan_expense": 5000.0}])
+        manager.PLAN_FILE = str(tmp_path / "plan.json")
+
+        manager.save_plan(plan)
+
+        assert events[-1]["type"] == "plan" and events[-1]["plan"] == {"Кафе": 5000.0}
+
+    def test_no_subscribers(self, manager, monkeypatch):
+        """Без подписчиков события не готовятся"""
+        monkeypatch.setattr(manager.dbmanager, "get_change_scope", None)
+
+        with manager.batch("Правка"):
+            manager.add_transaction(expense())
+
+        assert len(manager.get_transactions()) == 1
+
+
+class TestEventStream:
+    """Тесты потока SSE"""
+
+    def test_sse_events(self, manager):
+        """Первым идёт ready с версией, затем событие изменения; отставший клиент получает resync"""
+        from api.routers import events as events_router
+
+        async def scenario():
+            stream = events_router.sse_events(manager)
+            ready = await anext(stream)
+            manager.add_transaction(expense())
+            change = await anext(stream)
+            for _ in range(3):
+                manager.add_transaction(expense())
+            resync = await anext(stream)
+            with pytest.raises(StopAsyncIteration):
+                await anext(stream)
+            return ready, change, resync
+
+        with pytest.MonkeyPatch.context() as mp:
+            mp.setattr(events_router, "EVENT_QUEUE_SIZE", 2)
+            ready, change, resync = asyncio.run(scenario())
+
+        assert ready.startswith("retry: ") and "event: ready" in ready
+        assert change.startswith("id: 1\nevent: transactions\ndata: {")
+        assert '"action":"inserted"' in change
+        assert resync.startswith("id: 4\nevent: resync")
+        assert not manager.events.has_subscribers()
@@ -0,0 +1,123 @@
+"""
+Тесты для Budget Tracker - пулы потоков API для блокирующих вызовов
+"""
+import asyncio
+import threading
+import pytest
+import os
+
+# Добавляем путь к src для импорта модулей
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from api import executors
+from api.executors import BoundedExecutor
+
+
+@pytest.fixture
+def pools():
+    """Свежие пулы с одним потоком аналитики"""
+    executors.shutdown_pools()
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setitem(executors.POOL_SIZES, executors.ANALYTICS, 1)
+        yield executors.get_pools()
+    executors.shutdown_pools()
+
+
+class TestBoundedExecutor:
+    """Тесты пула с ограничением и счётчиками очереди"""
+
+    def test_queue_depth(self):
+        """Задачи сверх лимита ждут в очереди, счётчики это показывают"""
+        pool = BoundedExecutor("test", 1)
+        release = threading.Event()
+
+        async def scenario():
+            tasks = [asyncio.ensure_future(pool.run(release.wait)) for _ in range(3)]
+            while pool.stats()["running"] == 0:
+                await asyncio.sleep(0.01)
+            busy = pool.stats()
+            release.set()
+            await asyncio.gather(*tasks)
+            return busy
+
+        busy = asyncio.run(scenario())
+        pool.shutdown()
+
+        assert (busy["running"], busy["queued"]) == (1, 2)
+        stats = pool.stats()
+        assert (stats["running"], stats["queued"], stats["completed"], stats["max_queued"]) == (0, 0, 3, 2)
+
+    def test_cancelled_while_queued(self):
+        """Отменённый запрос из очереди не остаётся в счётчике"""
+        pool = BoundedExecutor("test", 1)
+        release = threading.Event()
+
+        async def scenario():
+            running = asyncio.ensure_future(pool.run(release.wait))
+            waiting = asyncio.ensure_future(pool.run(lambda: None))
+            await asyncio.sleep(0.05)
+            waiting.cancel()
+            await asyncio.gather(waiting, return_exceptions=True)
+            queued = pool.stats()["queued"]
+            release.set()
+            await running
+            return queued
+
+        assert asyncio.run(scenario()) == 0
+        pool.shutdown()
+
+    def test_errors_propagate(self):
+        pool = BoundedExecutor("test", 1)
+
+        with pytest.raises(ValueError):
+            asyncio.run(pool.run(int, "abc"))
+        assert pool.stats()["completed"] == 1
+        pool.shutdown()
+
+
+class TestPools:
+    """Тесты разделения пулов чтения, записи и аналитики"""
+
+    def test_read_not_blocked_by_analytics(self, pools):
+        """Занятый пул аналитики не задерживает чтения"""
+        release = threading.Event()
+
+        async def scenario():
+            heavy = asyncio.ensure_future(executors.run_analytics(release.wait))
+            queued = asyncio.ensure_future(executors.run_analytics(lambda: "analytics"))
+            read = await asyncio.wait_for(executors.run_read(lambda: "read"), timeout=1)
+            stats = executors.pool_stats()
+            release.set()
+            await asyncio.gather(heavy, queued)
+            return read, stats
+
+        read, stats = asyncio.run(scenario())
+
+        assert read == "read"
+        assert stats[executors.ANALYTICS]["running"] == 1
+        assert stats[executors.ANALYTICS]["queued"] == 1
+        assert stats[executors.READ]["completed"] == 1
+
+    def test_iterate_read_closes_iterator(self, pools):
+        """Прерванный обход закрывает исходный генератор"""
+        closed = []
+
+        def numbers():
+            try:
+                yield from range(10)
+            finally:
+                closed.append(True)
+
+        async def scenario():
+            items = []
+            stream = executors.iterate_read(numbers())
+            async for item in stream:
+                items.append(item)
+                if item == 2:
+                    break
+            await stream.aclose()
+            return items
+
+        assert asyncio.run(scenario()) == [0, 1, 2]
+        assert closed == [True]
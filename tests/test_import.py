@@ -0,0 +1,461 @@
+"""
+Тесты для Budget Tracker - импорт выписок
+"""
+import pytest
+import io
+import os
+import threading
+import zipfile
+from unittest.mock import patch
+
+import openpyxl
+
+# Добавляем путь к src для импорта модулей
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from core.DBManager import DBManager
+from core.manager import BudgetManager
+from core.parser import Parser, ImportCancelled, EXPECTED_COLUMNS
+from core.profiles import header_signature
+from core import statements
+
+
+@pytest.fixture
+def csv_file(tmp_path, sample_csv_content):
+    """CSV выписка из четырёх операций"""
+    path = tmp_path / "statement.csv"
+    path.write_text(sample_csv_content, encoding="utf-8")
+    return str(path)
+
+
+@pytest.fixture
+def xlsx_file(tmp_path, sample_csv_content):
+    """Книга из двух листов с операциями и одного служебного листа"""
+    lines = [line.split(",") for line in sample_csv_content.splitlines()]
+    wb = openpyxl.Workbook()
+    wb.active.title = "Январь"
+    wb.create_sheet("Февраль")
+    for ws in (wb["Январь"], wb["Февраль"]):
+        ws.append(lines[0])
+        for line in lines[1:]:
+            ws.append(line[:3] + [float(line[3])] + line[4:])
+    wb.create_sheet("Итого").append(["Всего", 3700.0])
+    path = tmp_path / "statement.xlsx"
+    wb.save(path)
+    return str(path)
+
+
+class TestChunkedImport:
+    """Тесты потокового импорта CSV"""
+
+    def test_chunks_written_to_one_report(self, manager, csv_file):
+        """Все порции попадают в один отчёт"""
+        report_id = manager.import_from_file(csv_file, chunksize=1)
+
+        transactions = manager.get_transactions()
+        assert len(transactions) == 4
+        assert {t.report_id for t in transactions} == {report_id}
+
+    def test_progress_callback(self, manager, csv_file):
+        """Прогресс сообщается после каждой порции"""
+        progress = []
+        manager.import_from_file(csv_file, chunksize=3, progress_callback=lambda rows, read: progress.append((rows, read)))
+
+        assert [rows for rows, _ in progress] == [3, 4]
+        assert progress[-1][1] == os.path.getsize(csv_file)
+
+    def test_cancel_removes_written_rows(self, manager, csv_file):
+        """Отмена удаляет уже записанные порции"""
+        cancel = threading.Event()
+
+        with pytest.raises(ImportCancelled):
+            manager.import_from_file(csv_file, chunksize=1, cancel_event=cancel,
+                                     progress_callback=lambda rows, read: cancel.set())
+
+        assert manager.get_transactions() == []
+
+    def test_malformed_line_rolls_back(self, manager, tmp_path, sample_csv_content):
+        """Ошибка разбора посреди файла удаляет уже записанные порции и отчёт"""
+        lines = sample_csv_content.strip().splitlines()
+        content = "\n".join(lines + lines[1:] + ["2025-01-09,1,\"Незакрытая кавычка,1.0,Кафе,Списание,x,0"] + lines[1:])
+        path = tmp_path / "broken.csv"
+        path.write_text(content + "\n", encoding="utf-8")
+
+        with pytest.raises(Exception):
+            manager.import_from_file(str(path), chunksize=2)
+
+        assert manager.get_transactions() == []
+        assert manager.dbmanager.get_reports() == []
+        assert manager.undo_stack == []
+
+    def test_undo_whole_import(self, manager, csv_file):
+        """Импорт отменяется и повторяется одним действием"""
+        manager.import_from_file(csv_file, chunksize=2)
+
+        assert manager.undo()
+        assert manager.get_transactions() == []
+        assert manager.redo()
+        assert len(manager.get_transactions()) == 4
+
+    @pytest.mark.parametrize("chunksize", [None, 1, 10])
+    def test_decimal_comma_with_invalid_amount(self, manager, tmp_path, chunksize):
+        """Нечисловая сумма не мешает разобрать остальные суммы с десятичной запятой и пробелом в тысячах"""
+        header = ";".join(EXPECTED_COLUMNS)
+        rows = ["2025-01-01;1;Кафе;abc;Кафе;Списание;x;0",
+                "2025-01-02;1;Кафе;100,50;Кафе;Списание;x;0",
+                "2025-01-03;1;Зарплата;1 234,50;Зарплата;Пополнение;x;0"]
+        path = tmp_path / "comma.csv"
+        path.write_bytes("\n".join([header] + rows + [""]).encode("cp1251"))
+
+        manager.import_from_file(str(path), chunksize=chunksize)
+
+        assert sorted(t.amount for t in manager.get_transactions()) == [100.5, 1234.5]
+
+    def test_normalize_skips_invalid_amounts(self, csv_file):
+        """Строки с нечисловой суммой пропускаются"""
+        df = Parser.parse_file(csv_file)
+        # pandas 3 не записывает строку в столбец float
+        df["Сумма"] = df["Сумма"].astype(object)
+        df.loc[0, "Сумма"] = "не число"
+
+        rows = Parser.normalize_chunk(df)
+
+        assert len(rows) == 3
+        assert rows[0] == (500.0, "Транспорт", "Заправка автомобиля (Заправка)", "2025-01-02", "Списание")
+
+
+class TestDialectDetection:
+    """Тесты определения диалекта CSV"""
+
+    def test_utf8_comma(self, csv_file):
+        """Обычный CSV в UTF-8"""
+        dialect = Parser.detect_dialect(csv_file)
+
+        assert dialect["encoding"] == "utf-8"
+        assert dialect["sep"] == ","
+        assert dialect["decimal"] == "."
+
+    def test_cp1251_semicolon_decimal_comma(self, tmp_path, sample_csv_content):
+        """Выгрузка в cp1251 с ';' и десятичной запятой, как у российских банков"""
+        content = sample_csv_content.replace(",", ";").replace("1000.0", "1 000,50").replace(".0", ",00")
+        path = tmp_path / "bank.csv"
+        path.write_bytes(content.encode("cp1251"))
+
+        dialect = Parser.detect_dialect(str(path))
+        df = Parser.parse_file(str(path))
+
+        assert dialect == {"encoding": "cp1251", "sep": ";", "quotechar": '"', "decimal": ",", "thousands": " "}
+        assert df["Сумма"].tolist() == [1000.5, 500.0, 2000.0, 200.0]
+        assert df["Номер счета"].tolist()[0] == "1234567890"
+
+
+class TestExcelImport:
+    """Тесты потокового импорта XLSX"""
+
+    def test_data_sheets(self, xlsx_file):
+        """Служебные листы без нужных столбцов пропускаются"""
+        assert Parser.excel_data_sheets(xlsx_file) == ["Январь", "Февраль"]
+
+    def test_import_from_open_file(self, manager, xlsx_file):
+        """Книга читается из открытого файла, имя задаёт только формат и название отчёта"""
+        with open(xlsx_file, "rb") as f:
+            source = io.BytesIO(f.read())
+
+        manager.import_from_file("upload.xlsx", chunksize=2, source=source)
+
+        assert len(manager.get_transactions()) == 8
+
+    @pytest.mark.parametrize("workers", [None, 2])
+    def test_import_all_sheets(self, manager, xlsx_file, workers):
+        """Все листы с операциями импортируются в один отчёт"""
+        report_id = manager.import_from_file(xlsx_file, chunksize=3, workers=workers)
+
+        transactions = manager.get_transactions()
+        assert len(transactions) == 8
+        assert {t.report_id for t in transactions} == {report_id}
+        assert sum(t.amount for t in transactions) == 7400.0
+
+    def test_parse_file_reads_same_sheets(self, manager, xlsx_file):
+        """Импорт без порций читает те же листы с операциями, что и потоковый"""
+        df = Parser.parse_file(xlsx_file)
+        assert list(df.columns) == EXPECTED_COLUMNS
+        assert len(df) == 8
+
+        manager.import_from_file(xlsx_file)
+        assert sum(t.amount for t in manager.get_transactions()) == 7400.0
+
+
+class TestImportMany:
+    """Тесты пакетного импорта нескольких файлов"""
+
+    def test_files_and_archive(self, manager, csv_file, xlsx_file, tmp_path):
+        """Каждый файл, в том числе из архива, становится отдельным отчётом"""
+        archive = tmp_path / "statements.zip"
+        with zipfile.ZipFile(archive, "w") as zf:
+            zf.write(csv_file, "march/statement.csv")
+            zf.writestr("readme.txt", "не выписка")
+
+        results = manager.import_many([csv_file, xlsx_file, str(archive)], workers=2)
+
+        assert [r["file"] for r in results] == ["statement.csv", "statement.xlsx", "statements.zip:statement.csv"]
+        assert [r["rows"] for r in results] == [4, 8, 4]
+        assert all(r["error"] is None for r in results)
+        assert len({r["report_id"] for r in results}) == 3
+        assert len(manager.get_transactions()) == 16
+
+    def test_error_does_not_stop_other_files(self, manager, csv_file, tmp_path):
+        """Ошибка в одном файле попадает в его результат, остальные импортируются"""
+        broken = tmp_path / "broken.csv"
+        broken.write_text("a,b\n1,2\n", encoding="utf-8")
+
+        results = manager.import_many([str(broken), csv_file])
+
+        assert "Не найдены столбцы" in results[0]["error"]
+        assert results[0]["report_id"] is None
+        assert results[1]["rows"] == 4
+
+    def test_corrupt_archive_is_file_error(self, manager, csv_file, tmp_path):
+        """Повреждённый архив — ошибка этого файла, а не всего пакета"""
+        archive = tmp_path / "broken.zip"
+        archive.write_bytes(b"PK\x03\x04 not a zip")
+
+        results = manager.import_many([str(archive), csv_file])
+
+        assert results[0]["file"] == "broken.zip"
+        assert results[0]["error"]
+        assert results[1]["rows"] == 4
+
+    def test_undo_per_file(self, manager, csv_file, xlsx_file):
+        """Каждый файл — отдельное действие отмены"""
+        manager.import_many([csv_file, xlsx_file], workers=2, chunksize=2)
+        assert len(manager.undo_stack) == 2
+
+        manager.undo()
+        assert len(manager.get_transactions()) in (4, 8)
+
+    def test_failed_file_leaves_no_rows(self, manager, csv_file, tmp_path, sample_csv_content):
+        """Ошибка посреди файла удаляет уже записанные порции этого файла"""
+        lines = sample_csv_content.strip().splitlines()
+        broken = tmp_path / "broken.csv"
+        broken.write_text("\n".join(lines + ["2025-01-09,1,\"Незакрытая кавычка,1.0,Кафе,Списание,x,0"] + lines[1:]) + "\n",
+                          encoding="utf-8")
+
+        results = manager.import_many([str(broken), csv_file], chunksize=2)
+
+        assert results[0]["error"] and results[0]["report_id"] is None
+        assert len(manager.dbmanager.get_reports()) == 1
+        assert len(manager.get_transactions()) == 4
+
+
+class TestPreview:
+    """Тесты предпросмотра импорта"""
+
+    def test_preview_csv(self, manager, csv_file):
+        """Предпросмотр читает только nrows строк и ничего не записывает"""
+        preview = manager.preview_file(csv_file, nrows=2)
+
+        assert preview["format"] == "csv"
+        assert preview["dialect"]["sep"] == ","
+        assert preview["mapping"]["amount"] == "Сумма"
+        assert len(preview["rows"]) == 2
+        assert preview["rows"][0]["Категория"] == "Продукты"
+        assert preview["errors"] == []
+        assert manager.get_transactions() == []
+
+    def test_preview_reports_errors(self, tmp_path):
+        """Отсутствующие столбцы и нечисловые суммы попадают в ошибки"""
+        path = tmp_path / "other.csv"
+        path.write_text("Дата операции;Сумма\n2025-01-01;abc\n2025-01-02;10,5\n", encoding="utf-8")
+
+        preview = Parser.preview(str(path))
+
+        assert preview["mapping"]["category"] is None
+        assert "Не найден столбец: Категория" in preview["errors"]
+        assert any("Строка 1" in e for e in preview["errors"])
+
+    def test_preview_xlsx(self, xlsx_file):
+        """Для xlsx берётся первый лист с операциями"""
+        preview = Parser.preview(xlsx_file, nrows=3)
+
+        assert preview["format"] == "xlsx"
+        assert preview["dialect"] is None
+        assert len(preview["rows"]) == 3
+        assert preview["rows"][0]["Сумма"] == 1000.0
+
+
+class TestBankProfiles:
+    """Тесты профилей выписок банков"""
+
+    def test_import_does_not_register_profiles(self, manager, tmp_path):
+        """
+        Профили заводятся только через register_profile: импорт их не создаёт,
+        и тот же заголовок в другой кодировке и с другим разделителем тоже импортируется
+        """
+        header = list(reversed(EXPECTED_COLUMNS))
+        row = ["0", "Перевод", "Пополнение", "Зарплата", "1000.0", "Перевод", "1", "2025-01-01"]
+        first = tmp_path / "first.csv"
+        first.write_text(",".join(header) + "\n" + ",".join(row) + "\n", encoding="utf-8")
+        second = tmp_path / "second.csv"
+        second.write_bytes((";".join(header) + "\n" + ";".join(row) + "\n").encode("cp1251"))
+
+        manager.import_from_file(str(first), chunksize=2)
+        manager.import_from_file(str(second), chunksize=2)
+
+        assert manager.get_profiles() == []
+        assert [t.amount for t in manager.get_transactions()] == [1000.0, 1000.0]
+
+    def test_pinned_dialect_falls_back_to_detection(self, manager, tmp_path):
+        """Если закреплённый диалект не подходит к файлу, диалект определяется по образцу"""
+        header = ["Дата", "Сумма", "Тип"]
+        manager.register_profile("Банк", {"date": "Дата", "amount": "Сумма", "type": "Тип"}, header=header,
+                                 dialect={"encoding": "utf-8", "sep": ",", "quotechar": '"',
+                                          "decimal": ".", "thousands": None})
+        path = tmp_path / "cp1251.csv"
+        path.write_bytes("Дата;Сумма;Тип\n2025-01-05;150,5;Списание\n".encode("cp1251"))
+
+        manager.import_from_file(str(path), chunksize=10)
+
+        assert [t.amount for t in manager.get_transactions()] == [150.5]
+
+    def test_custom_profile_signed_amount(self, manager, tmp_path):
+        """Профиль с другими столбцами, форматом даты и знаком суммы"""
+        path = tmp_path / "other_bank.csv"
+        path.write_bytes("Дата;Сумма;Назначение\n05.01.2025;-150,5;Кафе\n06.01.2025;3000;Зарплата\n".encode("cp1251"))
+        manager.register_profile("Другой банк",
+                                 {"date": "Дата", "amount": "Сумма", "description": "Назначение"},
+                                 header=["Дата", "Сумма", "Назначение"],
+                                 dialect={"encoding": "cp1251", "sep": ";", "quotechar": '"',
+                                          "decimal": ",", "thousands": None},
+                                 date_format="%d.%m.%Y", sign_rule="signed_amount")
+
+        manager.import_from_file(str(path), chunksize=10)
+
+        rows = sorted((t.date, t.amount, t.type_, t.note) for t in manager.get_transactions())
+        assert rows == [("2025-01-05 00:00:00", 150.5, "Списание", "Кафе"),
+                        ("2025-01-06 00:00:00", 3000.0, "Пополнение", "Зарплата")]
+        assert manager.preview_file(str(path))["profile"] == "Другой банк"
+
+    def test_profiles_persist_in_database(self, temp_db_file):
+        """Профили хранятся в базе и доступны новому экземпляру"""
+        with patch('core.manager.DBManager', lambda _: DBManager(temp_db_file)):
+            BudgetManager().register_profile("Банк", {"date": "Дата", "amount": "Сумма", "type": "Тип"},
+                                             header=["Дата", "Сумма", "Тип"])
+            profile = BudgetManager().profiles.find(header_signature(["Дата", "Сумма", "Тип"]))
+
+        assert profile.name == "Банк"
+
+    def test_invalid_profile(self, manager):
+        """Профиль без столбца суммы не регистрируется"""
+        with pytest.raises(ValueError):
+            manager.register_profile("Банк", {"date": "Дата"}, header=["Дата"])
+
+
+OFX_SGML = """OFXHEADER:100
+DATA:OFXSGML
+VERSION:102
+ENCODING:USASCII
+CHARSET:1251
+
+<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>
+<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20250105120000.000[+3:MSK]<TRNAMT>-150.50<NAME>Кафе<MEMO>Обед
+<STMTTRN><TRNTYPE>CREDIT<DTPOSTED>20250106<TRNAMT>3000.00<NAME>Зарплата
+</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>
+"""
+
+QIF = """!Type:Bank
+D01/05/2025
+T-150.50
+PКафе
+MОбед
+LЕда
+^
+D01/06'25
+T3,000.00
+PЗарплата
+^
+"""
+
+CAMT = """<?xml version="1.0" encoding="UTF-8"?>
+<Document xmlns="urn:iso:std:iso:20022:tech:xsd:camt.053.001.02"><BkToCstmrStmt><Stmt>
+<Ntry><Amt Ccy="RUB">150.50</Amt><CdtDbtInd>DBIT</CdtDbtInd><BookgDt><Dt>2025-01-05</Dt></BookgDt>
+<NtryDtls><TxDtls><RltdPties><Cdtr><Nm>Кафе</Nm></Cdtr></RltdPties><RmtInf><Ustrd>Обед</Ustrd></RmtInf></TxDtls></NtryDtls></Ntry>
+<Ntry><Amt Ccy="RUB">3000.00</Amt><CdtDbtInd>CRDT</CdtDbtInd><BookgDt><DtTm>2025-01-06T09:30:00</DtTm></BookgDt>
+<AddtlNtryInf>Зарплата</AddtlNtryInf></Ntry>
+</Stmt></BkToCstmrStmt></Document>
+"""
+
+
+class TestStatementFormats:
+    """Тесты потокового импорта OFX, QIF и CAMT.053"""
+
+    @pytest.mark.parametrize("name, content, encoding, expected", [
+        ("statement.ofx", OFX_SGML, "cp1251", [
+            (150.5, "", "Кафе (Обед)", "2025-01-05 12:00:00", "Списание"),
+            (3000.0, "", "Зарплата", "2025-01-06", "Пополнение")]),
+        ("statement.qif", QIF, "utf-8", [
+            (150.5, "Еда", "Кафе (Обед)", "2025-01-05", "Списание"),
+            (3000.0, "", "Зарплата", "2025-01-06", "Пополнение")]),
+        ("statement.xml", CAMT, "utf-8", [
+            (150.5, "", "Кафе (Обед)", "2025-01-05", "Списание"),
+            (3000.0, "", "Зарплата", "2025-01-06 09:30:00", "Пополнение")]),
+    ], ids=["ofx", "qif", "camt053"])
+    def test_parse(self, tmp_path, name, content, encoding, expected):
+        """Операции читаются со знаком, датой и описанием"""
+        path = tmp_path / name
+        path.write_bytes(content.encode(encoding))
+
+        batches = list(Parser.iter_batches(str(path), chunksize=1))
+
+        assert [rows for rows, _ in batches] == [[row] for row in expected]
+
+    def test_ofx_tag_split_between_blocks(self, monkeypatch):
+        """Тег, разрезанный границей блока, разбирается целиком"""
+        monkeypatch.setattr(statements, "BLOCK_SIZE", 7)
+
+        rows = list(statements.iter_ofx(io.BytesIO(OFX_SGML.encode("cp1251"))))
+
+        assert [row[0] for row in rows] == [150.5, 3000.0]
+
+    def test_camt_entries_removed_from_tree(self):
+        """Разобранные записи удаляются из дерева, поэтому память не растёт с размером выписки"""
+        entry = CAMT[CAMT.index("<Ntry>"):CAMT.index("</Ntry>") + len("</Ntry>")]
+        content = CAMT.replace(entry, entry * 1000)
+        parents = []
+        real_iterparse = statements.ET.iterparse
+
+        def spy(*args, **kwargs):
+            for event, elem in real_iterparse(*args, **kwargs):
+                if event == "start" and statements._local(elem.tag) == "Stmt":
+                    parents.append(elem)
+                yield event, elem
+
+        with patch.object(statements.ET, "iterparse", spy):
+            rows = list(statements.iter_camt053(io.BytesIO(content.encode("utf-8"))))
+
+        assert len(rows) == 1001
+        assert len(parents[0]) == 0
+
+    def test_import_ofx(self, manager, tmp_path):
+        """OFX импортируется одним отчётом и без chunksize"""
+        path = tmp_path / "statement.ofx"
+        path.write_bytes(OFX_SGML.encode("cp1251"))
+
+        report_id = manager.import_from_file(str(path))
+
+        transactions = manager.get_transactions()
+        assert len(transactions) == 2
+        assert {t.report_id for t in transactions} == {report_id}
+        assert manager.undo()
+        assert manager.get_transactions() == []
+
+    def test_preview_qif(self, tmp_path):
+        """Предпросмотр выписки показывает нормализованные операции"""
+        path = tmp_path / "statement.qif"
+        path.write_text(QIF, encoding="utf-8")
+
+        preview = Parser.preview(str(path), nrows=1)
+
+        assert preview["format"] == "qif"
+        assert preview["rows"] == [{"amount": 150.5, "category": "Еда", "note": "Кафе (Обед)",
+                                    "date": "2025-01-05", "type": "Списание"}]
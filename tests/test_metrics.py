@@ -0,0 +1,59 @@
+"""
+Тесты для Budget Tracker - метрики в формате Prometheus
+"""
+import pytest
+import os
+
+# Добавляем путь к src для импорта модулей
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from src.core import metrics
+from src.core.metrics import Counter, Gauge, Histogram, Registry
+
+
+class TestMetrics:
+    """Тесты счётчиков, гистограмм и их вывода"""
+
+    def test_render(self):
+        """Счётчик, гистограмма с накопленными корзинами и вычисляемое значение"""
+        registry = Registry()
+        counter = Counter("test_total", "Счётчик", ["route"], registry=registry)
+        histogram = Histogram("test_seconds", "Время", ["kind"], buckets=(0.1, 1.0), registry=registry)
+        Gauge("test_queue", "Очередь", ["pool"], collect=lambda: {("read",): 3}, registry=registry)
+
+        counter.inc('/a"b')
+        counter.inc('/a"b', amount=2)
+        for value in (0.05, 0.1, 0.5, 7.0):
+            histogram.observe(value, "SELECT")
+        text = registry.render()
+
+        assert "# TYPE test_total counter\ntest_total{route=\"/a\\\"b\"} 3\n" in text
+        assert 'test_seconds_bucket{kind="SELECT",le="0.1"} 2' in text
+        assert 'test_seconds_bucket{kind="SELECT",le="1"} 3' in text
+        assert 'test_seconds_bucket{kind="SELECT",le="+Inf"} 4' in text
+        assert 'test_seconds_count{kind="SELECT"} 4' in text
+        assert 'test_queue{pool="read"} 3' in text
+        assert histogram.snapshot("SELECT") == (4, pytest.approx(7.65))
+
+    def test_statement_kind(self):
+        assert metrics.statement_kind("\n  select * from t") == "SELECT"
+        assert metrics.statement_kind("INSERT INTO t VALUES (1)") == "INSERT"
+        assert metrics.statement_kind("CREATE TABLE t (id)") == "other"
+        assert metrics.statement_kind("") == "other"
+
+    def test_db_and_import_metrics(self, manager, sample_csv_content, tmp_path):
+        """Запросы DBManager учитываются по виду оператора, импорт — по формату файла"""
+        sample_csv_file = tmp_path / "statement.csv"
+        sample_csv_file.write_text(sample_csv_content, encoding="utf-8")
+        selects = metrics.DB_QUERY_SECONDS.snapshot("SELECT")[0]
+        rows = metrics.IMPORT_ROWS.value("csv")
+        imported = metrics.IMPORT_SECONDS.snapshot("csv")[0]
+
+        manager.import_from_file(str(sample_csv_file))
+        manager.get_transactions()
+
+        assert metrics.DB_QUERY_SECONDS.snapshot("SELECT")[0] > selects
+        assert metrics.DB_QUERY_SECONDS.snapshot("INSERT")[0] > 0
+        assert metrics.IMPORT_ROWS.value("csv") == rows + len(manager.get_transactions())
+        assert metrics.IMPORT_SECONDS.snapshot("csv")[0] == imported + 1
@@ -0,0 +1,80 @@
+"""
+Тесты для Budget Tracker - выгрузка и загрузка Parquet
+"""
+import pytest
+import os
+
+# Добавляем путь к src для импорта модулей
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+pq = pytest.importorskip("pyarrow.parquet")
+
+from core import parquet
+from core.summary import EXPENSE_TYPE
+
+
+@pytest.fixture
+def filled_manager(manager):
+    """BudgetManager с двумя отчётами: 1000 и 500 операций"""
+    first = manager.get_next_report_id("january.csv")
+    manager.dbmanager.add_transactions(first, [(float(i), "Продукты" if i % 2 else "Транспорт", f"Покупка {i}",
+                                                f"2025-01-{i % 28 + 1:02d}", EXPENSE_TYPE) for i in range(1000)])
+    second = manager.get_next_report_id("february.csv")
+    manager.dbmanager.add_transactions(second, [(1.5, "Кафе", "Обед", "2025-02-01", EXPENSE_TYPE)] * 500)
+    return manager
+
+
+class TestParquet:
+    """Тесты архива Parquet"""
+
+    def test_round_trip(self, filled_manager, tmp_path):
+        """Выгрузка и загрузка сохраняют операции и отчёты, отчёты получают новые ID"""
+        archive = str(tmp_path / "archive")
+        before = filled_manager.get_transactions()
+
+        assert filled_manager.export_parquet(archive) == 1500
+        assert filled_manager.import_parquet(archive) == 1500
+
+        transactions = filled_manager.get_transactions()
+        assert len(transactions) == 3000
+        key = lambda t: (t.date, t.amount, t.category, t.note, t.type_)
+        assert sorted(map(key, transactions)) == sorted(map(key, before + before))
+        reports = filled_manager.dbmanager.get_reports()
+        assert [r[1] for r in reports] == ["january.csv", "february.csv"] * 2
+
+    def test_row_groups_and_compression(self, filled_manager, tmp_path):
+        """Операции пишутся группами строк со сжатием zstd"""
+        archive = str(tmp_path / "archive")
+
+        parquet.export_parquet(filled_manager.dbmanager, archive, row_group_size=400)
+
+        metadata = pq.ParquetFile(os.path.join(archive, parquet.TRANSACTIONS_FILE)).metadata
+        assert metadata.num_rows == 1500
+        assert metadata.num_row_groups == 4
+        assert metadata.row_group(0).column(0).compression == "ZSTD"
+
+    def test_export_filters(self, filled_manager, tmp_path):
+        """Фильтры ограничивают выгрузку, в архив попадают только нужные отчёты"""
+        archive = str(tmp_path / "archive")
+
+        count = filled_manager.export_parquet(archive, {"category": ["Кафе"], "date_from": "2025-02-01",
+                                                        "date_to": "2025-02-01"})
+
+        assert count == 500
+        reports = pq.read_table(os.path.join(archive, parquet.REPORTS_FILE)).column("filename").to_pylist()
+        assert reports == ["february.csv"]
+
+    def test_import_undo(self, filled_manager, tmp_path):
+        """Загруженные отчёты отменяются"""
+        archive = str(tmp_path / "archive")
+        filled_manager.export_parquet(archive, {"report_id": 2})
+        filled_manager.import_parquet(archive)
+
+        assert filled_manager.undo()
+        assert len(filled_manager.get_transactions()) == 1500
+
+    def test_missing_archive(self, manager, tmp_path):
+        """Каталог без архива — ошибка"""
+        with pytest.raises(ValueError):
+            manager.import_parquet(str(tmp_path))
@@ -0,0 +1,276 @@
+"""
+Тесты для Budget Tracker - выборки транзакций из базы
+"""
+import pytest
+import os
+
+# Добавляем путь к src для импорта модулей
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from core.summary import EXPENSE_TYPE, INCOME_TYPE
+
+
+@pytest.fixture
+def reports(manager):
+    """Два отчёта по три транзакции"""
+    report_ids = []
+    for name in ("january.csv", "february.csv"):
+        report_id = manager.get_next_report_id(name)
+        manager.dbmanager.add_transactions(report_id, [
+            (100.0, "Продукты", "Магазин", "2025-01-01", EXPENSE_TYPE),
+            (50.0, "Транспорт", "Метро", "2025-01-02", EXPENSE_TYPE),
+            (1000.0, "Зарплата", "Аванс", "2025-01-03", INCOME_TYPE),
+        ])
+        report_ids.append(report_id)
+    return report_ids
+
+
+class TestPointLookups:
+    """Тесты поиска транзакции по ID и по отчёту"""
+
+    def test_get_transaction(self, manager, reports):
+        """Транзакция находится по ID, несуществующая — None"""
+        expected = manager.get_transactions_by_report(reports[1])[0]
+
+        found = manager.get_transaction(expected.id)
+
+        assert (found.id, found.amount, found.category, found.report_id) == \
+               (expected.id, expected.amount, expected.category, reports[1])
+        assert manager.get_transaction(10_000) is None
+
+    def test_get_transactions_by_report(self, manager, reports):
+        """Возвращаются только транзакции отчёта"""
+        transactions = manager.get_transactions_by_report(reports[0])
+
+        assert len(transactions) == 3
+        assert {t.report_id for t in transactions} == {reports[0]}
+        assert manager.count_transactions_by_report(reports[0]) == 3
+
+    def test_lookups_use_indexes(self, manager, reports):
+        """Поиск по ID и по отчёту не просматривает всю таблицу"""
+        with manager.dbmanager._get_connection() as conn:
+            by_id = conn.execute("EXPLAIN QUERY PLAN SELECT * FROM transactions WHERE id = 1").fetchall()
+            by_report = conn.execute("EXPLAIN QUERY PLAN SELECT * FROM transactions WHERE report_id = 1").fetchall()
+
+        assert "USING INTEGER PRIMARY KEY" in by_id[0][3]
+        assert "idx_transactions_report" in by_report[0][3]
+
+    def test_delete_does_not_load_all_transactions(self, manager, reports):
+        """Удаление транзакции и отчёта не читает все транзакции"""
+        transaction_id = manager.get_transactions_by_report(reports[0])[0].id
+        manager.dbmanager.get_transactions = None  # любой вызов упадёт
+
+        manager.delete_transaction(transaction_id)
+        manager.delete_report(reports[1])
+
+        assert len(next(manager.dbmanager.iter_transactions())) == 2
+
+
+class TestUpdateTransaction:
+    """Тесты изменения транзакции на месте"""
+
+    def test_update_changed_columns(self, manager, reports):
+        """Изменяются только отличающиеся поля, ID сохраняется"""
+        transaction = manager.get_transactions_by_report(reports[0])[0]
+
+        changed = manager.update_transaction(transaction.id, {"amount": 75.0, "category": transaction.category})
+
+        assert changed == {"amount": 75.0}
+        updated = manager.get_transaction(transaction.id)
+        assert (updated.amount, updated.category) == (75.0, transaction.category)
+        assert manager.undo_stack[-1] == {"type": "update_transaction", "transaction_id": transaction.id,
+                                          "old": {"amount": transaction.amount}, "new": {"amount": 75.0}}
+
+    def test_undo_redo(self, manager, reports):
+        """Изменение отменяется и повторяется одним действием"""
+        transaction = manager.get_transactions_by_report(reports[0])[0]
+        manager.update_transaction(transaction.id, {"note": "Исправлено", "type": INCOME_TYPE})
+
+        assert manager.undo()
+        assert manager.get_transaction(transaction.id).note == transaction.note
+        assert manager.redo()
+        assert manager.get_transaction(transaction.id).type_ == INCOME_TYPE
+
+    def test_no_changes_no_undo_entry(self, manager, reports):
+        """Запись тех же значений не создаёт действие отмены"""
+        transaction = manager.get_transactions_by_report(reports[0])[0]
+
+        assert manager.update_transaction(transaction.id, {"amount": transaction.amount}) == {}
+        assert manager.undo_stack == []
+
+    def test_errors(self, manager, reports):
+        """Неизвестная транзакция и неизменяемое поле — ошибки"""
+        with pytest.raises(ValueError):
+            manager.update_transaction(10_000, {"amount": 1.0})
+        with pytest.raises(ValueError):
+            manager.update_transaction(1, {"id": 5})
+
+
+class TestBulkTransactions:
+    """Тесты массового добавления и удаления транзакций"""
+
+    def test_add_bulk_single_undo(self, manager, reports):
+        """Порции вставляются подряд, всё добавление отменяется одним действием"""
+        rows = [(reports[0], float(i), "Кафе", "Обед", "2025-02-01", EXPENSE_TYPE) for i in range(5)]
+
+        ids = manager.add_transactions_bulk([rows[:2], rows[2:]])
+
+        assert ids == list(range(ids[0], ids[0] + 5))
+        assert manager.get_transaction(ids[-1]).amount == 4.0
+        assert manager.undo_stack[-1] == {"type": "add_transactions", "ids": [[ids[0], ids[-1]]]}
+        assert manager.undo()
+        assert len(manager.get_transactions()) == 6
+
+    def test_add_bulk_failure_removes_written_rows(self, manager, reports):
+        """Ошибка в потоке порций удаляет уже записанные строки"""
+        def batches():
+            yield [(reports[0], 1.0, "Кафе", "Обед", "2025-02-01", EXPENSE_TYPE)]
+            raise RuntimeError("обрыв потока")
+
+        with pytest.raises(RuntimeError):
+            manager.add_transactions_bulk(batches())
+
+        assert len(manager.get_transactions()) == 6
+        assert manager.undo_stack == []
+
+    def test_delete_by_ids_and_filters(self, manager, reports):
+        """Удаление по ID и по условию, отмена и повтор одним действием"""
+        first = manager.get_transactions_by_report(reports[0])[0].id
+
+        assert manager.delete_transactions(ids=[first, first, 10_000]) == [first]
+        deleted = manager.delete_transactions(filters={"category": ["Зарплата"], "report_id": reports[1]})
+
+        assert len(deleted) == 1
+        assert len(manager.get_transactions()) == 4
+        assert manager.undo()
+        assert len(manager.get_transactions()) == 5
+        assert manager.redo()
+        assert manager.get_transaction(deleted[0]) is None
+
+    def test_delete_requires_condition(self, manager, reports):
+        with pytest.raises(ValueError):
+            manager.delete_transactions(filters={"category": None})
+
+
+class TestQueryTransactions:
+    """Тесты выборки страниц транзакций с фильтрами и сортировкой"""
+
+    def test_filters_and_projection(self, manager, reports):
+        """Фильтры и список полей применяются в запросе"""
+        rows, next_key = manager.query_transactions(
+            {"category": ["Продукты", "Зарплата"], "amount_min": 100, "amount_max": 500,
+             "report_id": reports[1]}, fields=["id", "amount"])
+
+        assert len(rows) == 1
+        assert rows[0][1] == 100.0
+        assert next_key is None
+
+    def test_keyset_pages(self, manager, reports):
+        """Страницы по ключу покрывают все строки без повторов в порядке сортировки"""
+        pages, after = [], None
+        while True:
+            rows, after = manager.query_transactions(sort="amount", descending=True, limit=4, after=after,
+                                                     fields=["id", "amount"])
+            pages.append(rows)
+            if after is None:
+                break
+
+        rows = [row for page in pages for row in page]
+        assert [len(page) for page in pages] == [4, 2]
+        assert len({row[0] for row in rows}) == 6
+        assert [row[1] for row in rows] == sorted((row[1] for row in rows), reverse=True)
+
+    def test_sort_uses_index(self, manager, reports):
+        """Сортировка по дате со страницей по ключу идёт по индексу, без сортировки в памяти"""
+        with manager.dbmanager._get_connection() as conn:
+            plan = conn.execute("EXPLAIN QUERY PLAN SELECT date, id, amount FROM transactions "
+                                "WHERE (date, id) > (?, ?) ORDER BY date ASC, id ASC LIMIT 5",
+                                ("2025-01-01", 0)).fetchall()
+
+        details = " ".join(row[-1] for row in plan)
+        assert "idx_transactions_date" in details
+        assert "TEMP B-TREE" not in details
+
+    def test_unknown_field_or_sort(self, manager, reports):
+        with pytest.raises(ValueError):
+            manager.query_transactions(fields=["id", "password"])
+        with pytest.raises(ValueError):
+            manager.query_transactions(sort="note")
+
+
+class TestDataVersion:
+    """Тесты версии данных для ETag"""
+
+    def test_bumped_by_writes_only(self, manager, reports):
+        """Версия меняется при записи и отмене, но не при чтении и пустом изменении"""
+        transaction = manager.get_transactions_by_report(reports[0])[0]
+        version = manager.data_version()
+
+        manager.get_transactions()
+        manager.query_transactions(limit=2)
+        manager.update_transaction(transaction.id, {"amount": transaction.amount})
+        assert manager.data_version() == version
+
+        manager.update_transaction(transaction.id, {"amount": 1.0})
+        assert manager.data_version() > version
+        version = manager.data_version()
+        assert manager.undo()
+        assert manager.data_version() > version
+
+    def test_unchanged_after_rollback(self, manager, reports):
+        """Откат пакета изменений не меняет версию"""
+        version = manager.data_version()
+
+        with pytest.raises(RuntimeError):
+            with manager.batch("Очистка"):
+                manager.delete_report(reports[0])
+                raise RuntimeError("ошибка")
+
+        assert manager.data_version() == version
+        assert len(manager.get_transactions()) == 6
+
+
+class TestChangeLog:
+    """Тесты журнала изменений для синхронизации клиентов"""
+
+    def test_changes_since(self, manager, reports):
+        """Каждая транзакция входит один раз в последнем состоянии, включая отмену удаления отчёта"""
+        since = manager.last_change()
+        first, second = [t.id for t in manager.get_transactions_by_report(reports[0])][:2]
+        report_ids = [t.id for t in manager.get_transactions_by_report(reports[1])]
+
+        manager.update_transaction(first, {"amount": 1.0})
+        manager.delete_transaction(second)
+        manager.delete_report(reports[1])
+        upserts, deletes, last, has_more = manager.get_changes(since, 100)
+
+        assert [row[0] for row in upserts] == [first]
+        assert upserts[0][2] == 1.0
+        assert deletes == [second] + sorted(report_ids)
+        assert (last, has_more) == (manager.last_change(), False)
+
+        assert manager.undo()
+        upserts, deletes, _, _ = manager.get_changes(last, 100)
+        assert len(upserts) == 3 and deletes == []
+
+    def test_pages(self, manager, reports):
+        """Страницы идут по возрастанию номера изменения"""
+        upserts, _, last, has_more = manager.get_changes(0, 4)
+        rest, _, end, more = manager.get_changes(last, 4)
+
+        assert has_more and not more
+        assert [row[0] for row in upserts + rest] == sorted(t.id for t in manager.get_transactions())
+        assert manager.get_changes(end, 4) == ([], [], end, False)
+
+    def test_resync_after_compaction(self, manager, reports):
+        """После сжатия записей об удалении старый номер требует полной синхронизации"""
+        since = manager.last_change()
+        manager.delete_report(reports[0])
+        manager.delete_report(reports[1])
+
+        assert manager.dbmanager.compact_change_log(keep_deletes=2) == 4
+        assert manager.get_changes(since, 100) is None
+        assert manager.get_changes(manager.last_change() + 1, 100) is None
+        _, deletes, _, _ = manager.get_changes(manager.last_change() - 2, 100)
+        assert len(deletes) == 2
@@ -0,0 +1,168 @@
+"""
+Тесты для Budget Tracker - реестр BudgetManager арендаторов
+"""
+import asyncio
+import sqlite3
+import threading
+import time
+import pytest
+import os
+
+# Добавляем путь к src для импорта модулей
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from fastapi.testclient import TestClient
+
+from api.main import app
+from api import dependencies
+from api.tenants import TenantRegistry
+from core.summary import EXPENSE_TYPE
+from core.transaction import Transaction
+
+
+def expense(category="Кафе"):
+    return Transaction(amount=10.0, category=category, note="Обед", date="2025-03-01", type_=EXPENSE_TYPE)
+
+
+@pytest.fixture
+def tenants(tmp_path):
+    registry = TenantRegistry(str(tmp_path), max_open=2, idle_seconds=600)
+    yield registry
+    registry.close_all()
+
+
+class TestTenantRegistry:
+    """Тесты LRU открытых менеджеров арендаторов"""
+
+    def test_separate_databases(self, tenants, tmp_path):
+        """У каждого арендатора свой файл базы и плана"""
+        first = tenants.acquire("alpha")
+        second = tenants.acquire("beta")
+        first.add_transaction(expense())
+
+        assert len(first.get_transactions()) == 1
+        assert second.get_transactions() == []
+        assert first.DB_FILE == str(tmp_path / "alpha" / "budget.db")
+        assert second.PLAN_FILE == str(tmp_path / "beta" / "user_plan.json")
+        assert tenants.acquire("alpha") is first
+
+    def test_lru_eviction_closes_idle(self, tenants):
+        """Сверх max_open закрывается давно не использованный свободный менеджер, занятый остаётся"""
+        busy = tenants.acquire("busy")
+        idle = tenants.acquire("idle")
+        idle.get_transactions()
+        connection = idle.dbmanager._connections[0]
+        tenants.release("idle")
+
+        tenants.acquire("third")
+
+        assert tenants.stats()["open"] == 2
+        with pytest.raises(sqlite3.ProgrammingError):
+            connection.execute("SELECT 1")
+        assert tenants.acquire("busy") is busy
+        # Закрытый менеджер снова открывается с теми же данными
+        assert tenants.acquire("idle") is not idle
+
+    def test_idle_eviction_and_retain(self, tenants):
+        """Менеджер без запросов дольше idle_seconds закрывается, если его не удерживает фоновая задача"""
+        manager = tenants.acquire("alpha")
+        tenants.release("alpha")
+        release = tenants.retain(manager)
+        tenants.idle_seconds = 0
+
+        tenants.evict_idle()
+        assert tenants.stats()["open"] == 1
+        release()
+        assert tenants.stats()["open"] == 0
+        assert tenants.retain(manager)() is None
+
+    def test_open_outside_lock(self, tenants):
+        """Пока открывается база одного арендатора, другие арендаторы обслуживаются, а этот ждёт ту же базу"""
+        opening, proceed = threading.Event(), threading.Event()
+        create_manager = tenants.create_manager
+
+        def slow_create(tenant):
+            if tenant == "slow":
+                opening.set()
+                proceed.wait(5)
+            return create_manager(tenant)
+
+        tenants.create_manager = slow_create
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(tenants.acquire("slow"))) for _ in range(2)]
+        threads[0].start()
+        assert opening.wait(5)
+        threads[1].start()
+
+        assert tenants.acquire("fast") is not None
+        proceed.set()
+        for thread in threads:
+            thread.join(5)
+        assert len(results) == 2 and results[0] is results[1]
+
+    def test_evict_idle_forever(self, tenants):
+        """Фоновая задача закрывает простаивающие менеджеры без новых запросов"""
+        tenants.acquire("alpha")
+        tenants.release("alpha")
+        tenants.idle_seconds = 0
+
+        async def run():
+            task = asyncio.create_task(tenants.evict_idle_forever(interval=0.01))
+            for _ in range(100):
+                await asyncio.sleep(0.01)
+                if tenants.stats()["open"] == 0:
+                    break
+            task.cancel()
+
+        asyncio.run(run())
+        assert tenants.stats()["open"] == 0
+
+    def test_invalid_tenant(self, tenants):
+        with pytest.raises(ValueError):
+            tenants.acquire("../etc")
+
+
+class TestTenantAPI:
+    """Тесты выбора арендатора по заголовку X-Tenant-ID"""
+
+    @pytest.fixture
+    def client(self, tenants, monkeypatch):
+        monkeypatch.setattr(dependencies, "_tenants", tenants)
+        return TestClient(app)
+
+    def test_isolated_by_header(self, client, tenants):
+        item = {"amount": 10.0, "category": "Кафе", "note": "Обед", "date": "2025-01-05", "type": "Списание"}
+
+        client.post("/api/transactions", json=item, headers={"X-Tenant-ID": "alpha"})
+
+        assert len(client.get("/api/transactions", headers={"X-Tenant-ID": "alpha"}).json()) == 1
+        assert client.get("/api/transactions", params={"tenant": "beta"}).json() == []
+        assert client.get("/api/transactions", headers={"X-Tenant-ID": "a/b"}).status_code == 400
+        assert tenants.stats()["active"] == 0
+
+    def test_etag_per_tenant(self, client):
+        """ETag другого арендатора с той же версией данных не даёт 304"""
+        alpha = client.get("/api/analytics/summary", headers={"X-Tenant-ID": "alpha"})
+        beta = client.get("/api/analytics/summary",
+                          headers={"X-Tenant-ID": "beta", "If-None-Match": alpha.headers["ETag"]})
+
+        assert beta.status_code == 200
+        assert beta.headers["ETag"] != alpha.headers["ETag"]
+        assert "X-Tenant-ID" in beta.headers["Vary"]
+
+    def test_import_job_per_tenant(self, client, sample_csv_content):
+        """Задачу импорта видит и отменяет только арендатор, который её создал"""
+        files = {"file": ("statement.csv", sample_csv_content.encode("utf-8"), "text/csv")}
+        job = client.post("/api/import/jobs", files=files, headers={"X-Tenant-ID": "alpha"}).json()
+
+        assert client.get(f"/api/import/jobs/{job['job_id']}", headers={"X-Tenant-ID": "beta"}).status_code == 404
+        assert client.delete(f"/api/import/jobs/{job['job_id']}").status_code == 404
+        assert client.get(f"/api/import/jobs/{job['job_id']}", headers={"X-Tenant-ID": "alpha"}).status_code == 200
+        # База арендатора закрывается после теста, поэтому задача должна завершиться раньше
+        for _ in range(100):
+            status = client.get(f"/api/import/jobs/{job['job_id']}", headers={"X-Tenant-ID": "alpha"}).json()["status"]
+            if status not in ("queued", "running"):
+                break
+            time.sleep(0.05)
+        assert status == "done"
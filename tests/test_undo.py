@@ -0,0 +1,164 @@
+"""
+Тесты для Budget Tracker - пакетные изменения и отмена
+"""
+import pytest
+import os
+from unittest.mock import patch
+
+# Добавляем путь к src для импорта модулей
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from core.DBManager import DBManager
+from core.manager import BudgetManager
+from core.transaction import Transaction
+from core.summary import EXPENSE_TYPE
+
+
+def make_transaction(amount=100.0, category="Продукты"):
+    return Transaction(amount, category, "Покупка", "2025-01-01", EXPENSE_TYPE, 1)
+
+
+class TestBatch:
+    """Тесты BudgetManager.batch"""
+
+    def test_single_undo_entry(self, manager):
+        """Изменения пакета отменяются и повторяются одним действием"""
+        manager.add_transaction(make_transaction(1.0))
+        with manager.batch("Правка"):
+            for i in range(10):
+                manager.add_transaction(make_transaction(float(i)))
+            manager.delete_transaction(manager.get_transactions()[-1].id)
+
+        assert len(manager.undo_stack) == 2
+        assert manager.undo_stack[-1]["label"] == "Правка"
+        assert len(manager.get_transactions()) == 10
+
+        assert manager.undo()
+        assert len(manager.get_transactions()) == 1
+        assert manager.redo()
+        assert len(manager.get_transactions()) == 10
+        assert manager.undo()
+        assert [t.amount for t in manager.get_transactions()] == [1.0]
+
+    def test_error_rolls_back(self, manager):
+        """Ошибка внутри пакета откатывает все его изменения и не попадает в стек отмены"""
+        with pytest.raises(RuntimeError):
+            with manager.batch("Правка"):
+                manager.add_transaction(make_transaction())
+                raise RuntimeError("сбой")
+
+        assert manager.get_transactions() == []
+        assert manager.undo_stack == []
+
+    def test_nested_batch(self, manager):
+        """Ошибка во вложенном пакете откатывает только его, действия вложенного сливаются с внешним"""
+        with manager.batch("Внешний"):
+            manager.add_transaction(make_transaction(1.0))
+            with manager.batch("Вложенный"):
+                manager.add_transaction(make_transaction(2.0))
+            try:
+                with manager.batch("Неудачный"):
+                    manager.add_transaction(make_transaction(3.0))
+                    raise ValueError("сбой")
+            except ValueError:
+                pass
+
+        assert sorted(t.amount for t in manager.get_transactions()) == [1.0, 2.0]
+        ids = sorted(t.id for t in manager.get_transactions())
+        # Подряд идущие добавления хранятся в журнале отрезком ID
+        assert manager.undo_stack == [{"type": "batch", "label": "Внешний",
+                                       "actions": [{"type": "add_transactions", "ids": [ids]}]}]
+
+    def test_plan_restored_on_error(self, manager, tmp_path):
+        """Изменения плана внутри неудачного пакета возвращаются"""
+        manager.PLAN_FILE = str(tmp_path / "plan.json")
+        manager.apply_plan_state({"Продукты": 100.0})
+
+        with pytest.raises(RuntimeError):
+            with manager.batch("План"):
+                manager.apply_plan_state({"Продукты": 500.0})
+                manager.save_plan_changes({"Продукты": 100.0}, {"Продукты": 500.0})
+                raise RuntimeError("сбой")
+
+        assert manager.get_current_plan_state() == {"Продукты": 100.0}
+
+    def test_import_is_one_undo_step(self, manager, tmp_path, sample_csv_content):
+        """Построчный импорт отменяется одним действием"""
+        path = tmp_path / "statement.csv"
+        path.write_text(sample_csv_content, encoding="utf-8")
+
+        manager.import_from_file(str(path))
+
+        assert len(manager.undo_stack) == 1
+        assert manager.undo()
+        assert manager.get_transactions() == []
+
+
+def trash_count(manager):
+    with manager.dbmanager._get_connection() as conn:
+        return conn.execute("SELECT COUNT(*) FROM transactions_trash").fetchone()[0]
+
+
+class TestUndoJournal:
+    """Тесты журнала отмены в базе"""
+
+    def test_survives_restart(self, temp_db_file):
+        """Удаление отчёта отменяется после перезапуска, транзакции возвращаются с прежними ID"""
+        with patch('core.manager.DBManager', lambda _: DBManager(temp_db_file)):
+            manager = BudgetManager()
+            report_id = manager.get_next_report_id("statement.csv")
+            manager.dbmanager.add_transactions(report_id, [(10.0, "Кафе", "Обед", "2025-01-01", EXPENSE_TYPE)] * 3)
+            ids = sorted(t.id for t in manager.get_transactions())
+            manager.delete_report(report_id)
+
+            restarted = BudgetManager()
+            assert restarted.undo()
+
+        assert sorted(t.id for t in restarted.get_transactions()) == ids
+        assert trash_count(restarted) == 0
+
+    def test_descriptor_does_not_copy_rows(self, manager):
+        """Описание удаления хранит метку корзины, а не строки"""
+        report_id = manager.get_next_report_id("statement.csv")
+        manager.dbmanager.add_transactions(report_id, [(10.0, "Кафе", "Обед" * 100, "2025-01-01", EXPENSE_TYPE)] * 1000)
+
+        manager.delete_report(report_id)
+
+        assert set(manager.undo_stack[-1]) == {"type", "report_id", "trash"}
+        assert trash_count(manager) == 1000
+
+    def test_depth_limit_purges_trash(self, manager):
+        """Старые действия сверх глубины вытесняются вместе со строками корзины"""
+        manager.UNDO_MAX_DEPTH = 3
+        for i in range(5):
+            manager.add_transaction(make_transaction(float(i)))
+        for t in manager.get_transactions():
+            manager.delete_transaction(t.id)
+
+        assert len(manager.undo_stack) == 3
+        assert trash_count(manager) == 3
+
+    def test_byte_budget(self, manager):
+        """Объём журнала ограничен, последнее действие сохраняется всегда"""
+        manager.UNDO_MAX_BYTES = 1
+        report_id = manager.get_next_report_id("statement.csv")
+        manager.dbmanager.add_transactions(report_id, [(10.0, "Кафе", "Обед", "2025-01-01", EXPENSE_TYPE)] * 10)
+        manager.add_transaction(make_transaction())
+
+        manager.delete_report(report_id)
+
+        assert [a["type"] for a in manager.undo_stack] == ["delete_report"]
+        assert manager.undo()
+        assert len(manager.get_transactions()) == 11
+
+    def test_new_action_clears_redo_and_trash(self, manager):
+        """Новое действие очищает стек повтора и корзину отменённых добавлений"""
+        manager.add_transaction(make_transaction())
+        manager.undo()
+        assert trash_count(manager) == 1
+
+        manager.add_transaction(make_transaction(5.0))
+
+        assert manager.redo_stack == []
+        assert trash_count(manager) == 0